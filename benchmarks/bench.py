@@ -0,0 +1,115 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+
+Benchmarks of the qsAPI client against the local stand-in server (see stub.py), examples:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --apps 20000 --calls 2000 --threads 8 --download 256
+'''
+
+import os, sys, time, tempfile, tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from qsAPI import QRS, QPS, __version__
+from stub import StubServer
+
+
+
+def _percentile(values, p):
+    values=sorted(values)
+    return values[min(len(values)-1, int(round(p/100.0*(len(values)-1))))] if values else 0.0
+
+
+
+def measure(name, fn, calls=1, threads=1, size=None):
+    '''
+    @Function: run fn() calls times with a pool of threads
+    @param size: bytes moved by every call, to report MB/s
+    @return: dict with calls/s, p50, p99, MB/s and peak memory of a single call
+    '''
+    latencies=[]
+    def timed(_):
+        t=time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter()-t)
+
+    start=time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(timed, range(calls)))
+    else:
+        for i in range(calls):
+            timed(i)
+    total=time.perf_counter()-start
+    
+    # tracing allocations slows everything down, the peak is taken from one extra call
+    tracemalloc.start()
+    fn()
+    peak=tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'name'   : name,
+            'calls/s': calls/total,
+            'p50 ms' : _percentile(latencies, 50)*1000,
+            'p99 ms' : _percentile(latencies, 99)*1000,
+            'MB/s'   : (size*calls/total/(1 << 20)) if size else None,
+            'peak MB': peak/(1 << 20)}
+
+
+
+def report(results):
+    cols=['name', 'calls/s', 'p50 ms', 'p99 ms', 'MB/s', 'peak MB']
+    print('{0:<34}{1:>11}{2:>10}{3:>10}{4:>10}{5:>10}'.format(*cols))
+    for r in results:
+        print('{0:<34}'.format(r['name'])+''.join('{0:>10.1f} '.format(r[c]) if r[c] is not None else '{0:>10} '.format('-') for c in cols[1:]))
+
+
+
+def main():
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description='qsAPI {} benchmarks against a local stand-in server'.format(__version__))
+    parser.add_argument('--apps', type=int, default=5000, help='entities in /qrs/app/full')
+    parser.add_argument('--users', type=int, default=5000, help='entities in /qrs/user/full')
+    parser.add_argument('--calls', type=int, default=500, help='number of small calls')
+    parser.add_argument('--threads', type=int, default=1, help='threads sharing the handler')
+    parser.add_argument('--download', type=int, default=64, help='size of the export in MB')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of the list and transfer benchmarks')
+    args = parser.parse_args()
+
+    size=args.download << 20
+    with StubServer(apps=args.apps, users=args.users, download=size) as stub, tempfile.TemporaryDirectory() as tmp:
+        options={'workers': args.threads} if args.threads > 1 else {}
+        qrs=QRS(schema='http', proxy=stub.address, verbosity='WARNING', **options)
+        qps=QPS(schema='http', proxy=stub.address, verbosity='WARNING', **options)
+        qvf=os.path.join(tmp, 'bench.qvf')
+        with open(qvf, 'wb') as f:
+            f.write(stub.blob)
+
+        results=[measure('driver.call GET /qrs/about', lambda: qrs.driver.call('GET', '/qrs/about'), args.calls, args.threads),
+                 measure('driver.call POST', lambda: qrs.driver.call('POST', '/qrs/app/x/reload'), args.calls, args.threads),
+                 measure('QRS.count', lambda: qrs.count('app'), args.calls, args.threads),
+                 measure('QPS.GetSession', lambda: qps.GetSession('x'), args.calls, args.threads),
+                 measure('QRS.AppGet ({0} apps)'.format(args.apps), qrs.AppGet, args.repeat),
+                 measure('QRS.AppGet stream', lambda: sum(1 for _ in qrs.AppGet(pStream=True)), args.repeat),
+                 measure('QRS.UserGet ({0} users)'.format(args.users), qrs.UserGet, args.repeat),
+                 measure('QRS.UserIter', lambda: sum(1 for _ in qrs.UserIter(pageSize=1000)), args.repeat),
+                 measure('QRS.AppTable', lambda: qrs.AppTable(['id', 'name']), args.repeat),
+                 measure('QRS.AppDictAttributes', qrs.AppDictAttributes, args.repeat),
+                 measure('driver.download ({0} MB)'.format(args.download), lambda: qrs.driver.download('/qrs/download/app/x/y/app.qvf', qvf+'.out'), args.repeat, size=size),
+                 measure('driver.download 4 parts', lambda: qrs.driver.download('/qrs/download/app/x/y/app.qvf', qvf+'.out', parts=4), args.repeat, size=size),
+                 measure('driver.upload ({0} MB)'.format(args.download), lambda: qrs.driver.upload('/qrs/app/upload', qvf), args.repeat, size=size),
+                 measure('QRS.AppExport', lambda: qrs.AppExport('x', qvf+'.out'), args.repeat, size=size)]
+        report(results)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+
+In-process stand-in of the repository (QRS) and proxy (QPS) services, only for benchmarks
+and local experiments. It serves:
+    GET  /qrs/about, /qrs/ssl/ping
+    GET  /qrs/{type}/full  (only "modifiedDate ge|gt '...'" and "id eq" filters are honoured, skip/take honoured)
+    GET  /qrs/{type}, /qrs/{type}/count, /qrs/{type}/{id}
+         (type: app, user, stream, tag, task, systemrule)
+    POST /qrs/{type}/table
+    POST /qrs/app/{id}/export/{token} and GET /qrs/download/... (Range supported)
+    POST /qrs/app/upload
+    POST /qrs/selection[/{type}], GET/PUT /qrs/selection/{id}/{type}/synthetic, DELETE /qrs/selection/{id}[/{type}]
+    POST /qrs/notification, DELETE /qrs/notification?handle=  (changes are pushed with StubServer.notify)
+    GET/DELETE /qps/session/{id}, /qps/user/{directory}/{id}
+'''
+
+import re, sys, json, ssl, time, threading, uuid
+import urllib.parse as up
+import urllib.request as ur
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+
+def _entities(apps, users, streams):
+    streamList=[{'id': str(uuid.UUID(int=i)), 'name': 'Stream {0}'.format(i), 'modifiedDate': '2020-10-22T10:00:00.000Z',
+                 'customProperties': [], 'tags': [], 'owner': {'userDirectory': 'INTERNAL', 'userId': 'sa_repository'}}
+                for i in range(streams)]
+    userList=[{'id': str(uuid.UUID(int=(1 << 64)+i)), 'userId': 'user{0}'.format(i), 'userDirectory': 'DIR{0}'.format(i % 5),
+               'name': 'User {0}'.format(i), 'modifiedDate': '2020-10-22T10:00:00.000Z', 'inactive': False, 'removedExternally': False,
+               'roles': [], 'attributes': [{'attributeType': 'email', 'attributeValue': 'user{0}@example.com'.format(i)}],
+               'customProperties': [], 'tags': []}
+              for i in range(users)]
+    appList=[{'id': str(uuid.UUID(int=(2 << 64)+i)), 'name': 'App {0}'.format(i), 'modifiedDate': '2020-10-22T10:00:00.000Z',
+              'published': i % 2 == 0, 'publishTime': '2020-10-22T10:00:00.000Z', 'fileSize': 1024*(i+1),
+              'lastReloadTime': '2020-10-22T10:00:00.000Z', 'description': 'Benchmark application {0}'.format(i)*4,
+              'owner': {'id': userList[i % users]['id'], 'userDirectory': userList[i % users]['userDirectory'],
+                        'userId': userList[i % users]['userId'], 'name': userList[i % users]['name']} if users else None,
+              'stream': {'id': streamList[i % streams]['id'], 'name': streamList[i % streams]['name']} if streams and i % 2 == 0 else None,
+              'customProperties': [{'definition': {'name': 'Department'}, 'value': 'Dept {0}'.format(i % 7)}],
+              'tags': [{'id': str(uuid.UUID(int=(3 << 64)+i % 3)), 'name': 'tag{0}'.format(i % 3)}]}
+             for i in range(apps)]
+    tagList=[{'id': str(uuid.UUID(int=(3 << 64)+i)), 'name': 'tag{0}'.format(i), 'modifiedDate': '2020-10-22T10:00:00.000Z'}
+             for i in range(min(3, apps))]
+    return {'app': appList, 'user': userList, 'stream': streamList, 'tag': tagList, 'task': [], 'systemrule': []}
+
+
+
+def _filter(items, pFilter):
+    # enough of the filter syntax for the delta sync: modifiedDate ge|gt '<date>' and id eq <id> or id eq <id>...
+    m=re.match(r"^\s*modifiedDate\s+(ge|gt)\s+'([^']*)'\s*$", pFilter or '')
+    if m is not None:
+        if m.group(1) == 'ge':
+            return [x for x in items if x.get('modifiedDate', '') >= m.group(2)]
+        return [x for x in items if x.get('modifiedDate', '') > m.group(2)]
+    ids=re.findall(r"id eq '?([0-9a-f-]{36})'?", pFilter or '')
+    if ids:
+        return [x for x in items if x['id'] in ids]
+    return items
+
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version='HTTP/1.1'
+    disable_nagle_algorithm=True
+
+    def log_message(self, *args):
+        pass
+
+
+    def _reply(self, code, body=None, headers=None, ctype='application/json'):
+        if body is None:
+            body=b''
+        elif not isinstance(body, (bytes, bytearray, memoryview)):
+            body=json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def _route(self):
+        url=up.urlsplit(self.path)
+        return url.path.rstrip('/').split('/')[1:], dict(up.parse_qsl(url.query))
+
+
+    def _body(self, keep=True):
+        # uploads are only counted, the server must not weigh on the client memory figures
+        data, size = bytearray(), 0
+        def read(n):
+            nonlocal size
+            while n > 0:
+                block=self.rfile.read(min(n, 1 << 20))
+                if not block:
+                    break
+                n-=len(block)
+                size+=len(block)
+                if keep:
+                    data.extend(block)
+        
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                n=int(self.rfile.readline().strip(), 16)
+                if n == 0:
+                    self.rfile.readline()
+                    break
+                read(n)
+                self.rfile.readline()
+        else:
+            read(int(self.headers.get('Content-Length', 0)))
+        return bytes(data) if keep else size
+
+
+    def _download(self):
+        blob=self.server.blob
+        rg=self.headers.get('Range')
+        if rg and rg.startswith('bytes='):
+            a, b=rg[6:].split('-')
+            a, b=int(a), (int(b) if b else len(blob)-1)
+            headers={'Accept-Ranges': 'bytes', 'Content-Range': 'bytes {0}-{1}/{2}'.format(a, b, len(blob))}
+            return self._reply(206, memoryview(blob)[a:b+1], headers, 'application/octet-stream')
+        self._reply(200, blob, {'Accept-Ranges': 'bytes'}, 'application/octet-stream')
+
+
+    def do_GET(self):
+        self.server.hits+=1
+        path, q=self._route()
+        data=self.server.entities
+
+        if path == ['qrs', 'about']:
+            return self._reply(200, {'buildVersion': self.server.version, 'schemaPath': 'About', 'singleNodeOnly': True})
+        if path == ['qrs', 'ssl', 'ping']:
+            return self._reply(200, b'Ping successful', ctype='text/plain')
+        if path[:2] == ['qrs', 'download']:
+            return self._download()
+        if len(path) == 5 and path[:2] == ['qrs', 'selection'] and path[4] == 'synthetic' and path[2] in self.server.selections:
+            return self._reply(200, {'latestModifiedDate': '2020-10-22T10:00:00.000Z', 'type': path[3], 'properties': []})
+        if len(path) == 2 and path[0] == 'qrs' and path[1] in data:
+            return self._reply(200, [{'id': x['id'], 'name': x.get('name'), 'privileges': None} for x in data[path[1]]])
+        if len(path) == 3 and path[0] == 'qrs' and path[1] in data:
+            items=_filter(data[path[1]], q.get('filter'))
+            if path[2] == 'count':
+                return self._reply(200, {'value': len(items)})
+            if path[2] == 'full':
+                if 'take' in q:
+                    skip=int(q.get('skip', 0))
+                    items=items[skip:skip+int(q['take'])]
+                return self._reply(200, self.server.payload(path[1], items))
+            for x in items:
+                if x['id'] == path[2]:
+                    return self._reply(200, x)
+        if path[:2] in (['qps', 'session'], ['qps', 'user']):
+            return self._reply(200, [{'UserDirectory': 'DIR', 'UserId': 'user', 'SessionId': str(uuid.uuid4())}])
+        self._reply(404, {'error': self.path})
+
+
+    def do_POST(self):
+        self.server.hits+=1
+        path, q=self._route()
+        if path == ['qrs', 'app', 'upload']:
+            size=self._body(keep=False)
+            return self._reply(201, {'id': str(uuid.uuid4()), 'name': q.get('name'), 'fileSize': size})
+        
+        body=self._body()
+        if path[:2] == ['qrs', 'selection'] and len(path) <= 3:
+            if len(path) == 3:
+                ids=[x['id'] for x in _filter(self.server.entities.get(path[2], []), q.get('filter'))]
+            else:
+                ids=[x['objectID'] for x in json.loads(body)['items']]
+            selection=str(uuid.uuid4())
+            self.server.selections[selection]=ids
+            return self._reply(201, {'id': selection, 'items': [{'objectID': x} for x in ids]})
+        if path == ['qrs', 'notification']:
+            handle=str(uuid.uuid4())
+            self.server.subscriptions[handle]=(q.get('name', '').lower(), q.get('changeType'), json.loads(body))
+            return self._reply(201, json.dumps(handle).encode('utf-8'))
+        if len(path) == 5 and path[:2] == ['qrs', 'app'] and path[3] == 'export':
+            return self._reply(201, {'exportToken': path[4], 'appId': path[2],
+                                     'downloadPath': '/qrs/download/app/{0}/{1}/app.qvf'.format(path[2], path[4])})
+        if len(path) == 3 and path[2] == 'table' and path[1] in self.server.entities:
+            columns=[c['definition'] for c in json.loads(body)['columns']]
+            def value(x, column):
+                for k in column.split('.'):
+                    x=x.get(k) if isinstance(x, dict) else None
+                return x
+            rows=[[value(x, c) for c in columns] for x in self.server.entities[path[1]]]
+            return self._reply(201, {'columnNames': columns, 'rows': rows})
+        self._reply(201, {'path': self.path, 'size': len(body)})
+
+
+    def do_PUT(self):
+        self.server.hits+=1
+        path, q=self._route()
+        body=self._body()
+        if len(path) == 5 and path[:2] == ['qrs', 'selection'] and path[4] == 'synthetic' and path[2] in self.server.selections:
+            ids=set(self.server.selections[path[2]])
+            values={p['name']: p['value'] for p in json.loads(body)['properties'] if p.get('valueIsModified')}
+            items=self.server.entities.get(path[3], [])
+            tags={x['id']: x for x in self.server.entities['tag']}
+            for i, x in enumerate(items):
+                if x['id'] in ids:
+                    x=dict(x, **{k: v for k, v in values.items() if k != 'refList_Tag' and not k.startswith('@')})
+                    for k, v in values.items():
+                        # synthetic names: refList_Tag and @<custom property>
+                        if k == 'refList_Tag':
+                            x['tags']=[t for t in x['tags'] if t['id'] not in v['removed']]+[tags[t] for t in v['added']]
+                        elif k.startswith('@'):
+                            x['customProperties']=[c for c in x['customProperties'] if c['definition']['name'] != k[1:] or
+                                                   c['value'] not in v['removed']]+[{'definition': {'name': k[1:]}, 'value': c} for c in v['added']]
+                    items[i]=x
+            self.server._payloads.pop(path[3], None)
+            return self._reply(204)
+        self._reply(200, {'path': self.path})
+
+
+    def do_DELETE(self):
+        self.server.hits+=1
+        path, q=self._route()
+        if path == ['qrs', 'notification']:
+            self.server.subscriptions.pop(q.get('handle'), None)
+        if path[:2] == ['qrs', 'selection'] and len(path) == 3:
+            self.server.selections.pop(path[2], None)
+        if path[:2] == ['qrs', 'selection'] and len(path) == 4 and path[2] in self.server.selections:
+            ids=set(self.server.selections[path[2]])
+            self.server.entities[path[3]][:]=[x for x in self.server.entities.get(path[3], []) if x['id'] not in ids]
+            self.server._payloads.pop(path[3], None)
+        self._reply(204)
+
+
+
+class StubServer(ThreadingHTTPServer):
+    '''
+    Repository/proxy stand-in running in a background thread:
+        with StubServer(apps=10000) as stub:
+            qrs=QRS(schema='http', proxy=stub.address)
+    '''
+    daemon_threads=True
+    request_queue_size=128
+
+
+    def __init__(self, apps=1000, users=1000, streams=20, download=16 << 20, version='20.1.2', port=0, certfile=None, keyfile=None):
+        '''
+            @param apps, users, streams: number of entities served in the /full collections
+            @param download: size in bytes of the exported qvf
+            @param version: buildVersion answered by /qrs/about
+            @param port: listening port (0 for any free port)
+            @param certfile, keyfile: serve https with this certificate
+        '''
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.version=version
+        self.entities=_entities(apps, users, streams)
+        self.blob=bytes(range(256))*(download // 256)+bytes(download % 256)
+        self.hits=0
+        self.subscriptions={}
+        self.selections={}
+        self._payloads={}
+        if certfile:
+            context=ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.socket=context.wrap_socket(self.socket, server_side=True)
+        self._thread=threading.Thread(target=self.serve_forever, daemon=True)
+
+
+    def payload(self, kind, items):
+        # the full collections are encoded once, the benchmarks must measure the client
+        if items is self.entities[kind]:
+            if kind not in self._payloads:
+                self._payloads[kind]=json.dumps(items).encode('utf-8')
+            return self._payloads[kind]
+        return items
+
+
+    def notify(self, objectType, changeType, objectID):
+        '''
+        @Function: push a change to the subscribed callbacks, as the repository does
+        @param changeType: Add, Update or Delete
+        @return: number of callbacks reached
+        '''
+        if changeType in ('Add', 'Update', 'Delete') and objectType.lower() in self.entities:
+            items=self.entities[objectType.lower()]
+            for i, x in enumerate(items):
+                if x['id'] == objectID:
+                    if changeType == 'Delete':
+                        del items[i]
+                    else:
+                        items[i]=dict(x, modifiedDate=time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()))
+                    self._payloads.pop(objectType.lower(), None)
+                    break
+        body=json.dumps([{'objectType': objectType, 'objectID': objectID, 'changeType': {'Add': 1, 'Update': 2, 'Delete': 3}[changeType],
+                          'changedProperties': [], 'schemaPath': objectType}]).encode('utf-8')
+        sent=0
+        for name, change, url in list(self.subscriptions.values()):
+            if name == objectType.lower() and change in (None, changeType):
+                ur.urlopen(ur.Request(url, body, {'Content-Type': 'application/json'}), timeout=5).close()
+                sent+=1
+        return sent
+
+
+    def handle_error(self, request, client_address):
+        # clients closing the connection early (i.e. ranged downloads) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionError, ssl.SSLError)):
+            super().handle_error(request, client_address)
+
+
+    @property
+    def address(self):
+        return '{0}:{1}'.format(*self.server_address)
+
+
+    def start(self):
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,249 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import os.path, json
+import requests as req
+import urllib.parse as up
+
+from ._controller import _Controller
+from ._cache import _ResponseCache
+from ._flight import _AsyncSingleFlight
+from ._trace import _Preview
+
+try:
+    import aiohttp as _aiohttp
+    import yarl as _yarl
+except ImportError:
+    _aiohttp=None
+
+
+
+class _AsyncResponse(object):
+    """ Buffered response, mimics the subset of requests.Response used by the interfaces"""
+
+    def __init__(self, method, url, status, reason, headers, content):
+        self.method     =method
+        self.url        =url
+        self.status_code=status
+        self.reason     =reason
+        self.headers    =headers
+        self.content    =content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self, **kwargs):
+        return json.loads(self.content, **kwargs)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise req.HTTPError('{0} Error: {1} for url: {2}'.format(self.status_code, self.reason, self.url), response=self)
+
+    def __repr__(self):
+        return '<_AsyncResponse [{0}]>'.format(self.status_code)
+
+
+
+class _AsyncController(_Controller):
+    """ Handler REST-API QRS, asyncio flavour (requires aiohttp)"""
+
+    def __init__(self, schema, proxy, port, vproxy, certificate, verify, user, verbosity, logName, limit=100, coalesce=False):
+        '''
+            @Function setup: Setup the connection and initialize handlers, same params as _Controller
+            @param limit: max number of simultaneous connections (requests in flight)
+            @param coalesce: identical GETs in flight (same url, params and user) are sent once and share the response
+        '''
+        if _aiohttp is None:
+            raise ImportError('aiohttp is required by the asyncio driver, install qsAPI[async]')
+
+        super().__init__(schema, proxy, port, vproxy, certificate, verify, user, verbosity, logName)
+
+        if self.Password and not self.cafile:
+            raise ValueError('NTLM authentication (user password) is not supported by the asyncio driver, use a client certificate or the QRS/QPS interfaces')
+
+        self.session=None
+        self.limit=int(limit)
+        self.flight=_AsyncSingleFlight() if coalesce else None
+
+
+    def _session(self):
+        # the aiohttp session must be bound to the running loop, so it is built on first use
+        if self.session is None or self.session.closed:
+            connector=_aiohttp.TCPConnector(limit=self.limit, ssl=self._sslcontext)
+            self.session=_aiohttp.ClientSession(connector=connector, headers={'User-agent': self._referer})
+        return self.session
+
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session=None
+
+
+    async def _request(self, method, url, hd, par, data=None, stream=False):
+        # redirections are followed here to keep the Xrfkey and virtual proxy on every hop
+        session=self._session()
+        rc=0
+        while True:
+            self.log.debug('SEND: %s', url)
+            r=await session.request(method, _yarl.URL(url, encoded=True), headers=hd, data=data, allow_redirects=False)
+            if r.status not in (301, 302, 303, 307, 308) or 'Location' not in r.headers:
+                break
+            rc+=1
+            if rc > 30:
+                r.release()
+                raise req.HTTPError('Too many redirections')
+            url=self._params_update(up.urljoin(url, r.headers['Location']), par)
+            if r.status == 303:
+                method, data = 'GET', None
+            r.release()
+            self.log.debug('REDIR: %s', url)
+
+        if stream:
+            return(r)
+
+        content=await r.read()
+        r.release()
+        response=_AsyncResponse(method, str(r.url), r.status, r.reason, r.headers, content)
+        self.log.debug('RECV: %s', _Preview(response, self.trace_limit))
+        return(response)
+
+
+    async def call(self, method, apipath, param=None, data=None, files=None):
+        """ initialize control structure """
+
+        if str(method).upper() not in ('GET', 'POST', 'PUT', 'DELETE'):
+            raise ValueError('invalid method <{0}>'.format(method))
+        if files is not None:
+            raise TypeError('files are not supported by the asyncio driver, use upload(apipath, filename)')
+
+        if self.flight is not None and data is None and str(method).upper() == 'GET':
+            key=_ResponseCache.key(apipath, self._params_norm(param), (self.UserDirectory, self.UserId))
+            return await self.flight.do(key, lambda: self._dispatch(method, apipath, param))
+        return await self._dispatch(method, apipath, param, data)
+
+
+    async def _dispatch(self, method, apipath, param=None, data=None):
+        self.log.info('API %s <%s>', method[:3], apipath)
+
+        (par,hd)=self._params_prepare(param)
+        url=self._url(apipath, par)
+
+        return await self._request(method.upper(), url, hd, par, data)
+
+
+
+    async def download(self, apipath, filename, param=None):
+        """ initialize control structure """
+
+        self.log.info('API DOWN <%s>', apipath)
+
+        (par,hd)=self._params_prepare(param)
+        url=self._url(apipath, par)
+
+        r=await self._request('GET', url, hd, par, stream=True)
+        if r.status >= 400:
+            # the error body is not the file, the caller checks the response
+            content=await r.read()
+            r.release()
+            self.log.error('__Download failed <%s>: HTTP %s', apipath, r.status)
+            return(_AsyncResponse('GET', str(r.url), r.status, r.reason, r.headers, content))
+
+        try:
+            with open(filename, 'wb') as f:
+                self.log.info('__Downloading (in %sKb blocks): ', str(self.chunk_size))
+                async for chunk in r.content.iter_chunked(self.chunk_size << 10):
+                    f.write(chunk)
+                self.log.info('__Saved: %s', os.path.abspath(filename))
+        finally:
+            r.release()
+
+        return(_AsyncResponse('GET', str(r.url), r.status, r.reason, r.headers, b''))
+
+
+
+    async def upload(self, apipath, filename, param=None):
+        """ initialize control structure """
+
+        async def upload_in_chunks(filename, chunksize):
+            with open(filename, 'rb') as file:
+                while True:
+                    data = file.read(chunksize)
+                    if not data:
+                        break
+                    yield data
+
+        self.log.info('API UPLO <%s>', apipath)
+
+        (par,hd)=self._params_prepare(param, {'Content-Type': 'application/vnd.qlik.sense.app'})
+        hd['Content-Length']=str(os.path.getsize(filename))
+        url=self._url(apipath, par)
+
+        self.log.info('__Uploading {:,} bytes'.format(os.path.getsize(filename)))
+        r=await self._request('POST', url, hd, par, data=upload_in_chunks(filename, self.chunk_size << 10))
+        self.log.info('__Done.')
+
+        return(r)
+
+
+
+    async def get(self, apipath, param=None):
+        '''
+        @Function get: generic purpose call
+        @param apipath: uri REST path
+        @param param : whatever other param needed in form a dict
+                      (example: {'filter': "name eq 'myApp'} )
+        '''
+        return await self.call('GET', apipath, param)
+
+
+
+    async def post(self, apipath, param=None, data=None, files=None):
+        '''
+        @Function post: generic purpose call
+        @param apipath: uri REST path
+        @param param : whatever other param needed in form a dict
+                      (example: {'filter': "name eq 'myApp'} )
+        @param data : stream data input (native dict/list structures are json formated)
+        @param files : metafile input (not supported)
+        '''
+        if isinstance(data,dict) or isinstance(data,list):
+            data=json.dumps(data)
+        return await self.call('POST', apipath, param, data, files)
+
+
+
+    async def put(self, apipath, param=None, data=None):
+        '''
+        @Function put: generic purpose call
+        @param apipath: uri REST path
+        @param param : whatever other param needed in form a dict
+                      (example: {'filter': "name eq 'myApp'} )
+        @param data : stream data input (native dict/list structures are json formated)
+        '''
+        if isinstance(data,dict) or isinstance(data,list):
+            data=json.dumps(data)
+        return await self.call('PUT', apipath, param, data)
+
+
+
+    async def delete(self, apipath, param=None):
+        '''
+        @Function delete: generic purpose call
+        @param apipath: uri REST path
+        @param param : whatever other param needed in form a dict
+                      (example: {'filter': "name eq 'myApp'} )
+        '''
+        return await self.call('DELETE', apipath, param)
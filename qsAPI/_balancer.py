@@ -0,0 +1,90 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import time, threading
+
+
+
+class _Node(object):
+    """ Repository node (central or rim) with its load and health"""
+
+    def __init__(self, url, proxies):
+        self.url=url
+        self.proxies=proxies
+        self.inflight=0
+        self.calls=0
+        self.errors=0
+        self.failures=0
+        self.down_until=0.0
+
+
+    def status(self):
+        return {'url': self.url, 'inflight': self.inflight, 'calls': self.calls, 'errors': self.errors,
+                'healthy': self.down_until <= time.monotonic()}
+
+
+
+class _Balancer(object):
+    """ Least outstanding requests selection of the nodes, the first one is the central node"""
+
+    def __init__(self, nodes, cooldown=30, failures=3):
+        '''
+            @Function setup: balancer of the read-only calls
+            @param nodes: list of _Node, central first
+            @param cooldown: seconds a node is left out after failing
+            @param failures: consecutive failures (connection errors or 5xx) to leave a node out
+        '''
+        self.nodes=list(nodes)
+        self.cooldown=cooldown
+        self.failures=int(failures)
+        self._lock=threading.Lock()
+
+
+    @property
+    def central(self):
+        return self.nodes[0]
+
+
+    def acquire(self, exclude=None):
+        '''
+        @param exclude: node to avoid when there are others (i.e. the one already serving a hedged call)
+        @return: healthy node with less requests in flight (the one coming back first if all are down)
+        '''
+        now=time.monotonic()
+        with self._lock:
+            nodes=[n for n in self.nodes if n is not exclude] or self.nodes
+            healthy=[n for n in nodes if n.down_until <= now]
+            if healthy:
+                node=min(healthy, key=lambda n: (n.inflight, n.calls))
+            else:
+                node=min(nodes, key=lambda n: n.down_until)
+            node.inflight+=1
+            node.calls+=1
+            return node
+
+
+    def release(self, node, ok=True):
+        with self._lock:
+            node.inflight-=1
+            if ok:
+                node.failures=0
+                node.down_until=0.0
+                return False
+            node.errors+=1
+            node.failures+=1
+            if node.failures >= self.failures:
+                node.down_until=time.monotonic()+self.cooldown
+                return True
+            return False
+
+
+    def status(self):
+        with self._lock:
+            return [n.status() for n in self.nodes]
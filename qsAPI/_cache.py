@@ -0,0 +1,197 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import os, re, json, time, threading, tempfile
+import urllib.parse as up
+from collections import OrderedDict
+
+
+
+# POST endpoints that only read data
+_READONLY=re.compile(r'/table$')
+_GUID=re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.I)
+
+
+def _endpointKey(apipath):
+    # /qrs/app/{guid}/... share the same key
+    return _GUID.sub('{id}', apipath.split('?')[0].lower())
+
+
+
+class _ResponseCache(object):
+    """ LRU cache of GET responses with per endpoint TTL and revalidation"""
+
+    # metadata of the site barely changes, entities use the default ttl
+    TTLS=((r'^/qrs/about/api/', 86400),
+          (r'^/qrs/about',      3600),
+          (r'^/qrs/ssl/ping',   0))
+    
+    READONLY=_READONLY
+
+
+    def __init__(self, size=512, ttl=30, ttls=None):
+        '''
+            @Function setup: cache of responses
+            @param size: max number of responses kept (least recently used are evicted)
+            @param ttl: default time to live in seconds
+            @param ttls: dict {regex path: ttl} checked before the defaults, first match wins
+        '''
+        self.size=int(size)
+        self.ttl=ttl
+        self.ttls=[(re.compile(p), t) for p, t in (ttls or {}).items()] + [(re.compile(p), t) for p, t in self.TTLS]
+        self._entries=OrderedDict()
+        self._lock=threading.Lock()
+        self.hits=self.misses=0
+        self.generation=0
+
+
+    @staticmethod
+    def path(apipath):
+        return up.urlsplit(up.urljoin('/', apipath)).path.lower()
+
+
+    @classmethod
+    def key(cls, apipath, par, user):
+        url=up.urlsplit(up.urljoin('/', apipath))
+        query=up.parse_qsl(url.query)+[(k, v) for k, v in par.items() if k != 'Xrfkey']
+        return(url.path.lower(), tuple(sorted(query)), user)
+
+
+    def _ttl(self, path):
+        for p, t in self.ttls:
+            if p.search(path):
+                return t
+        return self.ttl
+
+
+    def get(self, key):
+        '''
+        @return: (response, fresh) or (None, False) when not cached
+        '''
+        with self._lock:
+            entry=self._entries.get(key)
+            if entry is None:
+                self.misses+=1
+                return(None, False)
+            self._entries.move_to_end(key)
+            fresh= entry[1] > time.monotonic()
+            if fresh:
+                self.hits+=1
+            else:
+                self.misses+=1
+            return(entry[0], fresh)
+
+
+    def validators(self, response):
+        '''
+        @return: conditional headers to revalidate a stale response
+        '''
+        hd={}
+        if response.headers.get('ETag'):
+            hd['If-None-Match']=response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            hd['If-Modified-Since']=response.headers['Last-Modified']
+        return(hd)
+
+
+    def put(self, key, response, generation=None):
+        '''
+        @param generation: value of self.generation when the GET was sent, the response is not kept
+                            if something was invalidated meanwhile (it could predate a write)
+        '''
+        ttl=self._ttl(key[0])
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if ttl <= 0:
+                self._entries.pop(key, None)
+                return
+            self._entries[key]=(response, time.monotonic()+ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+    def invalidate(self, apipath=None):
+        '''
+        @Function: drop the responses of the entity type touched by apipath (all of them by default),
+                    i.e. /qrs/app/{id}/publish invalidates every /qrs/app... response
+        '''
+        with self._lock:
+            if apipath is None:
+                self.generation+=1
+                self._entries.clear()
+                return
+            path=self.path(apipath)
+            if self.READONLY.search(path):
+                return
+            self.generation+=1
+            prefix='/'.join(path.split('/')[:3])
+            for k in [k for k in self._entries if k[0] == prefix or k[0].startswith(prefix+'/')]:
+                del self._entries[k]
+
+
+    def clear(self):
+        self.invalidate()
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+
+class _VersionCache(object):
+    """ On-disk cache of the server versions by host:port, shared by short-lived processes"""
+
+    PATH=os.path.join(os.path.expanduser('~'), '.qsapi_versions.json')
+
+
+    def __init__(self, path=None, ttl=86400):
+        '''
+            @Function setup: version cache file
+            @param path: json file, ~/.qsapi_versions.json by default
+            @param ttl: seconds a stored version is trusted
+        '''
+        self.path=path or self.PATH
+        self.ttl=ttl
+
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+    def get(self, key):
+        '''
+        @return: the stored version string or None when missing or expired
+        '''
+        entry=self._load().get(key)
+        if isinstance(entry, dict) and entry.get('expires', 0) > time.time():
+            return entry.get('version')
+        return None
+
+
+    def put(self, key, version):
+        # best effort: a read-only home or a concurrent writer only costs the /qrs/about call
+        now=time.time()
+        data={k: v for k, v in self._load().items() if isinstance(v, dict) and v.get('expires', 0) > now}
+        data[key]={'version': str(version), 'expires': now+self.ttl}
+        tmp=None
+        try:
+            fd, tmp=tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.part')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
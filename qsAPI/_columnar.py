@@ -0,0 +1,182 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import re
+
+try:
+    import numpy as _np
+except ImportError:
+    _np=None
+
+
+
+_DATE=re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?Z?$')
+# the repository stores "never" (never reloaded, never used...) as the minimum .NET date
+_NEVER='1753-01-01T00:00:00'
+
+
+
+def _path(entity, parts):
+    for part in parts:
+        if not hasattr(entity, 'get'):
+            return None
+        entity=entity.get(part)
+    return entity
+
+
+
+class _Categorical(object):
+    """ Dictionary encoded strings: codes (int32, -1 for None) into categories"""
+
+    def __init__(self, values):
+        index={}
+        codes=_np.empty(len(values), dtype=_np.int32)
+        for i, v in enumerate(values):
+            codes[i]=-1 if v is None else index.setdefault(v, len(index))
+        self.codes=codes
+        self.categories=_np.array(list(index), dtype=object)
+
+
+    def __len__(self):
+        return len(self.codes)
+
+
+    def __getitem__(self, i):
+        c=self.codes[i]
+        if isinstance(c, _np.ndarray):
+            return [None if x < 0 else self.categories[x] for x in c]
+        return None if c < 0 else self.categories[c]
+
+
+    def __eq__(self, value):
+        # vectorized comparison, i.e. apps[cols['published'] & (cols['stream.name'] == 'Everyone')]
+        hits=_np.flatnonzero(self.categories == value)
+        return self.codes == hits[0] if len(hits) else _np.zeros(len(self.codes), dtype=bool)
+
+
+    def __ne__(self, value):
+        return ~(self == value)
+
+
+    __hash__=None
+
+
+    def __repr__(self):
+        return '<_Categorical {0} values, {1} categories>'.format(len(self.codes), len(self.categories))
+
+
+
+def _column(values):
+    present=[v for v in values if v is not None]
+    if not present:
+        return _np.full(len(values), _np.nan)
+    if all(isinstance(v, bool) for v in present):
+        if len(present) == len(values):
+            return _np.array(values, dtype=bool)
+        return _np.array([_np.nan if v is None else float(v) for v in values])
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        if len(present) == len(values) and all(isinstance(v, int) for v in present):
+            return _np.array(values, dtype=_np.int64)
+        return _np.array([_np.nan if v is None else v for v in values], dtype=_np.float64)
+    if all(isinstance(v, str) and _DATE.match(v) for v in present):
+        return _np.array(['NaT' if v is None or v.startswith(_NEVER) else v.rstrip('Z') for v in values], dtype='datetime64[ms]')
+    if all(isinstance(v, str) for v in present):
+        return _Categorical(values)
+    return _np.array(values, dtype=object)
+
+
+
+class _Columns(dict):
+    """ Columns of a list of entities by dotted path: numpy arrays (int64, float64 with NaN, bool, datetime64[ms]
+        with NaT) or _Categorical for the strings"""
+
+    @property
+    def rows(self):
+        return len(next(iter(self.values()), ()))
+
+
+    @staticmethod
+    def _codes(column):
+        if isinstance(column, _Categorical):
+            return column.codes, column.categories
+        categories, codes=_np.unique(column, return_inverse=True)
+        return codes.astype(_np.int32), categories
+
+
+    def aggregate(self, by, column=None, how='sum'):
+        '''
+        @Function: vectorized group by (i.e. file sizes by owner: aggregate('owner.userId', 'fileSize'))
+        @param by: column with the groups
+        @param column: column aggregated (not needed to count), numbers, booleans or dates
+        @param how: sum, mean, count, min or max (datetime columns support count, min and max)
+        @return: dict(group: value)
+        '''
+        codes, categories=self._codes(self[by])
+        keep=codes >= 0
+        codes=codes[keep]
+        n=len(categories)
+        if how == 'count':
+            result=_np.bincount(codes, minlength=n)
+            return dict(zip(categories.tolist(), result.tolist()))
+
+        values=self[column]
+        if isinstance(values, _Categorical) or values.dtype.kind not in 'biufM':
+            raise TypeError('column <{0}> is not numeric, only count is supported'.format(column))
+        values=values[keep]
+        dates=values.dtype.kind == 'M'
+        if dates:
+            missing=_np.isnat(values)
+            values=values.astype(_np.int64).astype(_np.float64)
+            values[missing]=_np.nan
+        valid=~_np.isnan(values) if values.dtype.kind == 'f' else _np.ones(len(values), dtype=bool)
+        codes, values=codes[valid], values[valid].astype(_np.float64)
+
+        if how in ('sum', 'mean'):
+            result=_np.bincount(codes, weights=values, minlength=n)
+            if how == 'mean':
+                with _np.errstate(invalid='ignore', divide='ignore'):
+                    result=result/_np.bincount(codes, minlength=n)
+        elif how in ('min', 'max'):
+            result=_np.full(n, _np.inf if how == 'min' else -_np.inf)
+            (_np.minimum if how == 'min' else _np.maximum).at(result, codes, values)
+            result[_np.isinf(result)]=_np.nan
+        else:
+            raise ValueError('invalid aggregation <{0}>'.format(how))
+
+        if dates:
+            out=_np.full(n, _np.datetime64('NaT'), dtype='datetime64[ms]')
+            ok=~_np.isnan(result)
+            out[ok]=result[ok].astype(_np.int64).astype('datetime64[ms]')
+            return dict(zip(categories.tolist(), out))
+        return dict(zip(categories.tolist(), result.tolist()))
+
+
+
+def _toColumns(entities, columns=None):
+    '''
+    @Function: convert a list of entities (dicts or records) into columns
+    @param entities: list of entities
+    @param columns: dotted paths (example: ['fileSize', 'stream.name', 'owner.userId', 'lastReloadTime']),
+                    the scalar attributes of the first entity by default
+    @return: _Columns (dict path: array)
+    '''
+    if _np is None:
+        raise ImportError('numpy is required by the columnar export, install qsAPI[numpy]')
+
+    entities=list(entities)
+    if columns is None:
+        first=entities[0] if entities else {}
+        columns=[k for k in first.keys() if not isinstance(first.get(k), (dict, list, tuple)) and not hasattr(first.get(k), 'keys')]
+
+    result=_Columns()
+    for c in columns:
+        parts=c.split('.')
+        result[c]=_column([_path(e, parts) for e in entities])
+    return result
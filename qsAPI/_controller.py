@@ -11,8 +11,18 @@
 import sys, os.path
 import requests as req
 import urllib.parse as up
-import random, string, json, re
-import logging
+import random, string, json, re, copy, functools
+import logging, threading, time, weakref
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+
+from ._cache import _ResponseCache
+from ._trace import _Preview, _traceCall
+from ._transport import _Adapter, _SessionContext, _resetTimings, _getTimings
+from ._metrics import _Metrics
+from ._balancer import _Balancer, _Node
+from ._hedge import _Hedge
+from ._limiter import _Limiter, _Retry
+from ._flight import _SingleFlight
 
 
 
@@ -20,17 +30,20 @@ class _Controller(object):
     """ Handler REST-API QRS"""
        
     _referer='Mozilla/5.0 (Windows NT 6.3; Win64; x64) qsAPI APIREST (QSense)'
+    _xrfchars=string.ascii_letters + string.digits
     
     try:
         from requests_ntlm import HttpNtlmAuth as _ntlm
     except ImportError:
         _ntlm=None  
     
-    def __init__(self, schema, proxy, port, vproxy, certificate, verify, user, verbosity, logName):
+    def __init__(self, schema, proxy, port, vproxy, certificate, verify, user, verbosity, logName, workers=None, download_parts=1, download_retries=3, cache=None, trace_limit=1024, hooks=None, metrics=False, \
+                 pool_connections=None, pool_maxsize=None, warmup=0, keepalive=None, ping_path=None, \
+                 node_cooldown=30, node_failures=3, hedge=None, concurrency=None, retries=None, coalesce=False):
         ''' 
             @Function setup: Setup the connection and initialize handlers
             @param schema: http/https
-            @param proxy: hostname to connect
+            @param proxy: hostname to connect, or list of 'host:port' [central, rim1, rim2...] to spread the read-only GETs
             @param port: port number
             @param vproxy: virtual proxy conf. {preffix:'proxy', path: '^/qrs/', template:'/{}/qrs/'})
             @param certificate: path to .pem client certificate
@@ -38,7 +51,29 @@ class _Controller(object):
             @param user: dict with keys {userDirectory:, userID:, password:} or tuple
             @param verbosity: debug level
             @param logger: logger instance name
+            @param workers: number of threads expected to share this handler, sizes the connection pool
+            @param download_parts: number of byte ranges fetched in parallel by download (when the server allows it)
+            @param download_retries: times a dropped download is resumed from the last byte written
+            @param cache: cache GET responses, True or dict with {size:, ttl:, ttls:{regex path: ttl}}
+            @param trace_limit: max bytes of the bodies shown at DEBUG level
+            @param hooks: list of callables receiving a dict with the timings of every call (see _record)
+            @param metrics: if True the records are aggregated in self.metrics (see _Metrics.prometheus)
+            @param pool_connections: number of hosts with a connection pool (workers or 10 by default)
+            @param pool_maxsize: keep-alive connections kept by host (workers or 10 by default)
+            @param warmup: number of connections opened in parallel at construction
+            @param keepalive: seconds between the pings sent through the idle connections (daemon thread)
+            @param ping_path: cheap GET endpoint used by keepalive, i.e. /qrs/ssl/ping (otherwise connections are only checked)
+            @param node_cooldown: seconds a failing node is left out of the balancing
+            @param node_failures: consecutive failures (connection errors or 5xx) to leave a node out
+            @param hedge: duplicate slow GETs, True or dict with {percentile:, window:, min_samples:, min_delay:, budget:} (see _Hedge)
+            @param concurrency: adaptive limit of the requests in flight, True or dict with {initial:, minimum:, maximum:, decrease:, spike:} (see _Limiter)
+            @param retries: retries on 429/503 and connection errors, number or dict with {total:, backoff:, max_backoff:, statuses:} (see _Retry)
+            @param coalesce: identical GETs in flight (same url, params and user) are sent once and share the response
         '''
+        self._local   = threading.local()
+        nodes         = proxy if isinstance(proxy, (list, tuple)) else None
+        if nodes:
+            (proxy, port)=nodes[0].split(':')
         self.proxy    = proxy
         self.port     = str(port)
         self.proxy    = proxy;
@@ -47,6 +82,7 @@ class _Controller(object):
         self.request  = None
         self.response = None
         self.session  = None
+        self._headers = None
         
         if vproxy:
             self.setVProxy(**vproxy)
@@ -54,6 +90,46 @@ class _Controller(object):
         self.setUser(**user) if isinstance(user, dict) else self.setUser(*user)
           
         self.chunk_size = 512 #Kb
+        self.download_parts   = int(download_parts)
+        self.download_retries = int(download_retries)
+        self.trace_limit      = int(trace_limit)
+        
+        if cache is True:
+            self.cache=_ResponseCache()
+        elif isinstance(cache, dict):
+            self.cache=_ResponseCache(**cache)
+        else:
+            self.cache=cache or None
+        
+        if hedge is True:
+            self.hedge=_Hedge()
+        elif isinstance(hedge, dict):
+            self.hedge=_Hedge(**hedge)
+        else:
+            self.hedge=hedge or None
+        self._executor=None
+        self._executorLock=threading.Lock()
+        
+        if concurrency is True:
+            self.limiter=_Limiter()
+        elif isinstance(concurrency, dict):
+            self.limiter=_Limiter(**concurrency)
+        else:
+            self.limiter=concurrency or None
+        
+        if isinstance(retries, dict):
+            self.retry=_Retry(**retries)
+        elif isinstance(retries, int) and not isinstance(retries, bool):
+            self.retry=_Retry(total=retries) if retries > 0 else None
+        else:
+            self.retry=retries or None
+        
+        self.flight=_SingleFlight() if coalesce else None
+        
+        self.hooks=list(hooks or [])
+        self.metrics=_Metrics() if metrics is True else (metrics or None)
+        if self.metrics is not None:
+            self.hooks.append(self.metrics)
         
         self.log=logging.getLogger(logName)
         if not self.log.hasHandlers():
@@ -79,28 +155,96 @@ class _Controller(object):
         
         self.session=req.Session()
         
+        # client certificate loaded once, TLS sessions resumed by the new connections
+        self._sslcontext=_SessionContext.build(self.cafile or None, self._verify)
+        
+        # one pooled keep-alive connection per worker thread sharing the handler
+        self.pool_maxsize=int(pool_maxsize or workers or 10)
+        self._adapter=_Adapter(pool_connections=int(pool_connections or workers or 10), pool_maxsize=self.pool_maxsize, \
+                               ssl_context=self._sslcontext)
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        
+        # environment proxies are resolved once, requests would scan os.environ on every send
+        self._proxies=dict(self.session.proxies)
+        if self.session.trust_env:
+            for k, v in req.utils.get_environ_proxies(self.baseurl).items():
+                self._proxies.setdefault(k, v)
+        
+        # rim nodes share the read-only traffic, writes and transfers stay in the central node
+        self._balancer=None
+        if nodes and len(nodes) > 1:
+            self._balancer=_Balancer([_Node(self.baseurl, self._proxies)]+[self._node(schema, n) for n in nodes[1:]], node_cooldown, node_failures)
+        
         if self._ntlm and not self.cafile:
             self.log.debug('NTLM authentication enabled')
             self.session.auth = self._ntlm('{domain}\\{user}'.format(domain=self.UserDirectory, user=self.UserId), self.Password)
         
+        self.ping_path=ping_path
+        self._keepalive=None
+        if warmup:
+            self.warmup(warmup)
+        if keepalive:
+            self.keepalive(keepalive)
         
+    
+    # last request/response are kept per thread, so a handler can be shared by a pool of workers
+    @property
+    def request(self):
+        return getattr(self._local, 'request', None)
+    
+    @request.setter
+    def request(self, value):
+        self._local.request=value
+    
+    
+    @property
+    def response(self):
+        return getattr(self._local, 'response', None)
+    
+    @response.setter
+    def response(self, value):
+        self._local.response=value
+    
+    
     def setVProxy(self, preffix, path, template):
         self.vproxy={}
         self.vproxy['preffix'] =preffix               # proxy
         self.vproxy['path']    =re.compile(path)      # ^/qrs/
         self.vproxy['template']=template              # /{}/qrs/
         self.vproxy['pxpath']  =template.format(preffix)    
+        self._headers_build()
  
         
     def setUser(self, userDirectory, userID, password=None):
         self.UserDirectory=userDirectory
         self.UserId = userID
         self.Password=password
+        self._headers_build()
+    
+    
+    def _headers_build(self):
+        # fixed headers of every call, only the Xrfkey changes
+        if not hasattr(self, 'UserId'):
+            return
+        self._headers={ 'User-agent': self._referer,
+                        'Pragma': 'no-cache',
+                        'X-Qlik-User': 'UserDirectory={directory}; UserId={user}'.format(directory=self.UserDirectory, user=self.UserId),
+                        'x-Qlik-Xrfkey': None,
+                        'Accept': 'application/json',
+                        'Content-Type': 'application/json'}
+        if self.vproxy:
+            self._headers['X-Qlik-Virtual-Proxy-Prefix']=self.vproxy['preffix']
             
     
     @staticmethod
     def normalize(schema, proxy, port, certificate):
         
+        if isinstance(proxy, (list, tuple)):
+            # several nodes, every one as host:port
+            nodes=[_Controller.normalize(schema, p, port, certificate) for p in proxy]
+            return(nodes[0][0], ['{0}:{1}'.format(p, n) for (_, p, n) in nodes], nodes[0][2])
+        
         if '://' in proxy:
             schema, proxy = proxy.split('://')
         if not certificate and isinstance(port, int):
@@ -111,31 +255,181 @@ class _Controller(object):
         return(schema, proxy, port)
     
         
+    def _node(self, schema, host):
+        url='{schema}://{host}'.format(schema=schema, host=host)
+        proxies=dict(self.session.proxies)
+        if self.session.trust_env:
+            for k, v in req.utils.get_environ_proxies(url).items():
+                proxies.setdefault(k, v)
+        return _Node(url, proxies)
+    
+    
+    def nodes(self):
+        '''
+        @return: list with the load and health of every node, central first
+        '''
+        if self._balancer is None:
+            return [{'url': self.baseurl, 'healthy': True}]
+        return self._balancer.status()
+    
+    
+    def _bases(self):
+        return [n.url for n in self._balancer.nodes] if self._balancer else [self.baseurl]
+    
+    
+    def warmup(self, n):
+        '''
+        @Function: open n keep-alive connections in parallel, so the first burst of calls does not pay the handshakes
+        @return: number of connections open
+        '''
+        start=time.perf_counter()
+        opened=sum(self._adapter.warmup(url, self._verify, n) for url in self._bases())
+        self.log.info('Warmup: %s connections in %.3f s', opened, time.perf_counter()-start)
+        return opened
+    
+    
+    def keepalive(self, interval):
+        '''
+        @Function: every interval seconds ping through the idle connections (see ping_path) and reopen the dropped ones,
+                    None or 0 stops it
+        '''
+        if self._keepalive is not None:
+            self._keepalive.set()
+            self._keepalive=None
+        if not interval:
+            return
+        
+        # the thread only holds a weak reference, so an unused handler can still be collected
+        stop, ref=threading.Event(), weakref.ref(self)
+        def run():
+            while not stop.wait(interval):
+                driver=ref()
+                if driver is None:
+                    break
+                try:
+                    driver._pingIdle()
+                except Exception as e:
+                    driver.log.warning('keepalive: %s', e)
+                del driver
+        
+        threading.Thread(target=run, name='qsapi-keepalive', daemon=True).start()
+        self._keepalive=stop
+    
+    
+    def _pingIdle(self):
+        path=hd=None
+        if self.ping_path:
+            (par, hd)=self._params_prepare(None)
+            url=up.urlsplit(self._url(self.ping_path, par))
+            path=url.path+'?'+url.query
+        healthy=sum(self._adapter.keepalive(url, self._verify, path, hd) for url in self._bases())
+        self.log.debug('KEEPALIVE: %s connections', healthy)
+        return healthy
+    
+    
+    def close(self):
+        '''
+        @Function: stop the keepalive thread and close the pooled connections
+        '''
+        self.keepalive(None)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor=None
+        self.session.close()
+    
+    
+    def addHook(self, hook):
+        '''
+        @Function: register a callable receiving the record of every call, see _record
+        '''
+        self.hooks.append(hook)
+    
+    
+    def _apiName(self):
+        # first public interface method up in the stack using this driver (AppExport, TaskStart...)
+        f, name=sys._getframe(2), None
+        while f is not None:
+            obj=f.f_locals.get('self')
+            if obj is not None and getattr(obj, 'driver', None) is self:
+                fn=getattr(type(obj), f.f_code.co_name, None)
+                fn=getattr(fn, '_steps', fn)    # the frame of a method written as steps is the generator's
+                if getattr(fn, '__code__', None) is f.f_code:
+                    name=f.f_code.co_name
+                    if not name.startswith('_'):
+                        break
+            f=f.f_back
+        return name
+    
+    
+    def _emit(self, record):
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception as e:
+                self.log.warning('hook %s failed: %s', hook, e)
+    
+    
+    def _record(self, api, method, apipath, start, prepared, sent, response, ttfb, redirects, received=None):
+        '''
+        @Function: build the record of a call and send it to the hooks, fields:
+            event: 'call' (and 'decode' when response.json() is used)
+            api, method, path, status, redirects
+            sent, received: bytes of the bodies (received is None for streamed bodies not read yet)
+            connections: new connections opened
+            prepare, connect, tls, ttfb, transfer, total: seconds by phase
+        '''
+        now=time.perf_counter()
+        (tcp, connect, connections)=_getTimings()
+        total_send=now-prepared
+        record={'event'      : 'call',
+                'api'        : api,
+                'method'     : method.upper(),
+                'path'       : apipath,
+                'status'     : response.status_code,
+                'redirects'  : redirects,
+                'sent'       : sent,
+                'received'   : received,
+                'connections': connections,
+                'prepare'    : prepared-start,
+                'connect'    : tcp,
+                'tls'        : connect-tcp,
+                'ttfb'       : max(0.0, ttfb-connect),
+                'transfer'   : max(0.0, total_send-ttfb),
+                'total'      : now-start}
+        self._emit(record)
+        
+        # the json decoding happens later in the interfaces
+        decode=response.json
+        def timedJson(**kwargs):
+            t=time.perf_counter()
+            try:
+                return decode(**kwargs)
+            finally:
+                self._emit({'event': 'decode', 'api': api, 'method': record['method'], 'path': apipath, 'decode': time.perf_counter()-t})
+        response.json=timedJson
+    
+    
     def _params_prepare(self, param, xhd={}):
                 
-        par=dict({'Xrfkey': ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(16))})
+        xrf=''.join(random.choices(self._xrfchars, k=16))
+        par={'Xrfkey': xrf}
         if isinstance(param, dict):
+            debug=self.log.isEnabledFor(logging.DEBUG)
             for p,v in param.items():
                 if v is not None:
                     if isinstance(v, bool):
                         par[p]=str(v).lower()
                     else:
                         par[p]=str(v)
-                    self.log.debug(" >> %s=>%s",p , par[p])
-                else:
+                    if debug:
+                        self.log.debug(" >> %s=>%s",p , par[p])
+                elif debug:
                     self.log.debug(" >> %s=>(default)", p)
             
-        hd= { 'User-agent': self._referer,
-              'Pragma': 'no-cache',
-              'X-Qlik-User': 'UserDirectory={directory}; UserId={user}'.format(directory=self.UserDirectory, user=self.UserId),
-              'x-Qlik-Xrfkey': par.get('Xrfkey'),
-              'Accept': 'application/json',
-              'Content-Type': 'application/json'}
-        
-        if self.vproxy:
-            hd['X-Qlik-Virtual-Proxy-Prefix']=self.vproxy['preffix']
-                
-        hd.update(xhd)
+        hd=self._headers.copy()
+        hd['x-Qlik-Xrfkey']=xrf
+        if xhd:
+            hd.update(xhd)
         return(par, hd)  
     
     
@@ -148,77 +442,451 @@ class _Controller(object):
         p.update(par)
         query=up.urlencode(p,doseq=True,quote_via=up.quote)
         return up.urlunsplit((scheme, netloc, path, query, fragment))
+    
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _url_split(apipath, vpath=None, pxpath=None):
+        # apipath -> (origin, path, query), vproxy substitution included; the cache is shared by the
+        # handlers and keyed by the vproxy, bound to self it would keep every handler in a reference cycle
+        scheme, netloc, path, query, fragment=up.urlsplit(up.urljoin('/', apipath))
+        if vpath is not None:
+            path= vpath.sub(pxpath, path)
+        return(up.urlunsplit((scheme, netloc, '', '', '')) if netloc else None, path, query)
+    
+    
+    def _url(self, apipath, par, base=None):
+        '''
+        @Function: full url of apipath with the parameters, same as _params_update(urljoin(baseurl, apipath), par)
+                    but the path handling is cached by apipath
+        @param base: node url, baseurl by default
+        '''
+        if self.vproxy:
+            (origin, path, query)=self._url_split(apipath, self.vproxy['path'], self.vproxy['pxpath'])
+        else:
+            (origin, path, query)=self._url_split(apipath)
+        url=(origin or base or self.baseurl)+path
+        if query:
+            p=up.parse_qs(query)
+            p.update(par)
+            return url+'?'+up.urlencode(p, doseq=True, quote_via=up.quote)
+        return url+'?'+up.urlencode(par, quote_via=up.quote)
         
         
     
        
-    def call(self, method, apipath, param=None, data=None, files=None):
+    def call(self, method, apipath, param=None, data=None, files=None, stream=False):
         """ initialize control structure """
                
         if str(method).upper() not in ('GET', 'POST', 'PUT', 'DELETE'):
             raise ValueError('invalid method <{0}>'.format(method))
+        
+        if self.flight is not None and not stream and data is None and files is None and str(method).upper() == 'GET':
+            key=_ResponseCache.key(apipath, self._params_norm(param), (self.UserDirectory, self.UserId))
+            response=self.flight.do(key, lambda: self._call(method, apipath, param))
+            self.response=response
+            return(response)
+        
+        return self._call(method, apipath, param, data, files, stream)
+    
+    
+    def _params_norm(self, param):
+        # query parameters as sent, see _params_prepare
+        if not isinstance(param, dict):
+            return {}
+        return {p: (str(v).lower() if isinstance(v, bool) else str(v)) for p, v in param.items() if v is not None}
+    
+    
+    def _call(self, method, apipath, param=None, data=None, files=None, stream=False):
        
         self.log.info('API %s <%s>', method[:3], apipath)
+        start=time.perf_counter()
+        if self.hooks:
+            api=self._apiName()
+            _resetTimings()
         
         (par,hd)=self._params_prepare(param, {} if files is None else {'Content-Type': 'application/vnd.qlik.sense.app'})
         
         # Build the request        
         self.response= None
+        
+        cached=None
+        if self.cache is not None and not stream:
+            if str(method).upper() == 'GET':
+                key=self.cache.key(apipath, par, (self.UserDirectory, self.UserId))
+                generation=self.cache.generation
+                (cached, fresh)=self.cache.get(key)
+                if fresh:
+                    self.log.debug('CACHED: %s', apipath)
+                    self.response=cached
+                    return(cached)
+                if cached is not None:
+                    hd.update(self.cache.validators(cached))
+            else:
+                self.cache.invalidate(apipath)
             
-        url=self._params_update(up.urljoin(self.baseurl,apipath), par)
-        self.request=req.Request(method, url, headers=hd, data=data, files=files, auth=self.session.auth)
-        pr=self.session.prepare_request(self.request)
-                
-        self.log.debug('SEND: %s', self.request.url)
-                
-        # Execute the HTTP request
-        self.response = self.session.send(pr, cert=self.cafile, verify=self._verify, allow_redirects=False)
-        rc=0
-        while self.response.is_redirect:
-            rc+=1
-            if rc > self.session.max_redirects:
-                raise req.HTTPError('Too many redirections')
-            self.session.rebuild_auth(self.response.next, self.response)
-            self.response.next.prepare_headers(hd)
-            self.response.next.prepare_cookies(self.response.cookies)
-            self.response.next.url=self._params_update(self.response.next.url, par)
-            self.log.debug('REDIR: %s', self.response.next.url)
-            self.response = self.session.send(self.response.next, verify=self._verify, allow_redirects=False)
+        get=str(method).upper() == 'GET'
+        hedged=self.hedge is not None and get and files is None
+        
+        # only bodies that can be sent again are retried
+        retry=self.retry if files is None and (data is None or isinstance(data, (str, bytes))) else None
+        idempotent=retry is not None and retry.idempotent(method, apipath)
+        attempt=0
+        while True:
+            token=self.limiter.acquire() if self.limiter is not None else None
+            sent=time.perf_counter()
+            # any error but a clean answer counts as push back, the slot is given back whatever happens
+            (latency, overloaded)=(None, True)
+            try:
+                if hedged:
+                    result=self._hedged(method, apipath, par, hd, stream)
+                else:
+                    result=self._exchange(method, apipath, par, hd, data, files, stream, self._acquire(get))
+                latency=time.perf_counter()-sent
+                overloaded=result[2].status_code in (429, 503)
+            except req.ConnectionError as e:
+                wait=retry.onError(e, attempt, idempotent) if retry is not None else None
+                if wait is None:
+                    raise
+                self.log.warning('Retry %s of <%s> in %.2f s: %s', attempt+1, apipath, wait, e)
+            else:
+                response=result[2]
+                wait=retry.onResponse(response, attempt, idempotent) if retry is not None else None
+                if wait is None:
+                    break
+                self.log.warning('Retry %s of <%s> in %.2f s: HTTP %s', attempt+1, apipath, wait, response.status_code)
+                response.close()
+            finally:
+                if token is not None:
+                    self.limiter.release(token, self.limiter.key(apipath) if latency is not None else None, latency, overloaded)
+                # again once the write is done (or may be): a GET sent meanwhile could have cached the old body
+                if self.cache is not None and not get:
+                    self.cache.invalidate(apipath)
+            time.sleep(wait)
+            attempt+=1
+        
+        (request, pr, response, ttfb, rc, prepared)=result
+        if hedged:
+            self.request=request
             
-        self.log.debug('RECV: %s',self.response.text)
+        if self.hooks:
+            sent=len(pr.body) if isinstance(pr.body, (bytes, str)) else 0
+            self._record(api, method, apipath, start, prepared, sent, response, ttfb, rc, None if stream else len(response.content or b''))
+            
+        if stream:
+            _traceCall(self.log, method, request.url, response, time.perf_counter()-start, rc, stream)
+            self.response=response
+            return(response)
+        
+        if self.cache is not None and str(method).upper() == 'GET':
+            if response.status_code == 304 and cached is not None:
+                self.log.debug('NOT MODIFIED: %s', apipath)
+                response=cached
+            if response.ok:
+                # the copy drops the json timed by the hooks, its decode records belong to this call, not to the hits
+                self.cache.put(key, copy.copy(response) if 'json' in vars(response) else response, generation)
+        
+        self.log.debug('RECV: %s', _Preview(response, self.trace_limit))
+        _traceCall(self.log, method, request.url, response, time.perf_counter()-start, rc)
+        self.response=response
         
-        return(self.response)
+        return(response)
 
 
 
-    def download(self, apipath, filename, param=None):
+    def _acquire(self, get, exclude=None):
+        # read-only calls are balanced between the nodes
+        return self._balancer.acquire(exclude) if self._balancer is not None and get else None
+    
+    
+    def _exchange(self, method, apipath, par, hd, data, files, stream, node, timeout=None):
+        '''
+        @Function: build, send and follow the request, a node unreachable falls back to the central one
+        @param timeout: read timeout in seconds (none by default)
+        @return: (request, prepared request, response, seconds to the headers, redirections, time prepared)
+        '''
+        while True:
+            url=self._url(apipath, par, node.url if node else None)
+            request=req.Request(method, url, headers=hd, data=data, files=files, auth=self.session.auth)
+            self.request=request
+            pr=self.session.prepare_request(request)
+                    
+            self.log.debug('SEND: %s', request.url)
+            prepared=time.perf_counter()
+            
+            # Execute the HTTP request
+            try:
+                (response, ttfb, rc)=self._send(pr, hd, par, stream, node.proxies if node else self._proxies, timeout)
+            except req.ConnectionError:
+                if node is None:
+                    raise
+                self._release(node, False)
+                if node is self._balancer.central:
+                    raise
+                self.log.warning('Node %s unreachable, sending <%s> to the central node', node.url, apipath)
+                node=None
+                continue
+            except BaseException:
+                # read timeouts, too many redirections... count as failures of the node as well
+                if node is not None:
+                    self._release(node, False)
+                raise
+            break
+        
+        if node is not None:
+            self._release(node, response.status_code < 500)
+        return(request, pr, response, ttfb, rc, prepared)
+    
+    
+    def _hedged(self, method, apipath, par, hd, stream):
+        '''
+        @Function: GET sending a duplicate (to another node if any) when the answer is slower than the hedging percentile,
+                    the first answer wins and the other one is closed as soon as its headers arrive
+        '''
+        key=self.hedge.key(apipath)
+        delay=self.hedge.delay(key)
+        start=time.perf_counter()
+        executor=self._hedgeExecutor() if delay is not None else None
+        # a hedged call holds up to two threads of the pool until the headers of both copies arrive,
+        # when they are all busy (i.e. a stalled endpoint) the call is not hedged
+        if executor is None or not self._hedgeSlots.acquire(blocking=False):
+            result=self._exchange(method, apipath, par, hd, None, None, stream, self._acquire(True))
+            self.hedge.observe(key, time.perf_counter()-start)
+            return result
+        
+        # bodies are streamed, so the loser is dropped without being downloaded, the read timeout
+        # bounds the wait of a loser stalled before its headers
+        first=self._acquire(True)
+        futures=[executor.submit(self._exchange, method, apipath, par, hd, None, None, True, first, self.hedge.timeout)]
+        (done, _)=wait(futures, timeout=delay)
+        # the duplicate is one more request in flight, without a free slot of the limiter it is not sent
+        token=self.limiter.tryAcquire() if self.limiter is not None and not done else None
+        if not done and (token is not None or self.limiter is None):
+            self.hedge.fired()
+            self.log.debug('HEDGE: <%s> after %.3f s', apipath, delay)
+            futures.append(executor.submit(self._duplicate, token, method, apipath, par, hd, self._acquire(True, first)))
+        
+        remaining=[len(futures)]
+        lock=threading.Lock()
+        def finished(future):
+            with lock:
+                remaining[0]-=1
+                if remaining[0] == 0:
+                    self._hedgeSlots.release()
+        for f in futures:
+            f.add_done_callback(finished)
+        
+        (winner, error)=(None, None)
+        for f in as_completed(futures):
+            try:
+                result=f.result()
+                winner=f
+                break
+            except Exception as e:
+                error=e
+        if winner is None:
+            raise error
+        
+        for f in futures:
+            if f is not winner:
+                f.add_done_callback(self._discard)
+        if winner is not futures[0]:
+            self.hedge.won()
+        if not stream:
+            result[2].content
+        self.hedge.observe(key, time.perf_counter()-start)
+        return result
+    
+    
+    def _duplicate(self, token, method, apipath, par, hd, node):
+        overloaded=True
+        try:
+            result=self._exchange(method, apipath, par, hd, None, None, True, node, self.hedge.timeout)
+            overloaded=result[2].status_code in (429, 503)
+            return result
+        finally:
+            if token is not None:
+                self.limiter.release(token, overloaded=overloaded)
+    
+    
+    @staticmethod
+    def _discard(future):
+        if future.exception() is None:
+            future.result()[2].close()
+    
+    
+    def _hedgeExecutor(self):
+        with self._executorLock:
+            if self._executor is None:
+                self._hedgeSlots=threading.Semaphore(self.pool_maxsize)
+                self._executor=ThreadPoolExecutor(max_workers=2*self.pool_maxsize, thread_name_prefix='qsapi-hedge')
+            return self._executor
+    
+    
+    def _send(self, pr, hd, par, stream, proxies, timeout=None):
+        '''
+        @Function: send the prepared request following the redirections (keeping Xrfkey and virtual proxy)
+        @return: (response, seconds to the headers, redirections)
+        '''
+        response = self.session.send(pr, verify=self._verify, proxies=proxies, allow_redirects=False, stream=stream, timeout=timeout)
+        ttfb=response.elapsed.total_seconds()
+        rc=0
+        while response.is_redirect:
+            rc+=1
+            if rc > self.session.max_redirects:
+                raise req.HTTPError('Too many redirections')
+            self.session.rebuild_auth(response.next, response)
+            response.next.prepare_headers(hd)
+            response.next.prepare_cookies(response.cookies)
+            response.next.url=self._params_update(response.next.url, par)
+            self.log.debug('REDIR: %s', response.next.url)
+            response = self.session.send(response.next, verify=self._verify, proxies=proxies, allow_redirects=False, stream=stream, timeout=timeout)
+            ttfb+=response.elapsed.total_seconds()
+        return(response, ttfb, rc)
+    
+    
+    def _release(self, node, ok):
+        if self._balancer.release(node, ok):
+            self.log.warning('Node %s left out for %s s after %s failures', node.url, self._balancer.cooldown, node.failures)
+    
+    
+    def download(self, apipath, filename, param=None, parts=None):
         """ initialize control structure """
                    
         self.log.info('API DOWN <%s>', apipath)
+        start=time.perf_counter()
+        if self.hooks:
+            api=self._apiName()
+            _resetTimings()
 
         (par,hd)=self._params_prepare(param)
         
         # Build the request        
         self.response= None
         
-        url=self._params_update(up.urljoin(self.baseurl,apipath), par)
+        url=self._url(apipath, par)
      
         self.log.debug('__SEND: %s',url)
+        prepared=time.perf_counter()
                 
-        # Execute the HTTP request 
-        self.request = self.session.get(url, headers=hd, cert=self.cafile, verify=self._verify, stream=True, auth=self.session.auth)
+        # Execute the HTTP request, the slot of the limiter is held until the body is transferred
+        token=self.limiter.acquire() if self.limiter is not None else None
+        overloaded=True
+        try:
+            response = self._transfer(url, hd, par)
+            overloaded=response.status_code in (429, 503)
+            self.request = response
+            
+            if not response.ok:
+                # the error body is not the file, the caller checks the response
+                self.log.error('__Download failed <%s>: HTTP %s', apipath, response.status_code)
+                response.content
+                if self.hooks:
+                    self._record(api, 'GET', apipath, start, prepared, 0, response, response.elapsed.total_seconds(), 0, len(response.content or b''))
+                return(response)
+            
+            parts = self.download_parts if parts is None else int(parts)
+            size  = int(response.headers.get('Content-Length', 0))
+            ranges= response.headers.get('Accept-Ranges') == 'bytes'
+            
+            if parts > 1 and ranges and size > (self.chunk_size << 10):
+                response.close()
+                # every range takes its own slot
+                if token is not None:
+                    self.limiter.release(token, overloaded=False)
+                    token=None
+                self.log.info('__Downloading %s bytes in %s parts: ', size, parts)
+                self._download_ranges(response.url, hd, par, filename, size, parts)
+                self.log.info('__Saved: %s', os.path.abspath(filename))
+                if self.hooks:
+                    self._record(api, 'GET', apipath, start, prepared, 0, response, response.elapsed.total_seconds(), 0, size)
+                return(response)
+            
+            response=self._download_stream(response, hd, par, filename)
+        finally:
+            if token is not None:
+                self.limiter.release(token, overloaded=overloaded)
             
+        if self.hooks:
+            self._record(api, 'GET', apipath, start, prepared, 0, response, response.elapsed.total_seconds(), 0, os.path.getsize(filename))
+        
+        return(response)
+    
+    
+    def _transfer(self, url, hd, par):
+        # streamed GET of the transfers, with the proxies and the redirections of the calls
+        pr=self.session.prepare_request(req.Request('GET', url, headers=hd, auth=self.session.auth))
+        return self._send(pr, hd, par, True, self._proxies)[0]
+    
+    
+    def _download_stream(self, response, hd, par, filename):
+        '''
+        @Function: write the body into filename, resuming the dropped transfers
+        @return: last response (the one of the last resume)
+        '''
         with open(filename, 'wb') as f:
             self.log.info('__Downloading (in %sKb blocks): ', str(self.chunk_size))
             
-            #download in 512Kb blocks
-            for chunk in self.request.iter_content(chunk_size=self.chunk_size << 10): 
-                if chunk: # filter out keep-alive new chunks
-                    f.write(chunk)
+            retry=0
+            while True:
+                try:
+                    #download in 512Kb blocks
+                    for chunk in response.iter_content(chunk_size=self.chunk_size << 10): 
+                        if chunk: # filter out keep-alive new chunks
+                            f.write(chunk)
+                    break
+                except (req.exceptions.ConnectionError, req.exceptions.ChunkedEncodingError) as e:
+                    retry+=1
+                    if retry > self.download_retries or not response.ok:
+                        raise
+                    self.log.warning('__Connection lost at %s bytes, resuming (%s)', f.tell(), e)
+                    response=self._transfer(response.url, dict(hd, Range='bytes={0}-'.format(f.tell())), par)
+                    if response.status_code == 200:
+                        # the server ignored the range, start over
+                        f.seek(0)
+                        f.truncate()
+                    elif response.status_code != 206:
+                        # an error body must not end up in the file
+                        raise req.HTTPError('Resume failed <{0}>'.format(response.status_code), response=response)
                         
             self.log.info('__Saved: %s', os.path.abspath(filename))
+        return(response)
+    
+    
+    
+    def _download_ranges(self, url, hd, par, filename, size, parts):
+        # the file is preallocated and every worker writes its own slice
+        with open(filename, 'wb') as f:
+            f.truncate(size)
+        
+        step=-(-size // parts)
+        
+        def fetch(start):
+            pos, end, retry = start, min(start+step, size)-1, 0
+            with open(filename, 'r+b') as f:
+                while pos <= end:
+                    token=self.limiter.acquire() if self.limiter is not None else None
+                    overloaded=True
+                    try:
+                        r=self._transfer(url, dict(hd, Range='bytes={0}-{1}'.format(pos, end)), par)
+                        overloaded=r.status_code in (429, 503)
+                        if r.status_code != 206:
+                            raise req.HTTPError('Range not satisfied <{0}>'.format(r.status_code), response=r)
+                        f.seek(pos)
+                        for chunk in r.iter_content(chunk_size=self.chunk_size << 10):
+                            f.write(chunk)
+                            pos+=len(chunk)
+                    except (req.exceptions.ConnectionError, req.exceptions.ChunkedEncodingError) as e:
+                        retry+=1
+                        if retry > self.download_retries:
+                            raise
+                        self.log.warning('__Connection lost at %s bytes, resuming (%s)', pos, e)
+                    finally:
+                        if token is not None:
+                            self.limiter.release(token, overloaded=overloaded)
         
-        return(self.request)
+        with ThreadPoolExecutor(max_workers=parts) as pool:
+            list(pool.map(fetch, range(0, size, step)))
 
     
     
@@ -245,34 +913,56 @@ class _Controller(object):
                 return self.totalsize
                        
         self.log.info('API UPLO <%s>', apipath)
+        start=time.perf_counter()
+        if self.hooks:
+            api=self._apiName()
+            _resetTimings()
 
         (par,hd)=self._params_prepare(param, {'Content-Type': 'application/vnd.qlik.sense.app'})
            
         # Build the request        
         self.response= None
-        url=self._params_update(up.urljoin(self.baseurl,apipath), par)
+        if self.cache is not None:
+            self.cache.invalidate(apipath)
+        url=self._url(apipath, par)
         self.log.debug('__SEND: %s', url)
 
         # Execute the HTTP request 
         self.log.info('__Uploading {:,} bytes'.format(os.path.getsize(filename)))
-        self.request = self.session.post(url, headers=hd, cert=self.cafile, verify=self._verify, \
-                                data=upload_in_chunks(filename, self.chunk_size), auth=self.session.auth)
+        prepared=time.perf_counter()
+        token=self.limiter.acquire() if self.limiter is not None else None
+        try:
+            response = self.session.post(url, headers=hd, verify=self._verify, \
+                                    data=upload_in_chunks(filename, self.chunk_size), auth=self.session.auth)
+        except BaseException:
+            if token is not None:
+                self.limiter.release(token, overloaded=True)
+            raise
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(apipath)
+        if token is not None:
+            self.limiter.release(token, overloaded=response.status_code in (429, 503))
+        self.request = response
+        if self.hooks:
+            self._record(api, 'POST', apipath, start, prepared, os.path.getsize(filename), response, response.elapsed.total_seconds(), 0, len(response.content or b''))
             
         self.log.info('__Done.')                
             
-        return(self.request)
+        return(response)
 
 
     
     
-    def get(self, apipath, param=None):
+    def get(self, apipath, param=None, stream=False):
         '''
         @Function get: generic purpose call
         @param apipath: uri REST path
         @param param : whatever other param needed in form a dict
                       (example: {'filter': "name eq 'myApp'} )
+        @param stream : if True the body is not read in advance (see response.iter_content)
         '''
-        return self.call('GET', apipath, param)
+        return self.call('GET', apipath, param, stream=stream)
     
     
     
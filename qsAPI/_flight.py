@@ -0,0 +1,99 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import copy, asyncio, threading
+
+
+
+def _shareJson(response):
+    # the callers of a coalesced call get the same decoded object, it is decoded only once;
+    # a copy is patched, the response itself may be kept by the cache and served to later calls
+    decode, decoded, lock = response.json, [], threading.Lock()
+    def json(**kwargs):
+        if kwargs:
+            return decode(**kwargs)
+        with lock:
+            if not decoded:
+                decoded.append(decode())
+        return decoded[0]
+    shared=copy.copy(response)
+    shared.json=json
+    return shared
+
+
+
+class _Call(object):
+    __slots__=('event', 'result', 'error')
+
+    def __init__(self):
+        self.event=threading.Event()
+        self.result=None
+        self.error=None
+
+
+
+class _SingleFlight(object):
+    """ Coalescing of identical calls in flight: the first caller runs it, the others wait for its result"""
+
+    def __init__(self):
+        self._calls={}
+        self._lock=threading.Lock()
+        self.calls=self.shared=0
+
+
+    def do(self, key, fn):
+        with self._lock:
+            self.calls+=1
+            call=self._calls.get(key)
+            leader=call is None
+            if leader:
+                call=self._calls[key]=_Call()
+            else:
+                self.shared+=1
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result=_shareJson(fn())
+            return call.result
+        except BaseException as e:
+            call.error=e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+
+class _AsyncSingleFlight(object):
+    """ Coalescing of identical calls in flight, asyncio flavour"""
+
+    def __init__(self):
+        self._calls={}
+        self.calls=self.shared=0
+
+
+    async def do(self, key, fn):
+        self.calls+=1
+        task=self._calls.get(key)
+        if task is None:
+            async def run():
+                return _shareJson(await fn())
+            task=self._calls[key]=asyncio.ensure_future(run())
+            task.add_done_callback(lambda t: self._calls.pop(key) if self._calls.get(key) is t else None)
+        else:
+            self.shared+=1
+        # a caller cancelled does not cancel the others
+        return await asyncio.shield(task)
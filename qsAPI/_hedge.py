@@ -0,0 +1,81 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import threading
+from collections import deque, OrderedDict
+
+from ._cache import _endpointKey
+
+
+
+class _Hedge(object):
+    """ Hedging policy of the GET calls: a duplicate is sent when the answer takes longer than
+        a percentile of the recent latencies of the same endpoint"""
+
+    def __init__(self, percentile=95, window=100, min_samples=10, min_delay=0.01, budget=0.1, endpoints=256, timeout=30):
+        '''
+            @Function setup: hedging policy
+            @param percentile: latency percentile of the endpoint after which the duplicate is sent
+            @param window: recent latencies kept by endpoint
+            @param min_samples: latencies needed before hedging an endpoint
+            @param min_delay: lower bound of the delay in seconds
+            @param budget: max fraction of the calls duplicated
+            @param endpoints: max endpoints tracked (least recently used are dropped)
+            @param timeout: read timeout in seconds of the copies of a hedged call, a loser stalled before
+                    its headers gives back its thread and connection after it
+        '''
+        self.percentile=float(percentile)
+        self.window=int(window)
+        self.min_samples=int(min_samples)
+        self.min_delay=min_delay
+        self.budget=budget
+        self.endpoints=int(endpoints)
+        self.timeout=timeout
+        self._latencies=OrderedDict()
+        self._lock=threading.Lock()
+        self.calls=self.hedged=self.wins=0
+
+
+    key=staticmethod(_endpointKey)
+
+
+    def delay(self, key):
+        '''
+        @return: seconds to wait before sending the duplicate, None to not hedge this call
+        '''
+        with self._lock:
+            self.calls+=1
+            latencies=self._latencies.get(key)
+            if latencies is None or len(latencies) < self.min_samples or self.hedged >= self.budget*self.calls:
+                return None
+            values=sorted(latencies)
+        return max(self.min_delay, values[min(len(values)-1, int(self.percentile/100.0*len(values)))])
+
+
+    def observe(self, key, seconds):
+        with self._lock:
+            latencies=self._latencies.get(key)
+            if latencies is None:
+                latencies=self._latencies[key]=deque(maxlen=self.window)
+                while len(self._latencies) > self.endpoints:
+                    self._latencies.popitem(last=False)
+            else:
+                self._latencies.move_to_end(key)
+            latencies.append(seconds)
+
+
+    def fired(self):
+        with self._lock:
+            self.hedged+=1
+
+
+    def won(self):
+        with self._lock:
+            self.wins+=1
@@ -13,10 +13,45 @@
 _minServerAPIversion = '3.0.0'
 
 import uuid as _uuid
+import os as _os, re as _re, json as _json, threading as _threading
+from concurrent.futures import ThreadPoolExecutor as _ThreadPool
+from collections import deque as _deque
 from distutils.version import LooseVersion as _lv
 from ._controller import _Controller  
+from ._aiocontroller import _AsyncController
+from ._jsonstream import _iterJson
+from ._cache import _VersionCache
+from ._store import _EntityStore
+from ._sync import _Snapshot
+from ._notify import _Listener
+from ._records import _Records
+from ._columnar import _toColumns
+from ._steps import _steps, _async
+
+
+
+def _versionKey(driver):
+    return driver.baseurl+(driver.vproxy['pxpath'] if driver.vproxy else '/')
+
+
+def _cachedVersion(api, cache):
+    version=cache.get(_versionKey(api.driver)) if cache else None
+    return _lv(version) if version else None
+
+
+def _checkVersion(api, version, cache=None, cached=False):
+    '''
+    @Function: check the server version against the minimum supported and keep it in the disk cache
+    '''
+    if api.VERSION_API > version:
+        raise Exception('<server version mismatch, API:{0} > Server:{1}'.format(api.VERSION_API, version))
+    api.driver.log.info('Server version: {0}{1}'.format(version, ' (cached)' if cached else ''))
+    if cache and not cached:
+        cache.put(_versionKey(api.driver), version)
+    return version
+
+
 
-    
 class QPS(object):
     '''Qlik Sense Proxy Service REST API'''
     
@@ -24,74 +59,110 @@ class QPS(object):
     
     def __init__(self, schema='https', proxy='localhost', port=4243, vproxy=None, certificate=None, verify=False, \
                  user={'userDirectory':'internal', 'userID':'sa_repository', 'password': None}, \
-                 verbosity='INFO', logger='qsapi'):  
+                 verbosity='INFO', logger='qsapi', **kwargs):  
         
         schema, proxy, port=_Controller.normalize(schema, proxy, port, certificate) 
         p_vproxy={'preffix': vproxy, 'path': '^/qps/', 'template':'/{}/qps/'} if vproxy else None
         
-        self.driver=_Controller(schema, proxy, port, p_vproxy, certificate, verify, user, verbosity, logger)
+        self.driver=_Controller(schema, proxy, port, p_vproxy, certificate, verify, user, verbosity, logger, **kwargs)
 
         
 
+    @_steps
     def GetUser(self, directory, user):
         '''
         @Function: This returns all proxy sessions that a user (identified by {directory} and {user}) has.
         '''
         apipath='/qps/user/{directory}/{id}'.format(directory=directory, id=user)
-        return self.driver.get(apipath)
+        return (yield self.driver.get(apipath))
 
     
     
+    @_steps
     def DeleteUser(self, directory, user):
         '''
         @Function: This is part of the Logout API. The directory and ID are the same UserDirectory and UserId as those that were sent in POST /qps/{virtual proxy/}ticket.
                     A list of all proxy sessions that were connected to the deleted user is returned. 
         '''
         apipath='/qps/user/{directory}/{id}'.format(directory=directory, id=user)
-        return self.driver.delete(apipath)
+        return (yield self.driver.delete(apipath))
     
 
     
+    @_steps
     def GetSession(self, pId):
         '''
         @Function: This returns the proxy session identified by {id}.
         '''
         apipath='/qps/session/{id}'.format(id=pId)
-        return self.driver.get(apipath)
+        return (yield self.driver.get(apipath))
     
     
+    @_steps
     def DeleteSession(self, pId):
         '''
         @Function: Delete the proxy session identified by {id}.
         '''
         apipath='/qps/session/{id}'.format(virtual_proxy=self.driver.preffix, id=pId)
-        return self.driver.delete(apipath)
+        return (yield self.driver.delete(apipath))
 
 
 
 class QRS(object):
-    '''Qlik Sense Repository Service REST API'''
+    '''Qlik Sense Repository Service REST API
+    
+        The server version is resolved on the first call that needs it (VERSION_SERVER), with
+        version_cache=True (or a file path) it is kept on disk by host:port for version_ttl seconds.
+    '''
     
     VERSION_API= _lv(_minServerAPIversion)
     
     
     def __init__(self, schema='https', proxy='localhost', port=4242, vproxy=None, certificate=None, verify=False, \
                  user={'userDirectory':'internal', 'userID':'sa_repository', 'password': None}, \
-                 verbosity='INFO', logger='qsapi'):
+                 verbosity='INFO', logger='qsapi', version_cache=None, version_ttl=86400, **kwargs):
         
         schema, proxy, port=_Controller.normalize(schema, proxy, port, certificate)
         p_vproxy={'preffix': vproxy, 'path': '^/qrs/', 'template':'/{}/qrs/'} if vproxy else None
             
-        self.driver=_Controller(schema, proxy, port, p_vproxy, certificate, verify, user, verbosity, logger)
+        # kwargs are driver options, i.e. workers=N to share the handler between N threads
+        kwargs.setdefault('ping_path', '/qrs/ssl/ping')
+        self.driver=_Controller(schema, proxy, port, p_vproxy, certificate, verify, user, verbosity, logger, **kwargs)
         
-        self.VERSION_SERVER=self.getServerVersion()
-        if self.VERSION_API > self.VERSION_SERVER:
-            raise Exception('<server version mismatch, API:{0} > Server:{1}'.format(self.VERSION_API, self.VERSION_SERVER))
-        else:
-            self.driver.log.info('Server version: {0}'.format(self.VERSION_SERVER))
+        self._versionServer=None
+        self._versionLock=_threading.Lock()
+        self._versionCache=_VersionCache(None if version_cache is True else version_cache, version_ttl) if version_cache else None
+    
+    
+    @property
+    def VERSION_SERVER(self):
+        if self._versionServer is None:
+            with self._versionLock:
+                if self._versionServer is None:
+                    version=_cachedVersion(self, self._versionCache)
+                    self._versionServer=_checkVersion(self, version or self.getServerVersion(), self._versionCache, version is not None)
+        return self._versionServer
+    
+    @VERSION_SERVER.setter
+    def VERSION_SERVER(self, value):
+        self._versionServer=_lv(str(value)) if value is not None else None
+
 
+    def _serverVersion(self):
+        return self.VERSION_SERVER
 
     
+    def _get(self, apipath, param=None, stream=False, records=None):
+        r=self.driver.get(apipath, param, stream=stream)
+        data=_iterJson(r, self.driver.chunk_size << 10) if stream else r.json()
+        if records:
+            # the repeated strings are shared between the entities of the call
+            if records is True:
+                records=_Records()
+            return records(data)
+        return data
+    
+    
     def _toDict(self, response, uid='full', key='name', attr='id'):
         r={}
         if response.ok:
@@ -122,32 +193,36 @@ class QRS(object):
     
 
 
+    @_steps
     def ping(self):
         '''
         @return: "Ping successful", if there are no problems contacting the Qlik Sense Repository Service (QRS).
         '''
-        return self.driver.call('GET', '/qrs/ssl/ping')
+        return (yield self.driver.call('GET', '/qrs/ssl/ping'))
 
 
 
         
+    @_steps
     def getServerVersion(self):
         '''
         @Function: retrieve the server version
         '''
-        return _lv(self.driver.call('GET', '/qrs/about').json().get('buildVersion'))
+        return _lv((yield self.driver.call('GET', '/qrs/about')).json().get('buildVersion'))
 
  
  
     
+    @_steps
     def getAbout(self):
         '''
         @Function: Get information on the Qlik Sense repository, including version, database provider, and whether the node is the central node of the site or not.
         '''
-        return self.driver.get('/qrs/about').json()
+        return (yield self.driver.get('/qrs/about')).json()
     
  
     
+    @_steps
     def count(self, pType, pFilter=None):
         '''
         @Function: generic purpose call
@@ -155,10 +230,11 @@ class QRS(object):
         @param pFilter: filter the entities before calculating the number of entities. 
         @return : integer from json response
         '''
-        return self.driver.get('/qrs/{0}/count'.format(pType), param={'filter':pFilter}).json()['value']
+        return (yield self.driver.get('/qrs/{0}/count'.format(pType), param={'filter':pFilter})).json()['value']
  
     
     
+    @_steps
     def getDescription(self, extended='False', method=None, outformat='JSON'):
         '''@Function : List all paths available in the Qlik Sense Repository Service (QRS) API. Optionally, return extended information, endpoints that use a specific HTTP verb, or the return values in JSON format.
            @param extended: If true, returns the following:
@@ -173,14 +249,138 @@ class QRS(object):
                'method'  : method,
                'format'  : outformat}
         
-        return self.driver.get('/qrs/about/api/description', param).json()
+        return (yield self.driver.get('/qrs/about/api/description', param)).json()
 
 
 
+    @_steps
     def getEnum(self):
         '''@Function: Get all enums that are used by the public part of the Qlik Sense Repository Service (QRS) API.
         '''
-        return self.driver.get('/qrs/about/api/enums').json()
+        return (yield self.driver.get('/qrs/about/api/enums')).json()
+    
+    
+    @_steps
+    def EntityTable(self, pType, columns, pFilter=None, orderBy=None, skip=None, take=None):
+        '''
+        @Function: retrieve only the requested columns of the entities through the table endpoint
+        @param pType: entity type (App, User, Stream, ReloadTask, ...)
+        @param columns: list of attribute paths (example: ['id', 'name', 'stream.name', 'owner.userId'])
+        @param pFilter: filter the entities
+        @param orderBy: column to sort by (ascending)
+        @param skip, take: paging of the rows
+        @return : json response {'columnNames': [...], 'rows': [[...], ...]}
+        '''
+        param={'filter'        : pFilter,
+               'sortColumn'    : orderBy,
+               'orderAscending': True if orderBy else None,
+               'skip'          : skip,
+               'take'          : take}
+        data ={'entity' : pType,
+               'columns': [{'name': c, 'columnType': 'Property', 'definition': c} for c in columns]}
+        return (yield self.driver.post('/qrs/{0}/table'.format(pType.lower()), param, data=data)).json()
+    
+    
+    def EntityIter(self, pType, pFilter=None, pageSize=500, prefetch=2, orderBy='id'):
+        '''
+        @Function: iterate the full entities page by page (skip/take), the next pages are fetched
+                    concurrently while the caller consumes the current one
+        @param pType: entity path (example: user, app/object, executionresult, license/useraccesstype)
+        @param pFilter: filter the entities
+        @param pageSize: number of entities by request
+        @param prefetch: number of pages requested in advance
+        @param orderBy: attribute to keep a stable order between pages
+        @return : generator of entities (dict)
+        '''
+        apipath='/qrs/{0}/full'.format(pType)
+        total=self.count(pType, pFilter)
+        skips=iter(range(0, total, pageSize))
+        
+        def page(skip):
+            param={'filter' :pFilter,
+                   'orderBy':orderBy,
+                   'skip'   :skip,
+                   'take'   :pageSize}
+            return self.driver.get(apipath, param).json()
+        
+        pool=_ThreadPool(max_workers=max(1, prefetch))
+        pending=_deque()
+        try:
+            for skip in skips:
+                pending.append(pool.submit(page, skip))
+                if len(pending) > prefetch:
+                    break
+            while pending:
+                entities=pending.popleft().result()
+                skip=next(skips, None)
+                if skip is not None:
+                    pending.append(pool.submit(page, skip))
+                yield from entities
+        finally:
+            for f in pending:
+                f.cancel()
+            pool.shutdown(wait=False)
+
+
+
+    def EntityStore(self, pType, pFilter=None, indexes=None):
+        '''
+        @Function: in-memory copy of an entity type, loaded once, with hash indexes for the lookups
+                    (example: store=qrs.EntityStore('app', indexes=['stream.name', 'customProperties.Department'])
+                    store.find('stream.name', 'Everyone'), store.index('owner.userId'))
+        @param pType: entity path (example: app, stream, user, tag, systemrule)
+        @param pFilter: filter the entities loaded
+        @param indexes: paths indexed at load time, the others are indexed on first use
+        @return : _EntityStore (refresh() reloads it, invalidate() drops it)
+        '''
+        return _EntityStore(self, pType, pFilter, indexes)
+
+
+
+    def Snapshot(self, path, entities=None, pageSize=500):
+        '''
+        @Function: local SQLite mirror of the repository, sync() loads everything the first time and then
+                    only the entities modified since the last one (and the deletions)
+                    (example: snap=qrs.Snapshot('repo.db'); snap.sync();
+                    snap.query("SELECT name FROM app WHERE json_extract(json, '$.stream.name') = ?", ('Everyone',)))
+        @param path: sqlite file (':memory:' for a process-local copy)
+        @param entities: entity paths mirrored, app, stream, user, task, tag and systemrule by default
+        @param pageSize: number of entities written by transaction
+        @return : _Snapshot
+        '''
+        return _Snapshot(self, path, entities, pageSize)
+
+
+
+    def Listener(self, host='127.0.0.1', port=0, callback=None, allow=None, secret=None):
+        '''
+        @Function: local http listener of the repository change notifications, the GET cache of the handler,
+                    the watched stores and snapshots are refreshed on the changes instead of polling
+                    (example: ls=qrs.Listener(host='', port=8090, allow=['10.0.0.5']); ls.subscribe('ExecutionResult'); ls.watch(store))
+        @param host, port: address listened, loopback and any free port by default (host='' for every interface)
+        @param callback: url announced to the repository, http://<host or fqdn>:<port>/<secret> by default
+        @param allow: addresses allowed to post the callbacks, any by default
+        @param secret: last part of the default callback path, random by default
+        @return : _Listener (close() unregisters the notifications)
+        '''
+        return _Listener(self, host, port, callback, allow, secret)
+
+
+
+    def Columns(self, data, columns=None, pFilter=None):
+        '''
+        @Function: column arrays (numpy) of a list of entities for vectorized analytics, numbers and dates are
+                    numpy arrays (dates never set are NaT), strings are dictionary encoded (codes, categories)
+                    (example: cols=qrs.Columns('app', ['fileSize', 'owner.userId', 'stream.name'])
+                    cols.aggregate('owner.userId', 'fileSize', 'sum'))
+        @param data: entity path (fetched from /full) or list of entities (dicts or records)
+        @param columns: dotted paths, the scalar attributes by default
+        @param pFilter: filter the entities fetched
+        @return : _Columns (dict path: array) with aggregate(by, column, how)
+        '''
+        if isinstance(data, str):
+            data=self._get('/qrs/{0}/full'.format(data), {'filter':pFilter})
+        return _toColumns(data, columns)
 
 
 
@@ -188,6 +388,7 @@ class QRS(object):
 
     
     
+    @_steps
     def AppDictAttributes(self, puid='full', pFilter=None, key='name', attr='id'):
         '''@Function: retrieve a mapping of apps attributes
            @param pId: limmit the scope to the App {UUID}
@@ -197,10 +398,11 @@ class QRS(object):
            @return: dict(key:attr)
         '''
         apipath='/qrs/app/{puid}'.format(puid=puid)
-        return self._toDict(self.driver.get(apipath, param={'filter':pFilter}), puid, key, attr)    
+        return self._toDict((yield self.driver.get(apipath, param={'filter':pFilter})), puid, key, attr)    
         
     
 
+    @_steps
     def AppCopy(self, pId, name=None):
         '''
         @Function: Copy an existing app, identified by {id}. Optionally, provide a name for the copy.
@@ -208,10 +410,11 @@ class QRS(object):
         @param name: Name of the app
         '''
         param={'name':name}
-        return self.driver.post('/qrs/app/{id}/copy'.format(id=pId), param).json()
+        return (yield self.driver.post('/qrs/app/{id}/copy'.format(id=pId), param)).json()
 
 
     
+    @_steps
     def AppExport(self, pId, filename=None, skipdata='true'):
         '''
         @Function: Get an export qvf for an existing app, identified by {id}.
@@ -221,23 +424,98 @@ class QRS(object):
         @return : stored application
         '''
         file= filename if filename else pId+'.qvf'
-        if self.VERSION_SERVER < "17.0":
+        version=(yield self._serverVersion())
+        if version < "17.0":
             #DEPRECATED API since November-2017
-            self.driver.log.info('Server version: %s, using legacy API', self.VERSION_SERVER)
-            r=self.driver.get('/qrs/app/{id}/export'.format(id=pId))
+            self.driver.log.info('Server version: %s, using legacy API', version)
+            r=(yield self.driver.get('/qrs/app/{id}/export'.format(id=pId)))
             if r.ok:
-                r=self.driver.download('/qrs/download/app/{appId}/{TicketId}/{fileName}'.format(appId=pId, TicketId=r.json()['value'], fileName=file), file)
+                r=(yield self.driver.download('/qrs/download/app/{appId}/{TicketId}/{fileName}'.format(appId=pId, TicketId=r.json()['value'], fileName=file), file))
             return(r)
         
         #Current API method
-        r=self.driver.post('/qrs/app/{id}/export/{token}?skipData={skipdata}'.format(id=pId, token=_uuid.uuid4(), skipdata=skipdata))
+        r=(yield self.driver.post('/qrs/app/{id}/export/{token}?skipData={skipdata}'.format(id=pId, token=_uuid.uuid4(), skipdata=skipdata)))
         if r.ok:
-            r=self.driver.download(r.json()['downloadPath'], file)
+            r=(yield self.driver.download(r.json()['downloadPath'], file))
         return(r)
 
 
 
+    
+    def AppExportMany(self, pIds=None, pFilter=None, path='{id}.qvf', workers=4, manifest=None, skipdata='true'):
+        '''
+        @Function: Export a set of apps concurrently, the run can be resumed using a manifest file.
+        @param pIds: list of app GUID (by default all the apps matching pFilter)
+        @param pFilter: filter the apps to export when pIds is not provided
+        @param path: target path template, fields {id}, {name} and {stream} are available
+                     (example: 'backup/{stream}/{name}.qvf'), the id is appended to a target shared by several apps
+        @param workers: number of simultaneous exports (see driver option workers to size the pool)
+        @param manifest: json file tracking the exported apps, already exported ones are skipped
+        @param skipData: if True App will be emptied of data
+        @return : dict {appId: {'file':, 'status': 'done'|'error', 'error':}}
+        '''
+        if pIds is None:
+            apps=self.AppGet(pFilter=pFilter)
+        elif _re.search(r'{(?!id})', path):
+            apps=[]
+            for i in range(0, len(pIds), 50):
+                apps+=self.AppGet(pFilter=' or '.join("id eq {0}".format(x) for x in pIds[i:i+50]))
+        else:
+            apps=[{'id': x} for x in pIds]
+        apps=list({x['id']: x for x in apps}.values())
+        
+        done={}
+        if manifest and _os.path.exists(manifest):
+            with open(manifest, 'r') as f:
+                done=_json.load(f)
+        lock=_threading.Lock()
+        
+        def clean(value):
+            return _re.sub(r'[\\/:*?"<>|]', '_', str(value))
+        
+        files={x['id']: path.format(id=x['id'], name=clean(x.get('name', x['id'])), \
+                                    stream=clean((x.get('stream') or {}).get('name', 'unpublished'))) for x in apps}
+        # apps with the same name (or stream) would overwrite each other
+        shared={}
+        for pId, file in files.items():
+            shared.setdefault(_os.path.normcase(_os.path.abspath(file)), []).append(pId)
+        for ids in shared.values():
+            if len(ids) > 1:
+                self.driver.log.warning('Export target shared by %s apps, appending the app id: %s', len(ids), files[ids[0]])
+                for pId in ids:
+                    root, ext=_os.path.splitext(files[pId])
+                    files[pId]='{0}_{1}{2}'.format(root, pId, ext)
+        
+        def export(app):
+            file=files[app['id']]
+            part='{0}.{1}.part'.format(file, app['id'])
+            entry={'file': file, 'status': 'done'}
+            try:
+                folder=_os.path.dirname(file)
+                if folder:
+                    _os.makedirs(folder, exist_ok=True)
+                r=self.AppExport(app['id'], part, skipdata)
+                r.raise_for_status()
+                _os.replace(part, file)
+            except Exception as e:
+                self.driver.log.error('Export failed <%s>: %s', app['id'], e)
+                entry={'file': file, 'status': 'error', 'error': str(e)}
+            with lock:
+                done[app['id']]=entry
+                if manifest:
+                    with open(manifest+'.tmp', 'w') as f:
+                        _json.dump(done, f, indent=1)
+                    _os.replace(manifest+'.tmp', manifest)
+        
+        pending=[x for x in apps if done.get(x['id'], {}).get('status') != 'done' or not _os.path.exists(done[x['id']]['file'])]
+        self.driver.log.info('Exporting %s apps (%s already done)', len(pending), len(apps)-len(pending))
+        with _ThreadPool(max_workers=workers) as pool:
+            list(pool.map(export, pending))
+        
+        return(done)
+
 
+    @_steps
     def AppUpload(self, filename, pName, keepdata=None):
         '''
         @Function: Upload a filename.qvf into Central Node.
@@ -247,38 +525,56 @@ class QRS(object):
         '''
         param ={'name'    :pName,
                 'keepdata':keepdata}
-        return self.driver.upload('/qrs/app/upload', filename, param)
+        return (yield self.driver.upload('/qrs/app/upload', filename, param))
 
     
-    def AppGet(self, pId='full', pFilter=None):
+    @_steps
+    def AppGet(self, pId='full', pFilter=None, pStream=False, pRecords=False):
         '''
         @Function: retrieve App information
         @param pId: App UUID 
         @param pFilter: filter the entities before calculating the number of entities. 
+        @param pStream: if True the response is decoded incrementally and a generator of entities is returned
+        @param pRecords: if True the entities are compact records (attribute access, shared strings, nested fields decoded on access)
         @return : json response
         '''
-        return self.driver.get('/qrs/app/{id}'.format(id=pId), param={'filter':pFilter}).json()
+        return (yield self._get('/qrs/app/{id}'.format(id=pId), {'filter':pFilter}, pStream, pRecords))
     
     
+    @_steps
+    def AppTable(self, columns=['id', 'name'], pFilter=None, orderBy=None):
+        '''
+        @Function: retrieve only the requested columns of the apps (see EntityTable)
+        @param columns: list of attribute paths
+        @param pFilter: filter the entities
+        @param orderBy: column to sort by
+        @return : json response {'columnNames': [...], 'rows': [[...], ...]}
+        '''
+        return (yield self.EntityTable('App', columns, pFilter, orderBy))
+    
     
+    
+    @_steps
     def AppMigrate(self, pId):
         '''
         @Function: Migrate an app so that it can be used in the currently installed version of Qlik Sense.
                     Normally, this is done automatically
         @param pId: app identifier
         '''
-        return self.driver.put('/qrs/app/{id}/migrate'.format(id=pId))
+        return (yield self.driver.put('/qrs/app/{id}/migrate'.format(id=pId)))
     
             
     
+    @_steps
     def AppReload(self, pId):
         '''
         @Function: Reload an app
         @param pId: app identifier
         '''
-        return self.driver.post('/qrs/app/{id}/reload'.format(id=pId))
+        return (yield self.driver.post('/qrs/app/{id}/reload'.format(id=pId)))
 
 
+    @_steps
     def AppPublish(self, pId, streamId, name=None):
         '''
         @Function: Publish an existing app, identified by {id}, to the stream identified by {streamid}.
@@ -288,17 +584,19 @@ class QRS(object):
         '''
         param ={'stream' :streamId,
                 'name'   :name}
-        return self.driver.put('/qrs/app/{id}/publish'.format(id=pId), param)
+        return (yield self.driver.put('/qrs/app/{id}/publish'.format(id=pId), param))
     
     
+    @_steps
     def AppUpdate(self, pId, pData):
         '''
         @Function: update App info referenced 
         @param pId: App UUID 
         '''
-        return self.driver.put('/qrs/app/{id}'.format(id=pId), data=pData)
+        return (yield self.driver.put('/qrs/app/{id}'.format(id=pId), data=pData))
     
     
+    @_steps
     def AppReplace(self, pId, pAppId):
         '''
         @Function: Replace an app, identified by {appid}, with the app identified by {id}. 
@@ -309,77 +607,96 @@ class QRS(object):
         If the replaced app is not published, the entire app is replaced.
         '''
         param ={'app' :pAppId}
-        return self.driver.put('/qrs/app/{id}/replace'.format(id=pId), param)
+        return (yield self.driver.put('/qrs/app/{id}/replace'.format(id=pId), param))
     
     
+    @_steps
     def AppDelete(self, pId):
         '''
         @Function: delete App referenced 
         @param pId: App UUID 
         '''
-        return self.driver.delete('/qrs/app/{id}'.format(id=pId))
+        return (yield self.driver.delete('/qrs/app/{id}'.format(id=pId)))
     
     
     #=========================================================================================
     
     
-    def AppObjectGet(self, pId='full', pFilter=None):
+    @_steps
+    def AppObjectGet(self, pId='full', pFilter=None, pStream=False, pRecords=False):
         '''
         @Function: retrieve AppObject information
         @param pId: AppObject UUID 
         @param pFilter: filter the entities before calculating the number of entities. 
+        @param pStream: if True the response is decoded incrementally and a generator of entities is returned
+        @param pRecords: if True the entities are compact records (attribute access, shared strings, nested fields decoded on access)
         @return : json response
         '''
-        return self.driver.get('/qrs/app/object/{id}'.format(id=pId), param={'filter':pFilter}).json()
+        return (yield self._get('/qrs/app/object/{id}'.format(id=pId), {'filter':pFilter}, pStream, pRecords))
     
     
+    def AppObjectIter(self, pFilter=None, pageSize=500, prefetch=2):
+        '''
+        @Function: iterate the AppObjects page by page (see EntityIter)
+        @param pFilter: filter the entities
+        @return : generator of entities (dict)
+        '''
+        return self.EntityIter('app/object', pFilter, pageSize, prefetch)
+    
+    
+    @_steps
     def AppObjectCount(self, pFilter=None):
         '''
         @Function: retrieve AppObject count information
         @param pFilter: filter the entities before calculating the number of entities. 
         @return : json response
         '''
-        return self.driver.get('/qrs/app/object/count', param={'filter':pFilter}).json()
+        return (yield self.driver.get('/qrs/app/object/count', param={'filter':pFilter})).json()
     
     
+    @_steps
     def AppObjectUpdate(self, pId, pData):
         '''
         @Function: retrieve AppObject information
         @param pId: AppObject UUID  
         @param pData: AppObject attributes
         '''
-        return self.driver.put('/qrs/app/object/{id}'.format(id=pId), data=pData)
+        return (yield self.driver.put('/qrs/app/object/{id}'.format(id=pId), data=pData))
     
     
+    @_steps
     def AppObjectApprove(self, pId, pApprove=True):
         '''
         @Function: Set AppObject approve status
         @param pId: AppObject UUID  
         @param pApprove: True / False
         '''
-        return self.driver.post('/qrs/app/object/{id}/{status}'.format(id=pId, status='approve' if pApprove else 'unapprove'))
+        return (yield self.driver.post('/qrs/app/object/{id}/{status}'.format(id=pId, status='approve' if pApprove else 'unapprove')))
     
     
+    @_steps
     def AppObjectPublish(self, pId, pPublish=True):
         '''
         @Function: Set AppObject publish status
         @param pId: AppObject UUID  
         @param pPublish: True / False
         '''
-        return self.driver.put('/qrs/app/object/{id}/{status}'.format(id=pId, status='publish' if pPublish else 'unpublish'))
+        return (yield self.driver.put('/qrs/app/object/{id}/{status}'.format(id=pId, status='publish' if pPublish else 'unpublish')))
     
     
+    @_steps
     def AppObjectDelete(self, pId):
         '''
         @Function: Delete AppObject
         @param pId: AppObject UUID  
         '''
-        return self.driver.delete('/qrs/app/object/{id}'.format(id=pId))
+        return (yield self.driver.delete('/qrs/app/object/{id}'.format(id=pId)))
     
         
     #=========================================================================================
     
     
+    @_steps
     def StreamCreate(self, pName, pProperties=[] , pTags=[], pUUID=None):
         '''
         @Function: create a Stream
@@ -396,41 +713,58 @@ class QRS(object):
         if pUUID is not None:
             param['id']=pUUID
                  
-        return self.driver.post('/qrs/stream', data=param).json()
+        return (yield self.driver.post('/qrs/stream', data=param)).json()
     
     
     
-    def StreamGet(self, pId='full', pFilter=None):
+    @_steps
+    def StreamGet(self, pId='full', pFilter=None, pStream=False):
         '''
         @Function: retrieve Stream information
         @param pId: Stream UUID 
         @param pFilter: filter the entities before calculating the number of entities. 
+        @param pStream: if True the response is decoded incrementally and a generator of entities is returned
         @return : json response
         '''
-        return self.driver.get('/qrs/stream/{id}'.format(id=pId), param={'filter':pFilter}).json()
+        return (yield self._get('/qrs/stream/{id}'.format(id=pId), {'filter':pFilter}, pStream))
+    
+    
+    @_steps
+    def StreamTable(self, columns=['id', 'name'], pFilter=None, orderBy=None):
+        '''
+        @Function: retrieve only the requested columns of the streams (see EntityTable)
+        @param columns: list of attribute paths
+        @param pFilter: filter the entities
+        @param orderBy: column to sort by
+        @return : json response {'columnNames': [...], 'rows': [[...], ...]}
+        '''
+        return (yield self.EntityTable('Stream', columns, pFilter, orderBy))
     
     
     
+    @_steps
     def StreamUpdate(self, pId, pData):
         '''
         @Function: update Stream info referenced 
         @param pId: Stream UUID 
         @param pData: stream attributes
         '''
-        return self.driver.put('/qrs/stream/{id}'.format(id=pId), data=pData)
+        return (yield self.driver.put('/qrs/stream/{id}'.format(id=pId), data=pData))
     
     
     
+    @_steps
     def StreamDelete(self, pId):
         '''
         @Function: delete Stream referenced 
         @param pId: Stream UUID 
         @return : json response
         '''
-        return self.driver.delete('/qrs/stream/{id}'.format(id=pId))
+        return (yield self.driver.delete('/qrs/stream/{id}'.format(id=pId)))
     
     
     
+    @_steps
     def StreamDictAttributes(self, pStreamID='full', pFilter=None, key='name', attr='id'):
         '''@Function: retrieve a mapping of Stream attributes
            @param pStreamID: limmit the scope to the Stream {UID}
@@ -440,22 +774,47 @@ class QRS(object):
            @return: dict(key:attr)
         '''
         apipath='/qrs/stream/{uid}'.format(uid=pStreamID)            
-        return self._toDict(self.driver.get(apipath, param={'filter':pFilter}), pStreamID, key, attr) 
+        return self._toDict((yield self.driver.get(apipath, param={'filter':pFilter})), pStreamID, key, attr) 
     
     
     #=========================================================================================     
     
     
-    def UserGet(self, pUserID='full', pFilter=None):
+    @_steps
+    def UserGet(self, pUserID='full', pFilter=None, pStream=False, pRecords=False):
         '''
         @Function: retrieve user information
         @param pUserID: User id 
         @param pFilter: filter the entities before calculating the number of entities. 
+        @param pStream: if True the response is decoded incrementally and a generator of entities is returned
+        @param pRecords: if True the entities are compact records (attribute access, shared strings, nested fields decoded on access)
         @return : json response
         '''
-        return self.driver.get('/qrs/user/{id}'.format(id=pUserID), param={'filter':pFilter}).json()
+        return (yield self._get('/qrs/user/{id}'.format(id=pUserID), {'filter':pFilter}, pStream, pRecords))
+    
+    
+    def UserIter(self, pFilter=None, pageSize=500, prefetch=2):
+        '''
+        @Function: iterate the users page by page (see EntityIter)
+        @param pFilter: filter the entities
+        @return : generator of entities (dict)
+        '''
+        return self.EntityIter('user', pFilter, pageSize, prefetch)
     
     
+    @_steps
+    def UserTable(self, columns=['id', 'userDirectory', 'userId'], pFilter=None, orderBy=None):
+        '''
+        @Function: retrieve only the requested columns of the users (see EntityTable)
+        @param columns: list of attribute paths
+        @param pFilter: filter the entities
+        @param orderBy: column to sort by
+        @return : json response {'columnNames': [...], 'rows': [[...], ...]}
+        '''
+        return (yield self.EntityTable('User', columns, pFilter, orderBy))
+    
+    
+    @_steps
     def UserUpdate(self, pUserID, pData):
         '''
         @Function: update user information
@@ -463,9 +822,10 @@ class QRS(object):
         @param pData: json with user information. 
         @return : json response
         '''
-        return self.driver.put('/qrs/user/{id}'.format(id=pUserID), data=pData)
+        return (yield self.driver.put('/qrs/user/{id}'.format(id=pUserID), data=pData))
     
     
+    @_steps
     def UserDelete(self, pUserID):
         '''
         @Function: retrieve user information
@@ -473,9 +833,10 @@ class QRS(object):
         @param pFilter: filter the entities before calculating the number of entities. 
         @return : json response
         '''
-        return self.driver.delete('/qrs/user/{id}'.format(id=pUserID))
+        return (yield self.driver.delete('/qrs/user/{id}'.format(id=pUserID)))
     
     
+    @_steps
     def UserDictAttributes(self, pUserID='full', pFilter=None, key='name', attr='id'):
         '''@Function: retrieve a mapping of user attributes
            @param pUserID: limmit the scope to the User {UID}
@@ -485,89 +846,123 @@ class QRS(object):
            @return: dict(key:attr)
         '''
         apipath='/qrs/user/{uid}'.format(uid=pUserID)            
-        return self._toDict(self.driver.get(apipath, param={'filter':pFilter}),pUserID,key,attr)
+        return self._toDict((yield self.driver.get(apipath, param={'filter':pFilter})),pUserID,key,attr)
     
     
     #=========================================================================================
 
-    def TaskGet(self, pFilter=None):
+    @_steps
+    def TaskGet(self, pFilter=None, pStream=False):
         '''
         @Function: retrieve Task information
         @param pFilter: filter the entities
+        @param pStream: if True the response is decoded incrementally and a generator of entities is returned
         @return : json response
         '''
-        return self.driver.get('/qrs/task/full', param={'filter': pFilter}).json()
+        return (yield self._get('/qrs/task/full', {'filter': pFilter}, pStream))
+    
+    
+    @_steps
+    def TaskTable(self, columns=['id', 'name'], pFilter=None, orderBy=None):
+        '''
+        @Function: retrieve only the requested columns of the reload tasks (see EntityTable)
+        @param columns: list of attribute paths
+        @param pFilter: filter the entities
+        @param orderBy: column to sort by
+        @return : json response {'columnNames': [...], 'rows': [[...], ...]}
+        '''
+        return (yield self.EntityTable('ReloadTask', columns, pFilter, orderBy))
 
+    @_steps
     def TaskStart(self, taskid):
         '''
         @Function: Starts a task by id and waits until a slave starts to execute a task
         @param taskid: taskid of the task to start
         '''
-        return self.driver.post('/qrs/task/{taskid}/start'.format(taskid=taskid))
+        return (yield self.driver.post('/qrs/task/{taskid}/start'.format(taskid=taskid)))
 
+    @_steps
     def TaskStartSynchronous(self, taskid):
         '''
         @Function: Starts a task by id and waits until a slave starts to execute a task
         @param taskid: taskid of the task to start
         '''
-        return self.driver.post('/qrs/task/{taskid}/start/synchronous'.format(taskid=taskid))
+        return (yield self.driver.post('/qrs/task/{taskid}/start/synchronous'.format(taskid=taskid)))
 
 
+    @_steps
     def TaskStartByName(self, taskname):
         '''
         @Function: Starts a task by name
         @param taskname: Name of the task to start
         '''
-        return self.driver.post('/qrs/task/start', param={'name': taskname})
+        return (yield self.driver.post('/qrs/task/start', param={'name': taskname}))
 
+    @_steps
     def TaskStartMany(self, taskids):
         '''
         @Function: Starts multiple tasks
         @param taskids: list of id's of the task to start
             Sample list: ["6ca1c5f2-2742-44d5-8adf-d6cba3701a4e","965ca0cf-952f-4502-a65e-2a82e3de4803"]
         '''
-        return self.driver.post('/qrs/task/start/many', data=taskids)
+        return (yield self.driver.post('/qrs/task/start/many', data=taskids))
 
+    @_steps
     def TaskStartByNameSynchronous(self, taskname):
         '''
         @Function: Starts a task and waits until a slave starts to execute a task
         @param taskname: Name of the task to start
         '''
-        return self.driver.post('/qrs/task/start/synchronous', param={'name': taskname})
+        return (yield self.driver.post('/qrs/task/start/synchronous', param={'name': taskname}))
 
+    @_steps
     def TaskStop(self, taskid):
         '''
         @Function: Stops a task
         @param taskid: id of the task to stop
         '''
-        return self.driver.post('/qrs/task/{taskid}/stop'.format(taskid=taskid))
+        return (yield self.driver.post('/qrs/task/{taskid}/stop'.format(taskid=taskid)))
 
+    @_steps
     def TaskStopMany(self, taskids):
         '''
         @Function: Stops multiple tasks
         @param taskname: list of id's of the task to stop
             Sample list: ["6ca1c5f2-2742-44d5-8adf-d6cba3701a4e","965ca0cf-952f-4502-a65e-2a82e3de4803"]
         '''
-        return self.driver.post('/qrs/task/stop/many', data=taskids)
+        return (yield self.driver.post('/qrs/task/stop/many', data=taskids))
+    
+    
+    def ExecutionResultIter(self, pFilter=None, pageSize=500, prefetch=2):
+        '''
+        @Function: iterate the task execution results page by page (see EntityIter)
+        @param pFilter: filter the entities
+        @return : generator of entities (dict)
+        '''
+        return self.EntityIter('executionresult', pFilter, pageSize, prefetch)
 
     #=========================================================================================
         
    
-    def SystemRulesGet(self, pFilter=None):
+    @_steps
+    def SystemRulesGet(self, pFilter=None, pStream=False):
         '''
         @Function: Get the system rules
+        @param pStream: if True the response is decoded incrementally and a generator of entities is returned
         '''
-        return self.driver.get('/qrs/systemrule/full', {'filter':pFilter}).json()
+        return (yield self._get('/qrs/systemrule/full', {'filter':pFilter}, pStream))
     
     
+    @_steps
     def SystemRulesCreate(self, param):
         '''
         @Function: create a SystemRule
         @return : json response
         ''' 
-        return self.driver.post('/qrs/systemrule', data=param).json()
+        return (yield self.driver.post('/qrs/systemrule', data=param)).json()
     
     
+    @_steps
     def SystemRulesDictAttributes(self, pRuleID='full', pFilter=None, key='name', attr='id'):
         '''@Function: retrieve a mapping of rules attributes
            @param pRuleID: limmit the scope to the Rule {UID}
@@ -577,37 +972,42 @@ class QRS(object):
            @return: dict(key:attr)
         '''
         apipath='/qrs/systemrule/{uid}'.format(uid=pRuleID)            
-        return self._toDict(self.driver.get(apipath, param={'filter':pFilter}),pRuleID,key,attr)
+        return self._toDict((yield self.driver.get(apipath, param={'filter':pFilter})),pRuleID,key,attr)
     
     
     #=========================================================================================
     
     
     
-    def ReloadTaskGet(self, pId='full', pFilter=None):
+    @_steps
+    def ReloadTaskGet(self, pId='full', pFilter=None, pStream=False):
         '''
         @Function: retrieve ReloadTask information
         @param pId: ReloadTask UID 
         @param pFilter: filter the entities before calculating the number of entities. 
+        @param pStream: if True the response is decoded incrementally and a generator of entities is returned
         @return : json response
         '''
-        return self.driver.get('/qrs/reloadtask/{id}'.format(id=pId), param={'filter':pFilter}).json()
+        return (yield self._get('/qrs/reloadtask/{id}'.format(id=pId), {'filter':pFilter}, pStream))
     
     
     
     #=========================================================================================
      
     
-    def PropertiesGet(self, pFilter=None):
+    @_steps
+    def PropertiesGet(self, pFilter=None, pStream=False):
         '''
         @Function: Get the system rules
+        @param pStream: if True the response is decoded incrementally and a generator of entities is returned
         '''
-        return self.driver.get('/qrs/custompropertydefinition/full', {'filter':pFilter}).json()
+        return (yield self._get('/qrs/custompropertydefinition/full', {'filter':pFilter}, pStream))
 
 
     #=========================================================================================
     
     
+    @_steps
     def TagsDictAttributes(self, pTagID='full', pFilter=None, key='name', attr='id'):
         '''@Function: retrieve a mapping of tags attributes
            @param pRuleID: limmit the scope to the Tag {UID}
@@ -617,7 +1017,7 @@ class QRS(object):
            @return: dict(key:attr)
         '''
         apipath='/qrs/tag/{uid}'.format(uid=pTagID)            
-        return self._toDict(self.driver.get(apipath, param={'filter':pFilter}),pTagID,key,attr)
+        return self._toDict((yield self.driver.get(apipath, param={'filter':pFilter})),pTagID,key,attr)
 
     
     #=========================================================================================
@@ -630,37 +1030,361 @@ class QRS(object):
         AnalyzerAccess='analyzeraccesstype'
     
     
+    @_steps
     def LicenseUsageSummary(self):
         '''
         @Function: Get the license summary
         '''
-        return self.driver.get('qrs/license/accesstypeinfo').json()
+        return (yield self.driver.get('qrs/license/accesstypeinfo')).json()
     
     
-    def LicenseAccessGet(self, licenseType):
+    @_steps
+    def LicenseAccessGet(self, licenseType, pStream=False, pRecords=False):
         '''
         @Function: Get a user access licenses
         @param licenseType: LicenseType***Access enumeration
+        @param pStream: if True the response is decoded incrementally and a generator of entities is returned
+        @param pRecords: if True the entities are compact records (attribute access, shared strings, nested fields decoded on access)
         '''
-        return self.driver.get('qrs/license/{}/full'.format(licenseType)).json()
+        return (yield self._get('qrs/license/{}/full'.format(licenseType), None, pStream, pRecords))
     
     
+    def LicenseAccessIter(self, licenseType, pFilter=None, pageSize=500, prefetch=2):
+        '''
+        @Function: iterate the access licenses page by page (see EntityIter)
+        @param licenseType: LicenseType***Access enumeration
+        @param pFilter: filter the entities
+        @return : generator of entities (dict)
+        '''
+        return self.EntityIter('license/{}'.format(licenseType), pFilter, pageSize, prefetch)
+    
+    
+    @_steps
     def LicenseAccessDelete(self, licenseType, pLicID):
         '''
         @Function: Delete a user access license
         @param licenseType: LicenseType***Access enumeration
         @param pLicID: key of license
         '''
-        return self.driver.delete('qrs/license/{}/{}'.format(licenseType, pLicID))
+        return (yield self.driver.delete('qrs/license/{}/{}'.format(licenseType, pLicID)))
     
     
+    @_steps
     def LicenseAccessCount(self, licenseType):
         '''
         @Function: Retrieve the number of assigned access license
         @param licenseType: LicenseType***Access enumeration
         @param pLicID: key of licens
         '''
-        return self.driver.get('/qrs/license/{}/count'.format(licenseType)).json()['value']
+        return (yield self.driver.get('/qrs/license/{}/count'.format(licenseType))).json()['value']
+
+    
+    #=========================================================================================
+    
+    
+    # entity path -> type name of the selection items
+    SelectionTypes={'app': 'App', 'app/object': 'App.Object', 'user': 'User', 'stream': 'Stream', 'tag': 'Tag',
+                    'reloadtask': 'ReloadTask', 'externalprogramtask': 'ExternalProgramTask', 'systemrule': 'SystemRule',
+                    'contentlibrary': 'ContentLibrary', 'dataconnection': 'DataConnection'}
+    
+    
+    def SelectionCreate(self, pType, pFilter=None, pIds=None):
+        '''
+        @Function: create a selection of entities in the repository
+        @param pType: entity path (example: app, user, app/object)
+        @param pFilter: select the entities matching the filter
+        @param pIds: select these entities (list of UUID), sent in the body so there is no url length limit
+        @return : selection id
+        '''
+        # an empty filter selects every entity of the type, there is no "everything" scope
+        if pIds is None and not (pFilter or '').strip():
+            raise ValueError('a non empty pFilter or pIds is required')
+        if pIds is not None:
+            pIds=list(pIds)
+            if not pIds:
+                raise ValueError('pIds is empty')
+            typeName=self.SelectionTypes.get(pType.lower(), pType.capitalize())
+            r=self.driver.post('/qrs/selection', data={'items': [{'type': typeName, 'objectID': x} for x in pIds]})
+        else:
+            r=self.driver.post('/qrs/selection/{0}'.format(pType), {'filter': pFilter})
+        r.raise_for_status()
+        return r.json()['id']
+    
+    
+    def SelectionDelete(self, pSelectionID):
+        '''
+        @Function: delete a selection (the entities are not touched)
+        @param pSelectionID: selection id
+        '''
+        return self.driver.delete('/qrs/selection/{id}'.format(id=pSelectionID))
+    
+    
+    @staticmethod
+    def _syntheticProperties(pProperties):
+        # names of the synthetic object: tags is refList_Tag and every custom property is @<name>
+        for k, v in pProperties.items():
+            if k == 'customProperties':
+                for name, values in v.items():
+                    yield ('@'+name, values)
+            else:
+                yield ('refList_Tag' if k == 'tags' else k, v)
+    
+    
+    def BulkUpdate(self, pType, pProperties, pFilter=None, pIds=None):
+        '''
+        @Function: update many entities with a few requests through a selection (synthetic object)
+                    (example: BulkUpdate('app', {'tags': {'added': [tagId], 'removed': []}}, pFilter="stream.name eq 'Sales'")
+                    BulkUpdate('app', {'customProperties': {'Department': {'added': ['Sales'], 'removed': []}}}, pIds=ids)
+                    BulkUpdate('app', {'owner': userId}, pIds=ids))
+        @param pType: entity path (example: app, user, app/object)
+        @param pProperties: dict {property: value}, tags take {'added': [tagId...], 'removed': [tagId...]} and
+                    customProperties {name: {'added': [value...], 'removed': [value...]}},
+                    the synthetic names (refList_Tag, @<name>) are sent as they are
+        @param pFilter: update the entities matching the filter (pFilter or pIds is required)
+        @param pIds: update these entities (list of UUID)
+        @return : response of the synthetic PUT
+        '''
+        selection=self.SelectionCreate(pType, pFilter, pIds)
+        try:
+            apipath='/qrs/selection/{id}/{type}/synthetic'.format(id=selection, type=pType)
+            synthetic=self.driver.get(apipath)
+            synthetic.raise_for_status()
+            data={'latestModifiedDate': synthetic.json().get('latestModifiedDate'),
+                  'properties': [{'name': k, 'value': v, 'valueIsModified': True} for k, v in self._syntheticProperties(pProperties)],
+                  'type': self.SelectionTypes.get(pType.lower(), pType.capitalize())}
+            r=self.driver.put(apipath, data=data)
+        finally:
+            self.SelectionDelete(selection)
+            if self.driver.cache is not None:
+                self.driver.cache.invalidate('/qrs/{0}'.format(pType))
+        return r
+    
+    
+    def BulkDelete(self, pType, pFilter=None, pIds=None):
+        '''
+        @Function: delete many entities with a few requests through a selection
+        @param pType: entity path (example: app, user, app/object)
+        @param pFilter: delete the entities matching the filter (pFilter or pIds is required)
+        @param pIds: delete these entities (list of UUID)
+        @return : response of the selection DELETE
+        '''
+        selection=self.SelectionCreate(pType, pFilter, pIds)
+        try:
+            r=self.driver.delete('/qrs/selection/{id}/{type}'.format(id=selection, type=pType))
+        finally:
+            self.SelectionDelete(selection)
+            if self.driver.cache is not None:
+                self.driver.cache.invalidate('/qrs/{0}'.format(pType))
+        return r
+
+
+        
+
+
+
+class AsyncQPS(object):
+    '''Qlik Sense Proxy Service REST API, asyncio flavour (requires aiohttp)'''
+    
+    VERSION_API= _lv(_minServerAPIversion)
+    
+    def __init__(self, schema='https', proxy='localhost', port=4243, vproxy=None, certificate=None, verify=False, \
+                 user={'userDirectory':'internal', 'userID':'sa_repository', 'password': None}, \
+                 verbosity='INFO', logger='qsapi', limit=100, coalesce=False):  
+        
+        schema, proxy, port=_Controller.normalize(schema, proxy, port, certificate) 
+        p_vproxy={'preffix': vproxy, 'path': '^/qps/', 'template':'/{}/qps/'} if vproxy else None
+        
+        self.driver=_AsyncController(schema, proxy, port, p_vproxy, certificate, verify, user, verbosity, logger, limit, coalesce)
+        
+    
+    async def __aenter__(self):
+        return self
+    
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    
+    async def close(self):
+        '''
+        @Function: release the connections of the underlying session
+        '''
+        await self.driver.close()
+        
+    
+
+    # the request specs are the ones of QPS (see _steps)
+    GetUser       = _async(QPS.GetUser)
+    DeleteUser    = _async(QPS.DeleteUser)
+    GetSession    = _async(QPS.GetSession)
+    DeleteSession = _async(QPS.DeleteSession)
 
 
+
+
+class AsyncQRS(object):
+    '''Qlik Sense Repository Service REST API, asyncio flavour (requires aiohttp)
+    
+        The server version is checked on the first call that needs it or when used as context manager:
+            async with AsyncQRS(proxy='hostname', certificate='path/client.pem') as qrs:
+                apps, users = await asyncio.gather(qrs.AppGet(), qrs.UserGet())
+    '''
+    
+    VERSION_API= _lv(_minServerAPIversion)
+    LicenseType= QRS.LicenseType
+    _toDict    = QRS._toDict
+    
+    
+    def __init__(self, schema='https', proxy='localhost', port=4242, vproxy=None, certificate=None, verify=False, \
+                 user={'userDirectory':'internal', 'userID':'sa_repository', 'password': None}, \
+                 verbosity='INFO', logger='qsapi', limit=100, coalesce=False, version_cache=None, version_ttl=86400):
         
+        schema, proxy, port=_Controller.normalize(schema, proxy, port, certificate)
+        p_vproxy={'preffix': vproxy, 'path': '^/qrs/', 'template':'/{}/qrs/'} if vproxy else None
+            
+        self.driver=_AsyncController(schema, proxy, port, p_vproxy, certificate, verify, user, verbosity, logger, limit, coalesce)
+        self.VERSION_SERVER=None
+        self._versionCache=_VersionCache(None if version_cache is True else version_cache, version_ttl) if version_cache else None
+    
+    
+    async def __aenter__(self):
+        await self._serverVersion()
+        return self
+    
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    
+    async def close(self):
+        '''
+        @Function: release the connections of the underlying session
+        '''
+        await self.driver.close()
+    
+    
+    async def _serverVersion(self):
+        if self.VERSION_SERVER is None:
+            version=_cachedVersion(self, self._versionCache)
+            self.VERSION_SERVER=_checkVersion(self, version or await self.getServerVersion(), self._versionCache, version is not None)
+        return self.VERSION_SERVER
+    
+    
+    async def _get(self, apipath, param=None, stream=False, records=None):
+        if stream:
+            raise ValueError('pStream is not supported by the asyncio interface, the response is buffered')
+        data=(await self.driver.get(apipath, param)).json()
+        if records:
+            # the repeated strings are shared between the entities of the call
+            if records is True:
+                records=_Records()
+            return records(data)
+        return data
+    
+    
+    # the request specs are the ones of QRS (see _steps)
+    ping                       = _async(QRS.ping)
+    getServerVersion           = _async(QRS.getServerVersion)
+    getAbout                   = _async(QRS.getAbout)
+    count                      = _async(QRS.count)
+    getDescription             = _async(QRS.getDescription)
+    getEnum                    = _async(QRS.getEnum)
+    EntityTable                = _async(QRS.EntityTable)
+    
+    
+    #=========================================================================================
+    
+    
+    AppDictAttributes          = _async(QRS.AppDictAttributes)
+    AppCopy                    = _async(QRS.AppCopy)
+    AppExport                  = _async(QRS.AppExport)
+    AppUpload                  = _async(QRS.AppUpload)
+    AppGet                     = _async(QRS.AppGet)
+    AppTable                   = _async(QRS.AppTable)
+    AppMigrate                 = _async(QRS.AppMigrate)
+    AppReload                  = _async(QRS.AppReload)
+    AppPublish                 = _async(QRS.AppPublish)
+    AppUpdate                  = _async(QRS.AppUpdate)
+    AppReplace                 = _async(QRS.AppReplace)
+    AppDelete                  = _async(QRS.AppDelete)
+    
+    
+    #=========================================================================================
+    
+    
+    AppObjectGet               = _async(QRS.AppObjectGet)
+    AppObjectCount             = _async(QRS.AppObjectCount)
+    AppObjectUpdate            = _async(QRS.AppObjectUpdate)
+    AppObjectApprove           = _async(QRS.AppObjectApprove)
+    AppObjectPublish           = _async(QRS.AppObjectPublish)
+    AppObjectDelete            = _async(QRS.AppObjectDelete)
+    
+    
+    #=========================================================================================
+    
+    
+    StreamCreate               = _async(QRS.StreamCreate)
+    StreamGet                  = _async(QRS.StreamGet)
+    StreamTable                = _async(QRS.StreamTable)
+    StreamUpdate               = _async(QRS.StreamUpdate)
+    StreamDelete               = _async(QRS.StreamDelete)
+    StreamDictAttributes       = _async(QRS.StreamDictAttributes)
+    
+    
+    #=========================================================================================
+    
+    
+    UserGet                    = _async(QRS.UserGet)
+    UserTable                  = _async(QRS.UserTable)
+    UserUpdate                 = _async(QRS.UserUpdate)
+    UserDelete                 = _async(QRS.UserDelete)
+    UserDictAttributes         = _async(QRS.UserDictAttributes)
+    
+    
+    #=========================================================================================
+    
+    
+    TaskGet                    = _async(QRS.TaskGet)
+    TaskTable                  = _async(QRS.TaskTable)
+    TaskStart                  = _async(QRS.TaskStart)
+    TaskStartSynchronous       = _async(QRS.TaskStartSynchronous)
+    TaskStartByName            = _async(QRS.TaskStartByName)
+    TaskStartMany              = _async(QRS.TaskStartMany)
+    TaskStartByNameSynchronous = _async(QRS.TaskStartByNameSynchronous)
+    TaskStop                   = _async(QRS.TaskStop)
+    TaskStopMany               = _async(QRS.TaskStopMany)
+    
+    
+    #=========================================================================================
+    
+    
+    SystemRulesGet             = _async(QRS.SystemRulesGet)
+    SystemRulesCreate          = _async(QRS.SystemRulesCreate)
+    SystemRulesDictAttributes  = _async(QRS.SystemRulesDictAttributes)
+    
+    
+    #=========================================================================================
+    
+    
+    ReloadTaskGet              = _async(QRS.ReloadTaskGet)
+    
+    
+    #=========================================================================================
+    
+    
+    PropertiesGet              = _async(QRS.PropertiesGet)
+    
+    
+    #=========================================================================================
+    
+    
+    TagsDictAttributes         = _async(QRS.TagsDictAttributes)
+    
+    
+    #=========================================================================================
+    
+    
+    LicenseUsageSummary        = _async(QRS.LicenseUsageSummary)
+    LicenseAccessGet           = _async(QRS.LicenseAccessGet)
+    LicenseAccessDelete        = _async(QRS.LicenseAccessDelete)
+    LicenseAccessCount         = _async(QRS.LicenseAccessCount)
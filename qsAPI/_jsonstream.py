@@ -0,0 +1,76 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import json, codecs
+
+_decoder=json.JSONDecoder()
+_WS=' \t\n\r'
+
+
+
+def _iterArray(chunks, encoding='utf-8'):
+    '''
+    @Function: decode incrementally a json document received in chunks
+    @param chunks: iterable of bytes
+    @return: generator with the items of the top level array (or the document itself if it is not an array)
+    '''
+    text=codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    buf, pos, array = '', 0, None
+
+    for chunk in chunks:
+        # only the undecoded tail is kept between chunks
+        buf=buf[pos:]+text.decode(chunk)
+        pos=0
+
+        if array is None:
+            pos=len(buf)-len(buf.lstrip(_WS))
+            if pos == len(buf):
+                continue
+            array= buf[pos] == '['
+            if not array:
+                continue
+            pos+=1
+        elif not array:
+            continue
+
+        while True:
+            while pos < len(buf) and buf[pos] in _WS+',':
+                pos+=1
+            if pos == len(buf) or buf[pos] == ']':
+                break
+            try:
+                (item, end)=_decoder.raw_decode(buf, pos)
+            except ValueError:
+                break   # incomplete item, wait for more data
+            if not isinstance(item, (dict, list, str)) and (end == len(buf) or buf[end] not in _WS+',]'):
+                break   # a number could continue in the next chunk
+            pos=end
+            yield item
+
+        if pos < len(buf) and buf[pos] == ']':
+            return
+
+    buf=buf[pos:]+text.decode(b'', final=True)
+    if array is False:
+        yield json.loads(buf)
+    elif array and buf.strip(_WS+',') not in ('', ']'):
+        raise ValueError('truncated json array: {0}...'.format(buf[:80]))
+
+
+
+def _iterJson(response, chunk_size=512 << 10):
+    '''
+    @Function: decode a streamed requests.Response item by item, the connection is released at the end
+    '''
+    try:
+        response.raise_for_status()
+        yield from _iterArray(response.iter_content(chunk_size=chunk_size), response.encoding)
+    finally:
+        response.close()
@@ -0,0 +1,171 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import time, random, threading
+import email.utils
+from requests.exceptions import ConnectTimeout
+from urllib3.exceptions import NewConnectionError
+
+from ._cache import _READONLY, _endpointKey
+
+
+
+class _Limiter(object):
+    """ Adaptive limit of the requests in flight (AIMD): +1 for every round of calls answered in time,
+        multiplied by decrease on 429/503, connection errors or latency spikes"""
+
+    def __init__(self, initial=8, minimum=1, maximum=64, decrease=0.5, spike=3.0, min_samples=10):
+        '''
+            @Function setup: concurrency governor
+            @param initial: requests allowed in flight at start
+            @param minimum, maximum: bounds of the limit
+            @param decrease: factor applied to the limit when the server pushes back
+            @param spike: a latency over spike times the average of its endpoint counts as push back
+            @param min_samples: calls of an endpoint before its latencies are judged
+        '''
+        self.limit=float(initial)
+        self.minimum=int(minimum)
+        self.maximum=int(maximum)
+        self.decrease=decrease
+        self.spike=spike
+        self.min_samples=int(min_samples)
+        self.inflight=0
+        self.backoffs=0
+        self._latencies={}
+        self._decreased=0.0
+        self._cond=threading.Condition()
+
+
+    key=staticmethod(_endpointKey)
+
+
+    def acquire(self):
+        '''
+        @Function: wait for a free slot
+        @return: token to give back to release
+        '''
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight+=1
+            return time.monotonic()
+
+
+    def tryAcquire(self):
+        '''
+        @return: token of a free slot, None when all the slots are taken
+        '''
+        with self._cond:
+            if self.inflight >= int(self.limit):
+                return None
+            self.inflight+=1
+            return time.monotonic()
+
+
+    def release(self, token, key=None, seconds=None, overloaded=False):
+        '''
+        @param token: returned by acquire
+        @param key: endpoint, to judge the latency (None for transfers)
+        @param seconds: latency of the call
+        @param overloaded: the server pushed back (429, 503, connection refused)
+        '''
+        with self._cond:
+            self.inflight-=1
+            if key is not None and seconds is not None and not overloaded:
+                (count, avg)=self._latencies.get(key, (0, seconds))
+                overloaded= count >= self.min_samples and seconds > self.spike*avg
+                self._latencies[key]=(count+1, 0.9*avg+0.1*seconds)
+
+            if overloaded:
+                # calls started before the last decrease already saw it
+                if token > self._decreased:
+                    self.limit=max(self.minimum, self.limit*self.decrease)
+                    self._decreased=time.monotonic()
+                    self.backoffs+=1
+            else:
+                self.limit=min(self.maximum, self.limit+1.0/self.limit)
+            self._cond.notify_all()
+
+
+
+class _Retry(object):
+    """ Retry policy: jittered exponential backoff, Retry-After honoured, non idempotent calls
+        only retried when the server did not process them"""
+
+    STATUSES  =(429, 503)
+    IDEMPOTENT=('GET', 'PUT', 'DELETE', 'HEAD', 'OPTIONS')
+    READONLY  =_READONLY
+
+
+    def __init__(self, total=3, backoff=0.2, max_backoff=30, statuses=None):
+        '''
+            @Function setup: retry policy
+            @param total: max retries of a call
+            @param backoff: base of the exponential backoff in seconds (full jitter)
+            @param max_backoff: max seconds between two attempts, Retry-After included
+            @param statuses: status codes retried, 429 and 503 by default
+        '''
+        self.total=int(total)
+        self.backoff=backoff
+        self.max_backoff=max_backoff
+        self.statuses=tuple(statuses or self.STATUSES)
+        self.retries=0
+
+
+    def idempotent(self, method, apipath):
+        return method.upper() in self.IDEMPOTENT or bool(self.READONLY.search(apipath.split('?')[0]))
+
+
+    def _wait(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(self.max_backoff, retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff*(2 ** attempt)))
+
+
+    @staticmethod
+    def retryAfter(response):
+        value=response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp()-time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+    def onResponse(self, response, attempt, idempotent):
+        '''
+        @return: seconds to wait before the next attempt, None to keep the response
+        '''
+        if attempt >= self.total or response.status_code not in self.statuses:
+            return None
+        # 429 means the request was not processed at all
+        if not idempotent and response.status_code != 429:
+            return None
+        self.retries+=1
+        return self._wait(attempt, self.retryAfter(response))
+
+
+    def onError(self, error, attempt, idempotent):
+        '''
+        @return: seconds to wait before the next attempt, None to raise the error
+        '''
+        if attempt >= self.total:
+            return None
+        # a connection never opened did not reach the server
+        reason=getattr(error.args[0], 'reason', None) if error.args else None
+        if not idempotent and not isinstance(error, ConnectTimeout) and not isinstance(reason, NewConnectionError):
+            return None
+        self.retries+=1
+        return self._wait(attempt)
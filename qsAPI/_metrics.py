@@ -0,0 +1,87 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import bisect, threading
+from collections import defaultdict
+
+
+
+class _Metrics(object):
+    """ In-memory aggregator of the driver records (see _Controller option metrics)"""
+
+    BUCKETS=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    PHASES =('prepare', 'connect', 'tls', 'ttfb', 'transfer', 'decode', 'total')
+
+
+    def __init__(self, buckets=None):
+        self.buckets=tuple(buckets or self.BUCKETS)
+        self._lock=threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        with self._lock:
+            # (phase, api) -> [counts by bucket..., +Inf], sum
+            self._hist=defaultdict(lambda: [[0]*(len(self.buckets)+1), 0.0])
+            self._bytes=defaultdict(int)
+            self._status=defaultdict(int)
+            self._redirects=defaultdict(int)
+
+
+    def observe(self, phase, api, seconds):
+        with self._lock:
+            h=self._hist[(phase, api)]
+            h[0][bisect.bisect_left(self.buckets, seconds)]+=1
+            h[1]+=seconds
+
+
+    def __call__(self, record):
+        api=record.get('api') or ''
+        for phase in self.PHASES:
+            if record.get(phase) is not None:
+                self.observe(phase, api, record[phase])
+        if record.get('event') != 'call':
+            return
+        with self._lock:
+            self._bytes[('sent', api)]+=record.get('sent') or 0
+            self._bytes[('received', api)]+=record.get('received') or 0
+            self._status[(str(record.get('status')), api)]+=1
+            self._redirects[api]+=record.get('redirects') or 0
+
+
+    def prometheus(self, prefix='qsapi'):
+        '''
+        @Function: dump the aggregated values in Prometheus text exposition format
+        '''
+        lines=['# HELP {0}_phase_seconds Time spent by phase of the requests'.format(prefix),
+               '# TYPE {0}_phase_seconds histogram'.format(prefix)]
+        with self._lock:
+            for (phase, api), (counts, total) in sorted(self._hist.items()):
+                labels='phase="{0}",api="{1}"'.format(phase, api)
+                acc=0
+                for le, n in zip(self.buckets+('+Inf',), counts):
+                    acc+=n
+                    lines.append('{0}_phase_seconds_bucket{{{1},le="{2}"}} {3}'.format(prefix, labels, le, acc))
+                lines.append('{0}_phase_seconds_sum{{{1}}} {2}'.format(prefix, labels, total))
+                lines.append('{0}_phase_seconds_count{{{1}}} {2}'.format(prefix, labels, acc))
+
+            lines+=['# HELP {0}_bytes_total Bytes sent and received'.format(prefix),
+                    '# TYPE {0}_bytes_total counter'.format(prefix)]
+            lines+=['{0}_bytes_total{{direction="{1}",api="{2}"}} {3}'.format(prefix, d, api, n) for (d, api), n in sorted(self._bytes.items())]
+
+            lines+=['# HELP {0}_responses_total Responses by status code'.format(prefix),
+                    '# TYPE {0}_responses_total counter'.format(prefix)]
+            lines+=['{0}_responses_total{{status="{1}",api="{2}"}} {3}'.format(prefix, s, api, n) for (s, api), n in sorted(self._status.items())]
+
+            lines+=['# HELP {0}_redirects_total Redirections followed'.format(prefix),
+                    '# TYPE {0}_redirects_total counter'.format(prefix)]
+            lines+=['{0}_redirects_total{{api="{1}"}} {2}'.format(prefix, api, n) for api, n in sorted(self._redirects.items())]
+
+        return '\n'.join(lines)+'\n'
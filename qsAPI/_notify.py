@@ -0,0 +1,237 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import json, queue, socket, logging, secrets, threading
+import urllib.parse as up
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+
+class _CallbackHandler(BaseHTTPRequestHandler):
+    protocol_version='HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+
+    def do_POST(self):
+        listener=self.server.listener
+        body=self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if not listener.allowed(self.client_address[0], self.path):
+            listener.log.warning('NOTIFY: callback refused from %s', self.client_address[0])
+            self.send_response(403)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        # the repository does not wait for the subscribers, answer before dispatching
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        try:
+            events=json.loads(body.decode('utf-8')) if body else []
+        except ValueError:
+            listener.log.warning('NOTIFY: invalid body %r', body[:200])
+            return
+        # the invalidations and snapshot syncs run in the worker of the listener, not in the request
+        listener.queue.put(events)
+
+
+
+class _Listener(object):
+    """ Subscriber of the repository change notifications (/qrs/notification): a local http server receives
+        the callbacks and invalidates the client side state (response cache, entity stores, snapshots)"""
+
+    CHANGES={1: 'Add', 2: 'Update', 3: 'Delete'}
+
+    # the status of the tasks is embedded in /qrs/task/full, /qrs/reloadtask/full...
+    RELATED={'executionresult'    : ('task', 'reloadtask', 'externalprogramtask'),
+             'reloadtask'         : ('task',),
+             'externalprogramtask': ('task',)}
+
+
+    def __init__(self, qrs, host='127.0.0.1', port=0, callback=None, allow=None, secret=None):
+        '''
+            @Function setup: callback listener, started at once in a daemon thread
+            @param qrs: QRS handler
+            @param host, port: address listened, loopback and any free port by default
+                    (host='' listens on every interface, for a repository on another machine)
+            @param callback: url announced to the repository, http://<host or fqdn>:<port>/<secret> by default,
+                    only the posts to its path are accepted
+            @param allow: addresses allowed to post the callbacks (example: the ip of the repository nodes), any by default
+            @param secret: last part of the default callback path, random by default
+        '''
+        self.qrs=qrs
+        self.log=logging.getLogger(qrs.driver.log.name)
+        self.server=ThreadingHTTPServer((host, port), _CallbackHandler)
+        self.server.daemon_threads=True
+        self.server.listener=self
+        self.callback=callback or 'http://{0}:{1}/{2}'.format(host if host not in ('', '0.0.0.0') else socket.getfqdn(), \
+                                                             self.server.server_address[1], secret or secrets.token_urlsafe(16))
+        self._callbackPath=up.urlsplit(self.callback).path or '/'
+        self.allow=frozenset(allow) if allow else None
+        self.queue=queue.Queue()
+        self.handles=[]
+        self.targets=[]
+        self.callbacks=[]
+        self.events=0
+        # App.Object -> app/object
+        self._paths={v.lower(): k for k, v in qrs.SelectionTypes.items()}
+        self._lock=threading.Lock()
+        self._thread=threading.Thread(target=self.server.serve_forever, name='qsapi-notify', daemon=True)
+        self._thread.start()
+        self._worker=threading.Thread(target=self._work, name='qsapi-notify-worker', daemon=True)
+        self._worker.start()
+
+
+    def allowed(self, address, path):
+        '''
+        @return: True if a callback posted by address to path is accepted
+        '''
+        if self.allow is not None and address not in self.allow:
+            return False
+        return secrets.compare_digest(path.split('?')[0], self._callbackPath)
+
+
+    def _work(self):
+        while True:
+            events=[self.queue.get()]
+            # the callbacks queued meanwhile are dispatched at once (one invalidation by burst)
+            while True:
+                try:
+                    events.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop=None in events
+            try:
+                self.dispatch([e for x in events if x is not None for e in (x if isinstance(x, list) else [x])])
+            except Exception:
+                self.log.exception('NOTIFY: dispatch failed')
+            if stop:
+                return
+
+
+    def path(self, objectType):
+        '''
+        @return: entity path of a repository type name (example: App.Object -> app/object)
+        '''
+        name=objectType.lower()
+        return self._paths.get(name, name.replace('.', '/'))
+
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+
+    def subscribe(self, name, changeTypes=('Add', 'Update', 'Delete'), pFilter=None):
+        '''
+        @Function: register the callback for the changes of an entity type
+        @param name: entity type as named by the repository (example: App, Stream, User, ReloadTask, ExecutionResult)
+        @param changeTypes: changes notified
+        @param pFilter: only notify the entities matching the filter
+        @return: list of the notification handles
+        '''
+        handles=[]
+        for change in ([changeTypes] if isinstance(changeTypes, str) else changeTypes):
+            param={'name': name, 'changeType': change}
+            if pFilter:
+                param['filter']=pFilter
+            r=self.qrs.driver.post('/qrs/notification', param, data=json.dumps(self.callback))
+            r.raise_for_status()
+            handles.append(r.json())
+        with self._lock:
+            self.handles.extend(handles)
+        return handles
+
+
+    def watch(self, target):
+        '''
+        @Function: keep an _EntityStore (invalidated) or a _Snapshot (synced by delta) up to date
+        '''
+        with self._lock:
+            self.targets.append(target)
+        return target
+
+
+    def on(self, fn, name=None):
+        '''
+        @Function: call fn(event) for every change (of the entity type name or path), the events are dicts with
+                    objectType, objectID and changeType ('Add', 'Update' or 'Delete')
+        '''
+        with self._lock:
+            self.callbacks.append((self.path(name) if name else None, fn))
+        return fn
+
+
+    def dispatch(self, events):
+        if isinstance(events, dict):
+            events=[events]
+        types=set()
+        for e in events:
+            if not isinstance(e, dict):
+                continue
+            event={'objectType': e.get('objectType') or e.get('schemaPath') or '',
+                   'objectID'  : e.get('objectID') or e.get('objectId'),
+                   'changeType': self.CHANGES.get(e.get('changeType'), e.get('changeType'))}
+            with self._lock:
+                self.events+=1
+            pType=self.path(event['objectType'])
+            types.add(pType)
+            self.log.debug('NOTIFY: %s %s %s', event['changeType'], event['objectType'], event['objectID'])
+
+            if event['changeType'] == 'Delete':
+                for t in self.targets:
+                    if getattr(t, 'remove', None) and pType in getattr(t, 'entities', ()):
+                        t.remove(pType, event['objectID'])
+            for name, fn in list(self.callbacks):
+                if name is None or name == pType:
+                    try:
+                        fn(event)
+                    except Exception:
+                        self.log.exception('NOTIFY: callback failed')
+
+        # a burst of events of the same type costs one invalidation
+        for pType in types:
+            for path in (pType,)+self.RELATED.get(pType, ()):
+                if self.qrs.driver.cache is not None:
+                    self.qrs.driver.cache.invalidate('/qrs/{0}'.format(path))
+                for t in list(self.targets):
+                    if getattr(t, 'pType', None) == path:
+                        t.invalidate()
+                    elif path in getattr(t, 'entities', ()):
+                        try:
+                            t.syncEntity(path)
+                        except Exception:
+                            self.log.exception('NOTIFY: snapshot sync of %s failed', path)
+
+
+    def close(self):
+        '''
+        @Function: unregister the notifications and stop the listener
+        '''
+        with self._lock:
+            handles, self.handles=self.handles, []
+        for handle in handles:
+            try:
+                self.qrs.driver.delete('/qrs/notification', {'handle': handle})
+            except Exception:
+                self.log.warning('NOTIFY: unable to unregister %s', handle)
+        self.server.shutdown()
+        self.server.server_close()
+        self.queue.put(None)
+        self._worker.join(5)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,167 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import json, threading
+
+
+
+class _Packed(bytes):
+    """ Compact json of a rarely used field, decoded on every access"""
+    __slots__=()
+
+
+
+class _Record(object):
+    """ Base of the entity records: __slots__ objects, one class by set of keys"""
+    __slots__=()
+    _fields=()
+
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+
+    def __contains__(self, key):
+        return key in self._fields
+
+
+    def keys(self):
+        return self._fields
+
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self._fields]
+
+
+    def toDict(self):
+        '''
+        @return: the entity as plain json structures (dict)
+        '''
+        return {k: _plain(getattr(self, k)) for k in self._fields}
+
+
+    def __eq__(self, other):
+        return isinstance(other, _Record) and self.items() == other.items()
+
+
+    def __hash__(self):
+        return hash(self.get('id')) if 'id' in self._fields else object.__hash__(self)
+
+
+    def __repr__(self):
+        return '<{0} {1}>'.format(type(self).__name__, ', '.join('{0}={1!r}'.format(k, getattr(self, k)) for k in self._fields[:3]))
+
+
+
+def _plain(value):
+    if isinstance(value, _Record):
+        return value.toDict()
+    if isinstance(value, tuple):
+        return [_plain(v) for v in value]
+    return value
+
+
+
+def _lazy(slot):
+    def fget(self):
+        value=getattr(self, slot)
+        return json.loads(value) if type(value) is _Packed else value
+    return property(fget)
+
+
+_classes={}
+_classesLock=threading.Lock()
+
+
+def _recordClass(keys, lazy):
+    '''
+    @return: _Record subclass with a slot by key, the lazy keys are properties decoding their slot
+    '''
+    with _classesLock:
+        cls=_classes.get((keys, lazy))
+        if cls is None:
+            attrs={'__slots__': tuple('_'+k if k in lazy else k for k in keys), '_fields': keys}
+            for k in keys:
+                if k in lazy:
+                    attrs[k]=_lazy('_'+k)
+            cls=_classes[(keys, lazy)]=type('Record', (_Record,), attrs)
+        return cls
+
+
+
+class _Records(object):
+    """ Converter of json entities into compact records: nested structures become records or tuples,
+        repeated strings are shared and the rarely used fields are kept packed until read"""
+
+    # shared by many entities (directories, object types, engine types, stream names...)
+    INTERN=frozenset(('userDirectory', 'objectType', 'engineObjectType', 'schemaPath', 'type', 'attributeType',
+                      'contentHash', 'licenseGroup', 'assignedSheetType'))
+    LAZY=frozenset(('privileges', 'customProperties', 'tags', 'attributes', 'roles', 'favorites', 'userAccessGroup'))
+
+
+    def __init__(self, intern=None, lazy=None):
+        '''
+            @Function setup: records converter, the strings are shared between the entities of one call
+            @param intern: top level keys with repeated values (the strings of the nested structures are always shared)
+            @param lazy: keys kept as packed json and decoded on access
+        '''
+        self.intern=frozenset(intern) if intern is not None else self.INTERN
+        self.lazy=frozenset(lazy) if lazy is not None else self.LAZY
+
+
+    def _value(self, value, nested, strings):
+        if isinstance(value, dict):
+            return self._record(value, strings, True)
+        if isinstance(value, list):
+            return tuple(self._value(v, True, strings) for v in value)
+        if nested and isinstance(value, str):
+            return strings.setdefault(value, value)
+        return value
+
+
+    def _record(self, entity, strings, nested=False):
+        keys=tuple(strings.setdefault(k, k) for k in entity)
+        if not all(k.isidentifier() and not k.startswith('_') for k in keys):
+            return {k: self._value(v, True, strings) for k, v in entity.items()}
+        lazy=self.lazy.intersection(keys) if not nested else frozenset()
+        cls=_recordClass(keys, frozenset(lazy))
+        r=cls.__new__(cls)
+        for k, v in entity.items():
+            if k in lazy:
+                if v:
+                    object.__setattr__(r, '_'+k, _Packed(json.dumps(v, separators=(',', ':')).encode('utf-8')))
+                else:
+                    object.__setattr__(r, '_'+k, self._value(v, True, strings))
+            elif not nested and k in self.intern and isinstance(v, str):
+                object.__setattr__(r, k, strings.setdefault(v, v))
+            else:
+                object.__setattr__(r, k, self._value(v, nested, strings))
+        return r
+
+
+    def __call__(self, data):
+        '''
+        @param data: entity (dict), list of entities or iterator of entities
+        @return: record, list of records or generator of records
+        '''
+        # the table of the shared strings lives as long as the call (the generator), the ids would make
+        # a table kept between calls grow for good
+        strings={}
+        if isinstance(data, dict):
+            return self._record(data, strings)
+        if isinstance(data, list):
+            return [self._record(e, strings) for e in data]
+        return (self._record(e, strings) for e in data)
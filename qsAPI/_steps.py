@@ -0,0 +1,58 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import functools
+
+
+
+def _steps(func):
+    '''
+    @Function: decorator, the request specs of an interface method are written once for QRS/QPS and AsyncQRS/AsyncQPS
+                func is a generator that yields every driver call (value = yield self.driver.get(...)) and returns the result,
+                the blocking driver answers the call itself, the asyncio driver returns an awaitable (see _async)
+    '''
+    @functools.wraps(func)
+    def method(self, *args, **kwargs):
+        steps=func(self, *args, **kwargs)
+        value=None
+        try:
+            while True:
+                value=steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+
+    method._steps=func
+    return method
+
+
+
+def _async(method):
+    '''
+    @Function: coroutine method of the asyncio interfaces built on the steps of a blocking interface method
+    @param method: an interface method decorated with _steps
+    '''
+    func=method._steps
+
+    @functools.wraps(func)
+    async def coroutine(self, *args, **kwargs):
+        steps=func(self, *args, **kwargs)
+        send, value = steps.send, None
+        while True:
+            try:
+                pending=send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                send, value = steps.send, await pending
+            except Exception as e:
+                # raised at the yield, as the blocking driver does
+                send, value = steps.throw, e
+
+    return coroutine
@@ -0,0 +1,209 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import threading, types
+
+
+
+def _values(entity, path):
+    '''
+    @Function: values found at a dotted path, lists are walked (tags.name gives every tag name)
+                and customProperties.<Name> gives the values of the custom property <Name>
+    @return: list of hashable values
+    '''
+    nodes=[entity]
+    parts=path.split('.')
+    for i, part in enumerate(parts):
+        found=[]
+        for node in nodes:
+            if isinstance(node, list):
+                node_list=node
+            else:
+                node_list=[node]
+            for n in node_list:
+                if not isinstance(n, dict):
+                    continue
+                if part == 'customProperties' and i+1 < len(parts):
+                    # customProperties.Department: matched by definition name, not by position
+                    found.extend(cp.get('value') for cp in (n.get(part) or [])
+                                 if (cp.get('definition') or {}).get('name') == parts[i+1])
+                    return [v for v in found if v is not None]
+                found.append(n.get(part))
+        nodes=[n for n in found if n is not None]
+
+    values=[]
+    for n in nodes:
+        for v in (n if isinstance(n, list) else [n]):
+            if v is not None and not isinstance(v, (dict, list)):
+                values.append(v)
+    return values
+
+
+
+class _State(object):
+    """ Entities of a store loaded together with their indexes, replaced as a whole on refresh"""
+
+    def __init__(self, entities):
+        self.entities=entities
+        self.ids={e.get('id'): e for e in entities}
+        self.indexes={}
+        self._lock=threading.Lock()
+
+
+    def build(self, path):
+        index={}
+        for e in self.entities:
+            for v in set(_values(e, path)):
+                index.setdefault(v, []).append(e)
+        # shared by every lookup, the callers get read-only views
+        index=types.MappingProxyType({v: tuple(found) for v, found in index.items()})
+        self.indexes[path]=index
+        return index
+
+
+    def index(self, path):
+        index=self.indexes.get(path)
+        if index is None:
+            with self._lock:
+                index=self.indexes.get(path)
+                if index is None:
+                    index=self.build(path)
+        return index
+
+
+
+class _EntityStore(object):
+    """ In-memory copy of an entity type with hash indexes on id and dotted paths (stream.name, owner.userId,
+        customProperties.<Name>, tags.name), lookups and joins do not touch the network"""
+
+    def __init__(self, qrs, pType, pFilter=None, indexes=None):
+        '''
+            @Function setup: entity store, loaded on first use
+            @param qrs: QRS handler
+            @param pType: entity path (example: app, stream, user, tag, systemrule)
+            @param pFilter: filter the entities loaded
+            @param indexes: paths indexed at load time, any other path is indexed on its first lookup
+        '''
+        self.qrs=qrs
+        self.pType=pType
+        self.pFilter=pFilter
+        self.preload=list(indexes or ['name'])
+        self._state=None
+        self._lock=threading.RLock()
+
+
+    def refresh(self):
+        '''
+        @Function: (re)load the entities with a single /full call and rebuild the indexes,
+                    on an error the loaded entities are kept
+        '''
+        r=self.qrs.driver.get('/qrs/{0}/full'.format(self.pType), {'filter': self.pFilter})
+        r.raise_for_status()
+        state=_State(r.json())
+        for path in self.preload:
+            state.build(path)
+        with self._lock:
+            self._state=state
+        return self
+
+
+    def invalidate(self):
+        '''
+        @Function: drop the entities, the next lookup reloads them
+        '''
+        with self._lock:
+            self._state=None
+
+
+    def _load(self):
+        # the lookups work on the state taken here, a concurrent invalidate or refresh swaps it without touching it
+        state=self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self.refresh()
+                state=self._state
+        return state
+
+
+    def index(self, path):
+        '''
+        @Function: group the entities by the values of a path (i.e. stream.id for apps by stream,
+                    userDirectory for users by directory)
+        @return: read-only dict(value: tuple of entities)
+        '''
+        return self._load().index(path)
+
+
+    def get(self, pId, default=None):
+        '''
+        @return: the entity with id pId
+        '''
+        return self._load().ids.get(pId, default)
+
+
+    def find(self, path, value):
+        '''
+        @return: tuple of entities having value at path
+        '''
+        return self.index(path).get(value, ())
+
+
+    def first(self, path, value, default=None):
+        '''
+        @return: the first entity having value at path
+        '''
+        found=self.index(path).get(value)
+        return found[0] if found else default
+
+
+    def join(self, path, other, on='id'):
+        '''
+        @Function: match every entity with the entities of another store (i.e. apps.join('stream.id', streams))
+        @param path: path of this store with the values to match
+        @param other: _EntityStore to match with
+        @param on: path of the other store
+        @return: list of (entity, [matching entities])
+        '''
+        index=other.index(on)
+        result=[]
+        for e in self._load().entities:
+            matches=[]
+            for v in _values(e, path):
+                matches.extend(index.get(v, []))
+            result.append((e, matches))
+        return result
+
+
+    def toDict(self, key='name', attr='id'):
+        '''
+        @Function: same mapping as the *DictAttributes methods, from the memory copy
+        @param key: the attribute to be the key
+        @param attr: the attribute value to retrieve (single value or list)
+        @return: dict(key:attr)
+        '''
+        entities=self._load().entities
+        if isinstance(attr, str):
+            return {e.get(key): e.get(attr) for e in entities}
+        elif isinstance(attr, list):
+            return {e.get(key): {a: e.get(a) for a in attr} for e in entities}
+        raise TypeError('attr argument must be a str or list')
+
+
+    def __iter__(self):
+        return iter(self._load().entities)
+
+
+    def __len__(self):
+        return len(self._load().entities)
+
+
+    def __contains__(self, pId):
+        return pId in self._load().ids
@@ -0,0 +1,199 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import json, time, sqlite3, threading
+
+
+
+class _Snapshot(object):
+    """ Local SQLite mirror of repository entities, refreshed by delta: only the entities modified
+        since the last high-water mark are fetched, deletions are found by diffing the ids"""
+
+    ENTITIES=('app', 'stream', 'user', 'task', 'tag', 'systemrule')
+    # ids fetched by request when entities are missing locally (keeps the url short)
+    IDS_BY_FILTER=50
+
+
+    def __init__(self, qrs, path, entities=None, pageSize=500):
+        '''
+            @Function setup: snapshot database, created if missing
+            @param qrs: QRS handler
+            @param path: sqlite file (':memory:' for a process-local copy)
+            @param entities: entity paths mirrored, app, stream, user, task, tag and systemrule by default
+            @param pageSize: number of entities written by transaction
+        '''
+        self.qrs=qrs
+        self.path=path
+        self.entities=tuple(entities or self.ENTITIES)
+        self.pageSize=int(pageSize)
+        self._lock=threading.RLock()
+        self.db=sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory=sqlite3.Row
+        with self._lock, self.db:
+            if path != ':memory:':
+                self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS _sync (entity TEXT PRIMARY KEY, highwater TEXT, synced REAL)')
+            for pType in self.entities:
+                self.db.execute('CREATE TABLE IF NOT EXISTS "{0}" (id TEXT PRIMARY KEY, name TEXT, modifiedDate TEXT, '
+                                'json TEXT NOT NULL)'.format(self._table(pType)))
+                self.db.execute('CREATE INDEX IF NOT EXISTS "{0}_name" ON "{0}" (name)'.format(self._table(pType)))
+
+
+    @staticmethod
+    def _table(pType):
+        # app/object is stored in app_object
+        return pType.replace('/', '_')
+
+
+    def highwater(self, pType):
+        '''
+        @return: modifiedDate of the newest entity stored, None before the first load
+        '''
+        with self._lock:
+            row=self.db.execute('SELECT highwater FROM _sync WHERE entity=?', (pType,)).fetchone()
+        return row[0] if row else None
+
+
+    def _ids(self, pType):
+        # the condensed collection carries the ids without the payload of /full
+        return {x['id'] for x in self.qrs.driver.get('/qrs/{0}'.format(pType)).json()}
+
+
+    def syncEntity(self, pType):
+        '''
+        @Function: bring one entity type up to date
+        @return: dict with the number of entities upserted and deleted
+        '''
+        hw=self.highwater(pType)
+        # ge: an entity written in the millisecond of the mark but committed after the last read has the date
+        # of the mark, the entities of the mark come back on each sync and the unchanged ones are skipped
+        pFilter="modifiedDate ge '{0}'".format(hw) if hw else None
+        table=self._table(pType)
+        with self._lock:
+            known={r[0]: r[1] for r in self.db.execute('SELECT id, json FROM "{0}" WHERE modifiedDate >= ?'.format(table), (hw,))} \
+                  if hw else {}
+
+        # one request decoded incrementally: skip/take pages shift when entities change during the sync
+        # and the entity crossing a page boundary would be missed for good
+        entities=self.qrs._get('/qrs/{0}/full'.format(pType), {'filter': pFilter}, stream=True)
+        (upserted, newest)=self._store(table, entities, hw, known)
+
+        deleted=0
+        if hw is not None:
+            # after the upserts the local copy holds every remote entity modified since the mark,
+            # the ids are only compared when the counts say otherwise (deletions, restored entities)
+            with self._lock:
+                local=self.db.execute('SELECT count(*) FROM "{0}"'.format(table)).fetchone()[0]
+            if local != self.qrs.count(pType):
+                remote=self._ids(pType)
+                with self._lock, self.db:
+                    ids={r[0] for r in self.db.execute('SELECT id FROM "{0}"'.format(table))}
+                    gone=[(x,) for x in ids if x not in remote]
+                    self.db.executemany('DELETE FROM "{0}" WHERE id=?'.format(table), gone)
+                deleted=len(gone)
+                missing=sorted(remote-ids)
+                for i in range(0, len(missing), self.IDS_BY_FILTER):
+                    pFilter=' or '.join("id eq {0}".format(x) for x in missing[i:i+self.IDS_BY_FILTER])
+                    entities=self.qrs.driver.get('/qrs/{0}/full'.format(pType), {'filter': pFilter}).json()
+                    (count, newest)=self._store(table, entities, newest)
+                    upserted+=count
+
+        with self._lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO _sync (entity, highwater, synced) VALUES (?, ?, ?)',
+                            (pType, newest, time.time()))
+        return {'upserted': upserted, 'deleted': deleted}
+
+
+    def _store(self, table, entities, newest, known=None):
+        '''
+        @param known: dict(id: json) of the stored entities, the identical ones are not written again
+        @return: (entities stored, newest modifiedDate)
+        '''
+        (stored, rows)=(0, [])
+        for e in entities:
+            modified=e.get('modifiedDate')
+            if modified and (newest is None or modified > newest):
+                newest=modified
+            data=json.dumps(e, separators=(',', ':'))
+            if known and known.get(e.get('id')) == data:
+                continue
+            rows.append((e.get('id'), e.get('name'), modified, data))
+            if len(rows) >= self.pageSize:
+                stored+=self._upsert(table, rows)
+                rows=[]
+        stored+=self._upsert(table, rows)
+        return (stored, newest)
+
+
+    def _upsert(self, table, rows):
+        if rows:
+            with self._lock, self.db:
+                self.db.executemany('INSERT OR REPLACE INTO "{0}" (id, name, modifiedDate, json) VALUES (?, ?, ?, ?)'.format(table), rows)
+        return len(rows)
+
+
+    def sync(self, entities=None):
+        '''
+        @Function: bring the snapshot up to date, the first call loads everything
+        @param entities: limit the refresh to these entity paths
+        @return: dict(entity: {'upserted': n, 'deleted': n})
+        '''
+        return {pType: self.syncEntity(pType) for pType in (entities or self.entities)}
+
+
+    def reset(self, pType=None):
+        '''
+        @Function: forget the high-water mark, the next sync reloads the entity type (all by default)
+        '''
+        with self._lock, self.db:
+            for p in ([pType] if pType else self.entities):
+                self.db.execute('DELETE FROM "{0}"'.format(self._table(p)))
+                self.db.execute('DELETE FROM _sync WHERE entity=?', (p,))
+
+
+    def remove(self, pType, pId):
+        '''
+        @Function: drop a deleted entity without waiting for the next sync
+        '''
+        with self._lock, self.db:
+            self.db.execute('DELETE FROM "{0}" WHERE id=?'.format(self._table(pType)), (pId,))
+
+
+    def query(self, sql, params=()):
+        '''
+        @Function: run a query on the snapshot, the entities are stored as json
+                    (example: SELECT name FROM app WHERE json_extract(json, '$.stream.name') = ?)
+        @return: list of sqlite3.Row
+        '''
+        with self._lock:
+            return self.db.execute(sql, params).fetchall()
+
+
+    def get(self, pType, pId):
+        '''
+        @return: the stored entity (dict) or None
+        '''
+        with self._lock:
+            row=self.db.execute('SELECT json FROM "{0}" WHERE id=?'.format(self._table(pType)), (pId,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+    def entitiesOf(self, pType):
+        '''
+        @return: list of the stored entities (dict) of a type
+        '''
+        with self._lock:
+            rows=self.db.execute('SELECT json FROM "{0}"'.format(self._table(pType))).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+
+    def close(self):
+        with self._lock:
+            self.db.close()
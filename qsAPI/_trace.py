@@ -0,0 +1,46 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import logging
+
+
+
+class _Preview(object):
+    """ Bounded preview of a response body, only rendered if the log record is emitted"""
+
+    __slots__=('response', 'limit')
+
+    def __init__(self, response, limit=1024):
+        self.response=response
+        self.limit=limit
+
+    def __str__(self):
+        content=self.response.content or b''
+        text=content[:self.limit].decode(getattr(self.response, 'encoding', None) or 'utf-8', errors='replace')
+        if len(content) > self.limit:
+            text+='... ({:,} bytes)'.format(len(content))
+        return text
+
+
+
+def _traceCall(log, method, url, response, elapsed, redirects=0, stream=False):
+    '''
+    @Function: emit a structured DEBUG record of a call, the dict is available
+                in the attribute "qsapi" of the LogRecord (example: for a logging.Filter or Handler)
+    '''
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    record={'method'   : method,
+            'url'      : url,
+            'status'   : getattr(response, 'status_code', None),
+            'elapsed'  : elapsed,
+            'redirects': redirects,
+            'bytes'    : None if stream else len(response.content or b'')}
+    log.debug('CALL %(method)s %(status)s %(elapsed).3fs %(bytes)s bytes', record, extra={'qsapi': record})
@@ -0,0 +1,266 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+'''
+
+import ssl, time, queue, threading, weakref
+from concurrent.futures import ThreadPoolExecutor
+from requests import PreparedRequest
+from requests.adapters import HTTPAdapter
+from requests.certs import where as _cabundle
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.util.connection import is_connection_dropped
+from urllib3.util.wait import wait_for_read
+
+
+# connection timings of the current thread, requests opens the connections in the calling thread
+_timings=threading.local()
+
+
+def _resetTimings():
+    _timings.tcp=_timings.connect=0.0
+    _timings.connections=0
+
+
+def _getTimings():
+    return(getattr(_timings, 'tcp', 0.0), getattr(_timings, 'connect', 0.0), getattr(_timings, 'connections', 0))
+
+
+
+class _TimedConnection(object):
+    """ Mixin recording the time spent opening sockets (tcp) and the full connect (tcp + tls)"""
+
+    def _new_conn(self):
+        start=time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _timings.tcp=getattr(_timings, 'tcp', 0.0)+time.perf_counter()-start
+
+    def connect(self):
+        start=time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _timings.connect=getattr(_timings, 'connect', 0.0)+time.perf_counter()-start
+            _timings.connections=getattr(_timings, 'connections', 0)+1
+
+
+class _HTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+class _HTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+class _HTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls=_HTTPConnection
+
+class _HTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls=_HTTPSConnection
+
+
+
+class _SessionSocket(ssl.SSLSocket):
+    """ TLS socket handing its session back to the context before closing"""
+
+    def close(self):
+        keep=getattr(self.context, '_keep', None)
+        if keep is not None:
+            keep(self)
+        super().close()
+
+
+
+class _SessionContext(ssl.SSLContext):
+    """ Client TLS context shared by all the connections, resumes the last TLS session of each host"""
+
+    sslsocket_class=_SessionSocket
+
+    def __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT):
+        self._lock=threading.Lock()
+        self._sessions={}
+        self._sockets={}
+        self.handshakes=self.resumed=0
+
+
+    @classmethod
+    def build(cls, cafile=None, verify=True):
+        '''
+        @Function: context with the client certificate loaded once
+        @param cafile: tuple (cert.pem, key.pem) or None
+        @param verify: False to trust in self-signed certificates
+        '''
+        context=cls(ssl.PROTOCOL_TLS_CLIENT)
+        if verify:
+            context.load_verify_locations(_cabundle())
+        else:
+            context.check_hostname=False
+            context.verify_mode=ssl.CERT_NONE
+        if cafile:
+            context.load_cert_chain(*cafile)
+        return context
+
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        host=kwargs.get('server_hostname')
+        if not kwargs.get('server_side') and kwargs.get('session') is None:
+            with self._lock:
+                # TLS 1.3 tickets arrive after the handshake, so the session is taken from the last socket
+                last=self._sockets.get(host)
+                last=last() if last else None
+                if last is not None and last.session is not None:
+                    self._sessions[host]=last.session
+                kwargs['session']=self._sessions.get(host)
+        
+        sslsock=super().wrap_socket(sock, *args, **kwargs)
+        
+        with self._lock:
+            self.handshakes+=1
+            self.resumed+=bool(sslsock.session_reused)
+            self._sockets[host]=weakref.ref(sslsock)
+        return sslsock
+
+
+    def _keep(self, sslsock):
+        # the session is lost once the socket is closed
+        try:
+            session=sslsock.session
+        except (OSError, ValueError):
+            return
+        if session is not None and not sslsock.server_side:
+            with self._lock:
+                self._sessions[sslsock.server_hostname]=session
+
+
+
+class _Adapter(HTTPAdapter):
+    """ Transport adapter of the driver: pool sizing, connection timings and shared TLS context"""
+
+    def __init__(self, *args, ssl_context=None, **kwargs):
+        self.ssl_context=ssl_context
+        super().__init__(*args, **kwargs)
+
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme={'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        # certificates live in the context, the pools must not load them again on every connection
+        if self.ssl_context is None:
+            return super().build_connection_pool_key_attributes(request, verify, cert)
+        (host_params, pool_kwargs)=super().build_connection_pool_key_attributes(request, verify, None)
+        if host_params['scheme'] == 'https':
+            pool_kwargs['ssl_context']=self.ssl_context
+        return(host_params, pool_kwargs)
+
+
+    def cert_verify(self, conn, url, verify, cert):
+        if self.ssl_context is None:
+            super().cert_verify(conn, url, verify, cert)
+
+
+    @staticmethod
+    def _settle(conn, timeout=0.25, gap=0.05):
+        # TLS 1.3 session tickets arrive after the handshake and leave the idle socket readable,
+        # urllib3 would take it as dropped by the server and open a new one on first use;
+        # the server may send several tickets, the socket is drained until it stays quiet for gap seconds
+        sock=conn.sock
+        if not isinstance(sock, ssl.SSLSocket) or sock.version() != 'TLSv1.3':
+            return
+        previous=sock.gettimeout()
+        while wait_for_read(sock, timeout=timeout):
+            sock.settimeout(0)
+            try:
+                while sock.recv(1):
+                    pass
+                return      # closed by the server, urllib3 sees it as dropped
+            except (ssl.SSLWantReadError, BlockingIOError):
+                pass
+            finally:
+                sock.settimeout(previous)
+            timeout=gap
+
+
+    def _pool(self, url, verify):
+        request=PreparedRequest()
+        request.prepare(method='GET', url=url)
+        return self.get_connection_with_tls_context(request, verify)
+
+
+    def warmup(self, url, verify, n):
+        '''
+        @Function: open n connections to the host of url in parallel (bounded by pool_maxsize) and leave them idle in the pool
+        @return: number of connections open
+        '''
+        pool=self._pool(url, verify)
+        n=min(int(n), pool.pool.maxsize)
+        if n <= 0:
+            return 0
+        conns=[pool._get_conn() for _ in range(n)]
+        
+        def connect(conn):
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    self._settle(conn)
+                return True
+            except Exception:
+                conn.close()
+                return False
+        
+        with ThreadPoolExecutor(max_workers=n) as workers:
+            opened=list(workers.map(connect, conns))
+        for conn in conns:
+            pool._put_conn(conn)
+        return sum(opened)
+
+
+    def keepalive(self, url, verify, path=None, headers=None):
+        '''
+        @Function: walk the idle connections of the pool of url, reopen the dropped ones and send path (a ping) through the others
+        @return: number of healthy connections
+        '''
+        pool=self._pool(url, verify)
+        conns, free=[], 0
+        while True:
+            try:
+                conn=pool.pool.get(block=False)
+            except queue.Empty:
+                break
+            if conn is None:
+                free+=1
+            else:
+                conns.append(conn)
+        # the empty slots are given back at once, workers can still open new connections meanwhile
+        for _ in range(free):
+            pool.pool.put(None, block=False)
+        
+        healthy=0
+        for conn in conns:
+            try:
+                if conn.sock is None or is_connection_dropped(conn):
+                    conn.close()
+                    conn.connect()
+                    self._settle(conn)
+                elif path:
+                    conn.request('GET', path, headers=headers)
+                    r=conn.getresponse()
+                    r.read()
+                    if r.headers.get('Connection', '').lower() == 'close':
+                        conn.close()
+                        conn.connect()
+                        self._settle(conn)
+                healthy+=1
+            except Exception:
+                conn.close()
+            finally:
+                pool._put_conn(conn)
+        return healthy
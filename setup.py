@@ -22,10 +22,13 @@ setuptools.setup(
     url="https://github.com/rafael-sanz/qsAPI",
     packages=setuptools.find_packages(),
     install_requires=[
-        "requests"
+        # the shared TLS context is handed to the pools through get_connection_with_tls_context
+        "requests>=2.32.2"
     ],
     extras_require={
         "ntlm": ["requests_ntlm"],
+        "async": ["aiohttp"],
+        "numpy": ["numpy"],
     },
     entry_points={
         'console_scripts': [
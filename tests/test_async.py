@@ -0,0 +1,141 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+
+Asyncio interfaces (AsyncQRS, AsyncQPS) against the local stand-in server, run with: python -m pytest tests
+'''
+
+import os, sys, shutil, asyncio, tempfile, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import stub
+from qsAPI import QRS, AsyncQRS, AsyncQPS
+from qsAPI._aiocontroller import _aiohttp, _AsyncController
+
+
+
+@unittest.skipIf(_aiohttp is None, 'aiohttp is not installed')
+class TestAsync(unittest.TestCase):
+
+    def setUp(self):
+        self.stub=stub.StubServer(apps=20, users=5, streams=2, download=1024).start()
+        self.get=stub._Handler.do_GET
+        self.dir=tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        stub._Handler.do_GET=self.get
+        self.stub.stop()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+    def run(self, result=None):
+        # every test is a coroutine, run on its own loop
+        method=getattr(self, self._testMethodName)
+        if asyncio.iscoroutinefunction(method):
+            setattr(self, self._testMethodName, lambda: asyncio.run(method()))
+        return super().run(result)
+
+
+    def qrs(self, **kwargs):
+        return AsyncQRS(schema='http', proxy=self.stub.address, verbosity='WARNING', **kwargs)
+
+
+    async def test_same_results_as_qrs(self):
+        q=QRS(schema='http', proxy=self.stub.address, verbosity='WARNING')
+        async with self.qrs() as a:
+            apps, count, names = await asyncio.gather(a.AppGet(), a.count('app'), a.StreamDictAttributes())
+        self.assertEqual(apps, q.AppGet())
+        self.assertEqual(count, 20)
+        self.assertEqual(names, q.StreamDictAttributes())
+        self.assertEqual(str(a.VERSION_SERVER), '20.1.2')
+
+
+    async def test_table(self):
+        q=QRS(schema='http', proxy=self.stub.address, verbosity='WARNING')
+        async with self.qrs() as a:
+            self.assertEqual(await a.AppTable(['id', 'stream.name']), q.AppTable(['id', 'stream.name']))
+
+
+    async def test_records(self):
+        async with self.qrs() as a:
+            apps=await a.AppGet(pRecords=True)
+        self.assertEqual([x.name for x in apps], [x['name'] for x in self.stub.entities['app']])
+
+
+    async def test_stream_refused(self):
+        async with self.qrs() as a:
+            with self.assertRaises(ValueError):
+                await a.AppGet(pStream=True)
+
+
+    async def test_export(self):
+        # the version check, the export call and the download are the steps shared with QRS.AppExport
+        target=os.path.join(self.dir, 'app.qvf')
+        async with self.qrs() as a:
+            r=await a.AppExport('x', target)
+        self.assertEqual(r.status_code, 200)
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), bytes(self.stub.blob))
+
+
+    async def test_download_error_not_saved(self):
+        def missing(handler):
+            if handler.path.startswith('/qrs/download'):
+                return handler._reply(404, {'error': 'gone'})
+            return self.get(handler)
+        stub._Handler.do_GET=missing
+
+        target=os.path.join(self.dir, 'app.qvf')
+        async with self.qrs() as a:
+            r=await a.AppExport('x', target)
+        self.assertEqual(r.status_code, 404)
+        self.assertEqual(r.json(), {'error': 'gone'})
+        self.assertFalse(os.path.exists(target))
+
+
+    async def test_error_raised_at_the_step(self):
+        async def refused(*args, **kwargs):
+            raise ConnectionRefusedError('refused')
+        async with self.qrs() as a:
+            a.driver.get=refused
+            with self.assertRaises(ConnectionRefusedError):
+                await a.count('app')
+
+
+    async def test_qps(self):
+        async with AsyncQPS(schema='http', proxy=self.stub.address, verbosity='WARNING') as p:
+            sessions=(await p.GetUser('DIR', 'user')).json()
+        self.assertEqual(sessions[0]['UserId'], 'user')
+
+
+    async def test_coalesce(self):
+        async with self.qrs(coalesce=True) as a:
+            hits=self.stub.hits
+            await asyncio.gather(*[a.AppGet() for _ in range(10)])
+        self.assertLess(self.stub.hits-hits, 10)
+
+
+    def test_unsupported(self):
+        # the blocking driver methods are not overridden with coroutines
+        self.assertNotIn('_send', vars(_AsyncController))
+        with self.assertRaises(ValueError):
+            self.qrs(user={'userDirectory': 'internal', 'userID': 'sa_repository', 'password': 'secret'})
+
+        async def upload():
+            async with self.qrs() as a:
+                await a.driver.post('/qrs/app/upload', files={'file': b''})
+        with self.assertRaises(TypeError):
+            asyncio.run(upload())
+
+
+
+if __name__ == '__main__':
+    unittest.main()
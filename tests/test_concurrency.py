@@ -0,0 +1,361 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+
+Transfers and concurrency machinery of the driver against the local stand-in server,
+run with: python -m pytest tests
+'''
+
+import os, sys, time, shutil, tempfile, threading, unittest
+import requests as req
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import stub
+from qsAPI import QRS
+from qsAPI._cache import _ResponseCache
+from qsAPI._hedge import _Hedge
+from qsAPI._limiter import _Limiter, _Retry
+
+
+
+def _timed(fn, timeout=5):
+    # runs fn in a thread, a call blocked for good fails the test instead of hanging it
+    result={}
+    def run():
+        try:
+            result['value']=fn()
+        except BaseException as e:
+            result['error']=e
+    t=threading.Thread(target=run, daemon=True)
+    t.start()
+    t.join(timeout)
+    if t.is_alive():
+        raise AssertionError('call blocked for more than {0} s'.format(timeout))
+    if 'error' in result:
+        raise result['error']
+    return result.get('value')
+
+
+
+class _StubCase(unittest.TestCase):
+
+    def setUp(self):
+        self.stub=stub.StubServer(apps=20, users=5, streams=2, download=1024).start()
+        self.get=stub._Handler.do_GET
+
+
+    def tearDown(self):
+        stub._Handler.do_GET=self.get
+        self.stub.stop()
+
+
+    def qrs(self, **kwargs):
+        return QRS(schema='http', proxy=self.stub.address, verbosity='WARNING', **kwargs)
+
+
+
+class TestLimiter(_StubCase):
+
+    def _failing(self, q, error, times):
+        send=q.driver._send
+        calls=[0]
+        def failing(*args, **kwargs):
+            calls[0]+=1
+            if calls[0] <= times:
+                raise error
+            return send(*args, **kwargs)
+        q.driver._send=failing
+
+
+    def test_slot_released_on_read_timeout(self):
+        q=self.qrs(concurrency={'initial': 2})
+        self._failing(q, req.ReadTimeout('read timed out'), 2)
+        for _ in range(2):
+            with self.assertRaises(req.ReadTimeout):
+                q.count('app')
+        self.assertEqual(q.driver.limiter.inflight, 0)
+        self.assertEqual(_timed(lambda: q.count('app')), 20)
+
+
+    def test_slot_released_on_redirect_limit(self):
+        q=self.qrs(concurrency={'initial': 1})
+        self._failing(q, req.HTTPError('Too many redirections'), 1)
+        with self.assertRaises(req.HTTPError):
+            q.count('app')
+        self.assertEqual(q.driver.limiter.inflight, 0)
+        self.assertEqual(_timed(lambda: q.count('app')), 20)
+
+
+    def test_unexpected_error_backs_off(self):
+        q=self.qrs(concurrency={'initial': 8})
+        self._failing(q, req.ReadTimeout('read timed out'), 1)
+        with self.assertRaises(req.ReadTimeout):
+            q.count('app')
+        self.assertEqual(q.driver.limiter.limit, 4)
+        self.assertEqual(q.driver.limiter.backoffs, 1)
+
+
+    def test_aimd(self):
+        limiter=_Limiter(initial=4, maximum=5)
+        for _ in range(40):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 5)
+        limiter.release(limiter.acquire(), overloaded=True)
+        self.assertEqual(limiter.limit, 2.5)
+
+
+    def test_shared_endpoint_key(self):
+        path='/qrs/app/6ca1c5f2-2742-44d5-8adf-d6cba3701a4e/export?x=1'
+        self.assertEqual(_Limiter().key(path), '/qrs/app/{id}/export')
+        self.assertEqual(_Hedge().key(path), _Limiter().key(path))
+        self.assertIs(_Retry.READONLY, _ResponseCache.READONLY)
+
+
+
+class TestBalancer(_StubCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rim=stub.StubServer(apps=20, users=5, streams=2, download=1024).start()
+
+
+    def tearDown(self):
+        self.rim.stop()
+        super().tearDown()
+
+
+    def test_spread(self):
+        q=QRS(schema='http', proxy=[self.stub.address, self.rim.address], verbosity='WARNING')
+        for _ in range(10):
+            q.count('app')
+        self.assertEqual([n['calls'] for n in q.driver.nodes()], [5, 5])
+
+
+    def test_node_released_on_read_timeout(self):
+        q=QRS(schema='http', proxy=[self.stub.address, self.rim.address], verbosity='WARNING')
+        def timeout(*args, **kwargs):
+            raise req.ReadTimeout('read timed out')
+        q.driver._send=timeout
+        for _ in range(4):
+            with self.assertRaises(req.ReadTimeout):
+                q.count('app')
+        nodes=q.driver.nodes()
+        self.assertEqual([n['inflight'] for n in nodes], [0, 0])
+        self.assertEqual(sum(n['errors'] for n in nodes), 4)
+
+
+
+class TestRetry(_StubCase):
+
+    def test_retry_503(self):
+        calls=[0]
+        get=self.get
+        def flaky(handler):
+            calls[0]+=1
+            if calls[0] == 1:
+                self.stub.hits+=1
+                return handler._reply(503, {'error': 'busy'}, {'Retry-After': '0'})
+            return get(handler)
+        stub._Handler.do_GET=flaky
+        q=self.qrs(retries={'total': 2, 'backoff': 0.01})
+        self.assertEqual(q.count('app'), 20)
+        self.assertEqual(q.driver.retry.retries, 1)
+
+
+    def test_post_not_retried(self):
+        retry=_Retry()
+        self.assertFalse(retry.idempotent('POST', '/qrs/app/upload'))
+        self.assertTrue(retry.idempotent('POST', '/qrs/app/table'))
+
+
+
+class TestCoalesce(_StubCase):
+
+    def test_single_flight(self):
+        get=self.get
+        def slow(handler):
+            time.sleep(0.2)
+            return get(handler)
+        stub._Handler.do_GET=slow
+        q=self.qrs(coalesce=True, workers=8)
+        threads=[threading.Thread(target=q.AppGet) for _ in range(6)]
+        hits=self.stub.hits
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(self.stub.hits-hits, 1)
+        self.assertEqual(q.driver.flight.shared, 5)
+
+
+    def test_cached_response_not_shared(self):
+        q=self.qrs(cache=True, coalesce=True)
+        apps=q.AppGet()
+        apps.pop()
+        apps[0]['name']='MUTATED'
+        apps=q.AppGet()
+        self.assertEqual(len(apps), 20)
+        self.assertEqual(apps[0]['name'], 'App 0')
+
+
+
+class TestDownload(_StubCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp=tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        super().tearDown()
+
+
+    def _resumed(self, q, status=None):
+        # the first stream breaks after one block, the resume is answered with status
+        send=q.driver.session.send
+        calls=[0]
+        def broken(*args, **kwargs):
+            calls[0]+=1
+            r=send(*args, **kwargs)
+            if calls[0] == 1:
+                def iter_content(chunk_size=1):
+                    yield r.raw.read(256)
+                    raise req.ConnectionError('connection lost')
+                r.iter_content=iter_content
+            return r
+        q.driver.session.send=broken
+        if status is not None:
+            stub._Handler.do_GET=lambda handler: handler._reply(status, {'error': 'busy'}) if calls[0] > 1 else self.get(handler)
+
+
+    def test_resume_error_not_saved(self):
+        q=self.qrs()
+        self._resumed(q, 503)
+        filename=os.path.join(self.tmp, 'app.qvf')
+        with self.assertRaises(req.HTTPError):
+            q.driver.download('/qrs/download/app/x/y/app.qvf', filename)
+        self.assertEqual(os.path.getsize(filename), 256)
+
+
+    def test_error_not_saved(self):
+        q=self.qrs()
+        stub._Handler.do_GET=lambda handler: handler._reply(404, {'error': 'not found'})
+        filename=os.path.join(self.tmp, 'app.qvf')
+        r=q.driver.download('/qrs/download/app/x/y/app.qvf', filename)
+        self.assertEqual(r.status_code, 404)
+        self.assertFalse(os.path.exists(filename))
+
+
+    def test_slot_held_during_the_transfer(self):
+        q=self.qrs(concurrency={'initial': 2})
+        send=q.driver.session.send
+        inflight=[]
+        def reading(*args, **kwargs):
+            r=send(*args, **kwargs)
+            content=r.iter_content
+            def iter_content(chunk_size=1):
+                for chunk in content(chunk_size):
+                    inflight.append(q.driver.limiter.inflight)
+                    yield chunk
+            r.iter_content=iter_content
+            return r
+        q.driver.session.send=reading
+        q.driver.download('/qrs/download/app/x/y/app.qvf', os.path.join(self.tmp, 'app.qvf'))
+        self.assertTrue(inflight)
+        self.assertEqual(set(inflight), {1})
+        self.assertEqual(q.driver.limiter.inflight, 0)
+
+
+    def test_ranges(self):
+        self.stub.blob=bytes(range(256))*8192
+        q=self.qrs(concurrency={'initial': 2, 'maximum': 2})
+        send=q.driver._send
+        calls=[]
+        def sending(pr, hd, par, stream, proxies, *args):
+            calls.append((pr.headers.get('Range'), proxies is q.driver._proxies, q.driver.limiter.inflight))
+            return send(pr, hd, par, stream, proxies, *args)
+        q.driver._send=sending
+        filename=os.path.join(self.tmp, 'app.qvf')
+        q.driver.download('/qrs/download/app/x/y/app.qvf', filename, parts=4)
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), self.stub.blob)
+        self.assertEqual(len([c for c in calls if c[0]]), 4)
+        self.assertTrue(all(c[1] for c in calls))
+        self.assertLessEqual(max(c[2] for c in calls), 2)
+        self.assertEqual(q.driver.limiter.inflight, 0)
+
+
+    def test_resume(self):
+        q=self.qrs()
+        self._resumed(q)
+        filename=os.path.join(self.tmp, 'app.qvf')
+        q.driver.download('/qrs/download/app/x/y/app.qvf', filename)
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), self.stub.blob)
+
+
+
+class TestHedge(_StubCase):
+
+    def test_delay(self):
+        hedge=_Hedge(percentile=50, min_samples=3, budget=1)
+        key=hedge.key('/qrs/app/full')
+        self.assertIsNone(hedge.delay(key))
+        for s in (0.1, 0.2, 0.3, 0.4):
+            hedge.observe(key, s)
+        self.assertEqual(hedge.delay(key), 0.3)
+
+
+    def _stalled(self, q, seconds):
+        # warms the latencies of the endpoint up, then the next call stalls
+        for _ in range(3):
+            q.count('app')
+        get=self.get
+        calls=[0]
+        def stalled(handler):
+            calls[0]+=1
+            if calls[0] == 1:
+                time.sleep(seconds)
+            return get(handler)
+        stub._Handler.do_GET=stalled
+
+
+    def test_duplicate_wins(self):
+        q=self.qrs(hedge={'percentile': 50, 'min_samples': 3, 'budget': 1, 'min_delay': 0.05})
+        self._stalled(q, 1)
+        start=time.perf_counter()
+        self.assertEqual(q.count('app'), 20)
+        self.assertLess(time.perf_counter()-start, 0.8)
+        self.assertEqual((q.driver.hedge.hedged, q.driver.hedge.wins), (1, 1))
+
+
+    def test_duplicate_takes_a_slot(self):
+        q=self.qrs(hedge={'percentile': 50, 'min_samples': 3, 'budget': 1, 'min_delay': 0.05}, concurrency={'initial': 1, 'maximum': 1})
+        self._stalled(q, 0.3)
+        self.assertEqual(q.count('app'), 20)
+        self.assertEqual(q.driver.hedge.hedged, 0)
+        self.assertEqual(q.driver.limiter.inflight, 0)
+
+
+    def test_loser_bounded(self):
+        q=self.qrs(hedge={'percentile': 50, 'min_samples': 3, 'budget': 1, 'min_delay': 0.05, 'timeout': 0.5})
+        self._stalled(q, 3)
+        self.assertEqual(q.count('app'), 20)
+        # the stalled copy gives its thread back after the read timeout, not after 3 s
+        deadline=time.time()+2
+        while q.driver._hedgeSlots._value < q.driver.pool_maxsize and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(q.driver._hedgeSlots._value, q.driver.pool_maxsize)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
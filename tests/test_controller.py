@@ -0,0 +1,238 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+
+Request building, tracing, instrumentation and connection handling of the driver against
+the local stand-in server, run with: python -m pytest tests
+'''
+
+import os, sys, gc, time, shutil, socket, tempfile, threading, unittest, weakref, subprocess
+import urllib.parse as up
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import stub
+from qsAPI import QRS
+from qsAPI._trace import _Preview
+
+
+
+class _StubCase(unittest.TestCase):
+
+    def setUp(self):
+        self.stub=stub.StubServer(apps=20, users=5, streams=2, download=1024).start()
+
+
+    def tearDown(self):
+        self.stub.stop()
+
+
+    def qrs(self, **kwargs):
+        kwargs.setdefault('verbosity', 'WARNING')
+        return QRS(schema='http', proxy=self.stub.address, **kwargs)
+
+
+
+class TestTrace(_StubCase):
+
+    def test_body_not_rendered(self):
+        rendered=[]
+        render=_Preview.__str__
+        _Preview.__str__=lambda preview: rendered.append(preview) or render(preview)
+        try:
+            self.qrs(verbosity='INFO', logger='qsapi.test.info').AppGet()
+            self.assertEqual(rendered, [])
+        finally:
+            _Preview.__str__=render
+
+
+    def test_bounded_preview(self):
+        q=self.qrs(verbosity='DEBUG', logger='qsapi.test.debug', trace_limit=64)
+        with self.assertLogs('qsapi.test.debug', 'DEBUG') as logs:
+            q.AppGet()
+        recv=[m for m in logs.output if 'RECV: ' in m][0]
+        body=q.driver.response.content
+        self.assertIn(body[:64].decode('utf-8'), recv)
+        self.assertIn('... ({:,} bytes)'.format(len(body)), recv)
+
+
+
+class TestHooks(_StubCase):
+
+    def test_records(self):
+        events=[]
+        q=self.qrs(hooks=[events.append])
+        apps=q.AppGet()
+        q.AppUpdate(apps[0]['id'], {'name': 'x'})
+
+        (call, decode, update)=events
+        self.assertEqual((call['event'], call['api'], call['method'], call['path'], call['status']), ('call', 'AppGet', 'GET', '/qrs/app/full', 200))
+        self.assertEqual(call['received'], len(q.driver.session.get('http://{0}/qrs/app/full'.format(self.stub.address)).content))
+        self.assertEqual(call['connections'], 1)
+        for phase in ('prepare', 'connect', 'tls', 'ttfb', 'transfer', 'total'):
+            self.assertGreaterEqual(call[phase], 0)
+        self.assertEqual((decode['event'], decode['api']), ('decode', 'AppGet'))
+        self.assertEqual((update['api'], update['method'], update['sent'], update['connections']), ('AppUpdate', 'PUT', len('{"name": "x"}'), 0))
+
+
+    def test_failing_hook(self):
+        def failing(record):
+            raise RuntimeError('hook')
+        q=self.qrs(hooks=[failing])
+        with self.assertLogs('qsapi', 'WARNING'):
+            self.assertEqual(len(q.AppGet()), 20)
+
+
+    def test_metrics(self):
+        q=self.qrs(metrics=True)
+        q.AppGet()
+        q.AppGet()
+        text=q.driver.metrics.prometheus()
+        self.assertIn('qsapi_responses_total{status="200",api="AppGet"} 2', text)
+        self.assertIn('qsapi_phase_seconds_count{phase="total",api="AppGet"} 2', text)
+        self.assertIn('qsapi_phase_seconds_count{phase="decode",api="AppGet"} 2', text)
+
+
+
+class TestRequestBuilding(_StubCase):
+
+    def test_url(self):
+        # the cached path handling gives the same url as the generic one
+        for vproxy in (None, 'px'):
+            q=self.qrs(vproxy=vproxy)
+            par={'Xrfkey': 'abc', 'filter': "name eq 'a b'"}
+            for apipath in ('/qrs/app/full', 'qrs/app/full', '/qrs/app/full?skipData=true', '/qps/session/1', 'http://other:4242/qrs/about'):
+                self.assertEqual(q.driver._url(apipath, par), q.driver._params_update(up.urljoin(q.driver.baseurl, apipath), par))
+
+
+    def test_headers(self):
+        q=self.qrs(vproxy='px')
+        (par1, hd1)=q.driver._params_prepare({'filter': None, 'flag': True})
+        (par2, hd2)=q.driver._params_prepare(None, {'Content-Type': 'application/vnd.qlik.sense.app'})
+        self.assertEqual(par1, {'Xrfkey': par1['Xrfkey'], 'flag': 'true'})
+        self.assertEqual(hd1['x-Qlik-Xrfkey'], par1['Xrfkey'])
+        self.assertNotEqual(par1['Xrfkey'], par2['Xrfkey'])
+        self.assertEqual(len(par2['Xrfkey']), 16)
+        self.assertEqual(hd1['X-Qlik-Virtual-Proxy-Prefix'], 'px')
+        self.assertEqual(hd2['Content-Type'], 'application/vnd.qlik.sense.app')
+        self.assertEqual(q.driver._headers['Content-Type'], 'application/json')
+
+        q.driver.setUser('DIR', 'other')
+        self.assertEqual(q.driver._params_prepare(None)[1]['X-Qlik-User'], 'UserDirectory=DIR; UserId=other')
+
+
+    def test_collected(self):
+        # nothing but the caller keeps the handler alive
+        q=self.qrs(vproxy='px')
+        q.AppGet()
+        ref=weakref.ref(q.driver)
+        gc.disable()
+        try:
+            del q
+            self.assertIsNone(ref())
+        finally:
+            gc.enable()
+
+
+
+@unittest.skipIf(shutil.which('openssl') is None, 'openssl is not installed')
+class TestTLS(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir=tempfile.mkdtemp()
+        cls.cert, cls.key = os.path.join(cls.dir, 'cert.pem'), os.path.join(cls.dir, 'key.pem')
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                        '-keyout', cls.key, '-out', cls.cert], check=True, capture_output=True)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir, ignore_errors=True)
+
+
+    def setUp(self):
+        self.stub=stub.StubServer(apps=20, users=5, streams=2, download=1024, certfile=self.cert, keyfile=self.key).start()
+
+
+    def tearDown(self):
+        self.stub.stop()
+
+
+    def qrs(self, **kwargs):
+        return QRS(schema='https', proxy=self.stub.address, verify=False, verbosity='WARNING', **kwargs)
+
+
+    def test_session_resumed(self):
+        q=self.qrs()
+        context=q.driver._sslcontext
+        for _ in range(3):
+            q.AppGet()
+            # the pooled connections are dropped, the next call opens a new one
+            q.driver._adapter.close()
+        self.assertEqual(context.handshakes, 3)
+        self.assertEqual(context.resumed, 2)
+
+
+    def test_warmup(self):
+        events=[]
+        q=self.qrs(workers=4, warmup=4, hooks=[events.append])
+        self.assertEqual(q.driver._sslcontext.handshakes, 4)
+        calls=[threading.Thread(target=q.AppGet) for _ in range(4)]
+        for t in calls:
+            t.start()
+        for t in calls:
+            t.join()
+        self.assertEqual(sum(e.get('connections', 0) for e in events), 0)
+        self.assertEqual(q.driver._sslcontext.handshakes, 4)
+
+
+
+class TestKeepalive(_StubCase):
+
+    def test_pings(self):
+        q=self.qrs(warmup=2, keepalive=0.05)
+        time.sleep(0.3)
+        self.assertGreaterEqual(self.stub.hits, 4)
+        q.driver.close()
+        time.sleep(0.1)
+        hits=self.stub.hits
+        time.sleep(0.2)
+        self.assertEqual(self.stub.hits, hits)
+
+
+    def test_ends_with_the_handler(self):
+        def running():
+            return sum(t.name == 'qsapi-keepalive' for t in threading.enumerate())
+        before=running()
+        q=self.qrs(keepalive=0.05)
+        self.assertEqual(running(), before+1)
+        ref=weakref.ref(q.driver)
+        del q
+        self.assertIsNone(ref())
+        time.sleep(0.3)
+        self.assertEqual(running(), before)
+
+
+    def test_dropped_connection_reopened(self):
+        events=[]
+        q=self.qrs(hooks=[events.append])
+        q.AppGet()
+        # the idle connection is dropped (read side at EOF), keepalive opens it again before the next call
+        for conn in list(q.driver._adapter._pool(q.driver.baseurl, False).pool.queue):
+            if conn is not None and conn.sock is not None:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(q.driver._pingIdle(), 1)
+        q.AppGet()
+        self.assertEqual([e['connections'] for e in events if e['event'] == 'call'], [1, 0])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
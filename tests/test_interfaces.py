@@ -0,0 +1,480 @@
+# -*- coding: UTF-8 -*-
+
+'''
+@author:     Rafael Sanz
+@contact:    rafael.sanz@selab.es
+@Copyright:  2016 <Rafael Sanz - (R)SELAB>
+
+# MIT License (see LICENSE or https://opensource.org/licenses/MIT)
+
+Interface methods and QRS helpers against the local stand-in server, run with: python -m pytest tests
+'''
+
+import os, sys, json, time, shutil, tempfile, threading, unittest
+import urllib.error as ue, urllib.request as ur
+import requests as req
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import stub
+from qsAPI import QRS
+from qsAPI._columnar import _np
+from qsAPI._records import _Records
+from qsAPI._jsonstream import _iterArray
+
+
+
+class _StubCase(unittest.TestCase):
+
+    def setUp(self):
+        self.stub=stub.StubServer(apps=50, users=5, streams=2, download=1024).start()
+
+
+    def tearDown(self):
+        self.stub.stop()
+
+
+    def qrs(self, **kwargs):
+        return QRS(schema='http', proxy=self.stub.address, verbosity='WARNING', **kwargs)
+
+
+
+@unittest.skipIf(_np is None, 'numpy is not installed')
+class TestColumns(_StubCase):
+
+    def test_columns(self):
+        q=self.qrs()
+        cols=q.Columns('app', ['fileSize', 'owner.userId', 'stream.name', 'lastReloadTime', 'published'])
+        self.assertEqual(cols.rows, 50)
+        self.assertEqual(str(cols['fileSize'].dtype), 'int64')
+        self.assertEqual(str(cols['lastReloadTime'].dtype), 'datetime64[ms]')
+        self.assertEqual(cols['stream.name'][:3], ['Stream 0', None, 'Stream 0'])
+        self.assertEqual(int((cols['published'] & (cols['stream.name'] == 'Stream 0')).sum()), 25)
+        self.assertEqual(cols.aggregate('owner.userId', 'fileSize', 'sum')['user0'], sum(1024*(i+1) for i in range(0, 50, 5)))
+        self.assertEqual(cols.aggregate('stream.name', how='count'), {'Stream 0': 25})
+        self.assertEqual(str(cols.aggregate('stream.name', 'lastReloadTime', 'max')['Stream 0']), '2020-10-22T10:00:00.000')
+
+
+    def test_aggregate_strings(self):
+        q=self.qrs()
+        cols=q.Columns(self.stub.entities['app'], ['owner.userId', 'stream.name'])
+        with self.assertRaises(TypeError):
+            cols.aggregate('owner.userId', 'stream.name', 'max')
+        self.assertEqual(sum(cols.aggregate('owner.userId', 'stream.name', 'count').values()), 50)
+
+
+
+class TestBulk(_StubCase):
+
+    def test_update_requires_a_scope(self):
+        q=self.qrs()
+        with self.assertRaises(ValueError):
+            q.BulkUpdate('app', {'description': 'x'})
+        with self.assertRaises(ValueError):
+            q.BulkDelete('app')
+        self.assertFalse(any(a['description'] == 'x' for a in self.stub.entities['app']))
+        self.assertEqual(len(self.stub.entities['app']), 50)
+
+
+    def test_empty_scope_refused(self):
+        q=self.qrs()
+        for scope in ({'pFilter': ''}, {'pFilter': '  '}, {'pIds': []}, {'pIds': iter(())}):
+            with self.assertRaises(ValueError):
+                q.BulkDelete('app', **scope)
+            with self.assertRaises(ValueError):
+                q.BulkUpdate('app', {'description': 'x'}, **scope)
+        self.assertEqual(len(self.stub.entities['app']), 50)
+        self.assertEqual(self.stub.selections, {})
+
+
+    def test_update_tags_and_custom_properties(self):
+        q=self.qrs()
+        apps=self.stub.entities['app']
+        tag=self.stub.entities['tag'][2]['id']
+        q.BulkUpdate('app', {'tags': {'added': [tag], 'removed': []},
+                             'customProperties': {'Department': {'added': ['Sales'], 'removed': ['Dept 0']}}}, pIds=[apps[0]['id']])
+        self.assertEqual([t['name'] for t in apps[0]['tags']], ['tag0', 'tag2'])
+        self.assertEqual([c['value'] for c in apps[0]['customProperties']], ['Sales'])
+
+
+    def test_update_ids(self):
+        q=self.qrs(cache=True)
+        q.AppGet()
+        ids=[a['id'] for a in self.stub.entities['app'][:10]]
+        q.BulkUpdate('app', {'description': 'bulk'}, pIds=ids)
+        self.assertEqual(sum(a['description'] == 'bulk' for a in q.AppGet()), 10)
+        self.assertEqual(self.stub.selections, {})
+
+
+    def test_delete_ids(self):
+        q=self.qrs()
+        ids=[a['id'] for a in self.stub.entities['app'][:4]]
+        q.BulkDelete('app', pIds=ids)
+        self.assertEqual(len(q.AppGet()), 46)
+
+
+
+class TestExportMany(_StubCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp=tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        super().tearDown()
+
+
+    def test_shared_targets(self):
+        q=self.qrs()
+        apps=self.stub.entities['app'][:6]
+        for a in apps:
+            a['name']='Same'
+        ids=[a['id'] for a in apps]
+        done=q.AppExportMany(ids+ids[:2], path=os.path.join(self.tmp, '{stream}', '{name}.qvf'), workers=6)
+        self.assertEqual(sorted(done), sorted(ids))
+        self.assertEqual({x['status'] for x in done.values()}, {'done'})
+        files={x['file'] for x in done.values()}
+        self.assertEqual(len(files), 6)
+        for f in files:
+            with open(f, 'rb') as qvf:
+                self.assertEqual(qvf.read(), self.stub.blob)
+        self.assertFalse([f for _, _, names in os.walk(self.tmp) for f in names if f.endswith('.part')])
+
+
+
+class TestCache(_StubCase):
+
+    def test_get_during_write_not_cached(self):
+        q=self.qrs(cache=True, workers=2)
+        q.AppGet()
+        session=q.driver.session
+        send=session.send
+        def send_with_concurrent_get(pr, *args, **kwargs):
+            # a GET answered while the PUT is in flight sees the old body
+            if pr.method == 'PUT':
+                threading.Thread(target=q.AppGet).start()
+                time.sleep(0.2)
+            return send(pr, *args, **kwargs)
+        session.send=send_with_concurrent_get
+        q.AppUpdate(self.stub.entities['app'][0]['id'], {'name': 'x'})
+        hits=self.stub.hits
+        q.AppGet()
+        self.assertEqual(self.stub.hits-hits, 1)
+
+
+    def test_hits_not_timed(self):
+        events=[]
+        q=self.qrs(cache=True, hooks=[events.append])
+        self.assertEqual(q.AppGet(), q.AppGet())
+        self.assertEqual([e['event'] for e in events], ['call', 'decode'])
+
+
+    def test_get_crossing_a_write_not_cached(self):
+        q=self.qrs(cache=True)
+        generation=q.driver.cache.generation
+        q.driver.cache.invalidate('/qrs/app/123')
+        q.driver.cache.put(('/qrs/app/full', (), None), object(), generation)
+        self.assertEqual(q.driver.cache.get(('/qrs/app/full', (), None)), (None, False))
+
+
+
+class TestTables(_StubCase):
+
+    def test_columns(self):
+        q=self.qrs()
+        table=q.AppTable(['id', 'name', 'stream.name'])
+        self.assertEqual(table['columnNames'], ['id', 'name', 'stream.name'])
+        self.assertEqual(table['rows'], [[x['id'], x['name'], (x['stream'] or {}).get('name')] for x in self.stub.entities['app']])
+
+
+    def test_cache_kept(self):
+        # the table endpoint is a POST that only reads
+        q=self.qrs(cache=True)
+        q.AppGet()
+        q.UserTable()
+        hits=self.stub.hits
+        q.AppGet()
+        self.assertEqual(self.stub.hits, hits)
+
+
+
+class TestEntityIter(_StubCase):
+
+    def test_pages(self):
+        q=self.qrs()
+        self.assertEqual(list(q.EntityIter('app', pageSize=7)), q.AppGet())
+        self.assertEqual([x['name'] for x in q.UserIter(pageSize=2)], [x['name'] for x in self.stub.entities['user']])
+
+
+    def test_early_close(self):
+        # 10 pages, only the count, the page consumed and the prefetched ones are requested
+        q=self.qrs()
+        hits=self.stub.hits
+        entities=q.EntityIter('app', pageSize=5, prefetch=2)
+        self.assertEqual(next(entities), self.stub.entities['app'][0])
+        entities.close()
+        time.sleep(0.2)
+        self.assertLessEqual(self.stub.hits-hits, 5)
+        self.assertEqual(q.count('app'), 50)
+
+
+
+class TestStream(_StubCase):
+
+    def test_stream(self):
+        q=self.qrs()
+        apps=q.AppGet(pStream=True)
+        self.assertNotIsInstance(apps, list)
+        self.assertEqual(list(apps), q.AppGet())
+
+
+    def test_chunk_boundaries(self):
+        items=[{'name': 'a "quoted" [name], {x}', 'text': 'é€'}, 12345, -1.5e3, True, None, [1, [2]], 'x']
+        doc=json.dumps(items, ensure_ascii=False).encode('utf-8')
+        for size in (1, 2, 3, 7, len(doc)):
+            self.assertEqual(list(_iterArray(doc[i:i+size] for i in range(0, len(doc), size))), items)
+        self.assertEqual(list(_iterArray([b' {"a":', b' 1}'])), [{'a': 1}])
+        with self.assertRaises(ValueError):
+            list(_iterArray([b'[{"a": 1}, {"b"']))
+
+
+
+class TestServerVersion(_StubCase):
+
+    def test_lazy(self):
+        q=self.qrs()
+        self.assertEqual(self.stub.hits, 0)
+        self.assertEqual(str(q.VERSION_SERVER), '20.1.2')
+        q.VERSION_SERVER
+        self.assertEqual(self.stub.hits, 1)
+
+
+    def test_disk_cache(self):
+        path=os.path.join(tempfile.mkdtemp(), 'versions.json')
+        try:
+            self.assertEqual(str(self.qrs(version_cache=path).VERSION_SERVER), '20.1.2')
+            self.assertEqual(str(self.qrs(version_cache=path).VERSION_SERVER), '20.1.2')
+            self.assertEqual(self.stub.hits, 1)
+        finally:
+            shutil.rmtree(os.path.dirname(path))
+
+
+    def test_mismatch(self):
+        self.stub.version='2.0.0'
+        with self.assertRaises(Exception):
+            self.qrs().VERSION_SERVER
+
+
+
+class TestEntityStore(_StubCase):
+
+    def test_lookups(self):
+        q=self.qrs()
+        apps=q.EntityStore('app', indexes=['stream.name'])
+        first=self.stub.entities['app'][0]
+        self.assertEqual(apps.get(first['id'])['name'], first['name'])
+        self.assertEqual(len(apps.find('customProperties.Department', 'Dept 1')), 7)
+        self.assertEqual(len(apps.find('tags.name', 'tag0')), 17)
+        hits=self.stub.hits
+        apps.index('owner.userId')
+        self.assertEqual(self.stub.hits, hits)
+
+
+    def test_results_read_only(self):
+        q=self.qrs()
+        apps=q.EntityStore('app')
+        found=apps.find('tags.name', 'tag0')
+        self.assertIsInstance(found, tuple)
+        with self.assertRaises(TypeError):
+            apps.index('tags.name')['tag0']=()
+        self.assertEqual(apps.find('tags.name', 'nothing'), ())
+        self.assertEqual(len(apps.find('tags.name', 'tag0')), 17)
+
+
+    def test_refresh_error_keeps_the_entities(self):
+        q=self.qrs()
+        apps=q.EntityStore('app')
+        first=self.stub.entities['app'][0]['id']
+        self.assertIn(first, apps)
+        get=stub._Handler.do_GET
+        stub._Handler.do_GET=lambda handler: handler._reply(500, {'error': 'down'})
+        try:
+            with self.assertRaises(req.HTTPError):
+                apps.refresh()
+            self.assertEqual(len(apps), 50)
+            self.assertEqual(apps.get(first)['id'], first)
+        finally:
+            stub._Handler.do_GET=get
+
+
+    def test_invalidate_while_reading(self):
+        q=self.qrs(workers=4)
+        apps=q.EntityStore('app')
+        first=self.stub.entities['app'][0]['id']
+        apps.get(first)
+        (errors, done)=([], threading.Event())
+        def invalidate():
+            while not done.is_set():
+                apps.invalidate()
+        t=threading.Thread(target=invalidate)
+        t.start()
+        try:
+            for i in range(200):
+                try:
+                    apps.index('owner.userId' if i % 2 else 'stream.name')
+                    if first not in apps or apps.get(first) is None:
+                        errors.append('miss')
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            done.set()
+            t.join()
+        self.assertEqual(errors, [])
+
+
+
+class TestRecords(_StubCase):
+
+    def test_records(self):
+        q=self.qrs()
+        apps=q.AppGet(pRecords=True)
+        plain=self.stub.entities['app']
+        self.assertEqual([a.toDict() for a in apps], plain)
+        self.assertEqual(apps[0].owner.userId, plain[0]['owner']['userId'])
+        self.assertEqual(apps[0]['tags'][0]['name'], 'tag0')
+        self.assertEqual(apps[1].customProperties[0]['value'], 'Dept 1')
+        self.assertIs(apps[0].owner.userDirectory, apps[5].owner.userDirectory)
+        self.assertEqual([a.id for a in q.AppGet(pStream=True, pRecords=True)], [a['id'] for a in plain])
+
+
+    def test_strings_not_kept_between_calls(self):
+        records=_Records()
+        first=records([{'id': 'a', 'owner': {'userDirectory': 'DIR'}}, {'id': 'b', 'owner': {'userDirectory': 'DIR'}}])
+        second=records({'id': 'c', 'owner': {'userDirectory': 'DIR'}})
+        self.assertIs(first[0].owner.userDirectory, first[1].owner.userDirectory)
+        self.assertEqual(second.owner.userDirectory, 'DIR')
+        self.assertEqual(sorted(vars(records)), ['intern', 'lazy'])
+
+
+
+class TestSnapshot(_StubCase):
+
+    def test_delta(self):
+        q=self.qrs()
+        snap=q.Snapshot(':memory:', entities=['app'])
+        self.assertEqual(snap.sync()['app'], {'upserted': 50, 'deleted': 0})
+        self.assertEqual(snap.sync()['app'], {'upserted': 0, 'deleted': 0})
+
+        apps=self.stub.entities['app']
+        apps[5]=dict(apps[5], name='Renamed', modifiedDate='2021-01-01T00:00:00.000Z')
+        del apps[7]
+        self.stub._payloads.clear()
+        self.assertEqual(snap.sync()['app'], {'upserted': 1, 'deleted': 1})
+        self.assertEqual(snap.get('app', apps[5]['id'])['name'], 'Renamed')
+
+
+    def test_change_in_the_millisecond_of_the_mark(self):
+        # written with the date of the mark but committed after the previous sync read the entities
+        q=self.qrs()
+        snap=q.Snapshot(':memory:', entities=['app'])
+        snap.sync()
+        apps=self.stub.entities['app']
+        self.assertEqual(snap.highwater('app'), apps[3]['modifiedDate'])
+        apps[3]=dict(apps[3], name='Late')
+        self.stub._payloads.clear()
+        self.assertEqual(snap.sync()['app'], {'upserted': 1, 'deleted': 0})
+        self.assertEqual(snap.get('app', apps[3]['id'])['name'], 'Late')
+
+
+    def test_entities_missing_below_the_mark(self):
+        # i.e. an entity restored with its old modifiedDate
+        q=self.qrs()
+        snap=q.Snapshot(':memory:', entities=['app'])
+        apps=self.stub.entities['app']
+        restored=apps.pop(3)
+        self.stub._payloads.clear()
+        snap.sync()
+        apps.append(restored)
+        self.stub._payloads.clear()
+        self.assertEqual(snap.sync()['app'], {'upserted': 1, 'deleted': 0})
+        self.assertEqual(len(snap.entitiesOf('app')), 50)
+
+
+
+class TestListener(_StubCase):
+
+    def test_type_names_mapped_to_paths(self):
+        q=self.qrs(cache=True)
+        calls=[]
+        class Store(object):
+            pType='app/object'
+            def invalidate(self):
+                calls.append('invalidate')
+        class Snapshot(object):
+            entities=('app/object',)
+            def remove(self, pType, pId):
+                calls.append(('remove', pType, pId))
+            def syncEntity(self, pType):
+                calls.append(('sync', pType))
+        with q.Listener(host='127.0.0.1') as ls:
+            ls.watch(Store())
+            ls.watch(Snapshot())
+            ls.on(lambda e: calls.append('on'), 'App.Object')
+            q.driver.cache.put(('/qrs/app/object/full', (), None), object())
+            ls.dispatch([{'objectType': 'App.Object', 'objectID': '1', 'changeType': 3}])
+        self.assertEqual(len(q.driver.cache), 0)
+        self.assertEqual(calls, [('remove', 'app/object', '1'), 'on', 'invalidate', ('sync', 'app/object')])
+        self.assertEqual(ls.path('ReloadTask'), 'reloadtask')
+
+
+    def _events(self, ls, n):
+        deadline=time.time()+5
+        while ls.events < n and time.time() < deadline:
+            time.sleep(0.01)
+        return ls.events
+
+
+    def test_notified(self):
+        q=self.qrs()
+        apps=q.EntityStore('app')
+        first=self.stub.entities['app'][0]['id']
+        threads=[]
+        with q.Listener() as ls:
+            self.assertEqual(ls.server.server_address[0], '127.0.0.1')
+            ls.subscribe('App')
+            ls.watch(apps)
+            ls.on(lambda e: threads.append(threading.current_thread().name))
+            self.assertIn(first, apps)
+            self.assertEqual(self.stub.notify('App', 'Delete', first), 1)
+            self.assertEqual(self._events(ls, 1), 1)
+            self.assertNotIn(first, apps)
+        self.assertEqual(threads, ['qsapi-notify-worker'])
+        self.assertEqual(self.stub.subscriptions, {})
+
+
+    def test_refused(self):
+        q=self.qrs()
+        body=json.dumps([{'objectType': 'App', 'objectID': '1', 'changeType': 2}]).encode('utf-8')
+        def post(url):
+            try:
+                return ur.urlopen(ur.Request(url, body, {'Content-Type': 'application/json'}), timeout=5).status
+            except ue.HTTPError as e:
+                return e.code
+        with q.Listener(secret='s3cret') as ls:
+            root='http://127.0.0.1:{0}/'.format(ls.port)
+            self.assertEqual(post(root), 403)
+            self.assertEqual(post(root+'other'), 403)
+            self.assertEqual(post(root+'s3cret'), 200)
+            self.assertEqual(self._events(ls, 1), 1)
+        with q.Listener(allow=['10.0.0.5']) as ls:
+            self.assertEqual(post(ls.callback), 403)
+            time.sleep(0.1)
+            self.assertEqual(ls.events, 0)
+
+
+
+if __name__ == '__main__':
+    unittest.main()